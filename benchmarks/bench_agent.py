@@ -0,0 +1,111 @@
+"""Benchmark: load test of the background agent with many parallel clients.
+
+Starts `cli.py agent --foreground` on a temporary vault, then runs client processes
+that each keep one connection open and send code requests back to back, first one
+name per request, then --batch names per request. Reports requests/s, codes/s and
+latency percentiles, next to the cost of one `cli.py code` process without the agent.
+
+    python3 benchmarks/bench_agent.py [--entries 1000] [--clients 8] [--seconds 3] [--batch 50]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+sys.path.insert(0, SRC_DIR)
+
+import kdf  # noqa: E402
+from agent import AgentClient  # noqa: E402
+from entry_crypto import EntryCipher  # noqa: E402
+from storage import VaultStore  # noqa: E402
+
+PASSWORD = "benchmark"
+
+
+# Function run by each client process: send requests for `seconds`, returns the latencies
+def client_worker(socket_path, names, batch, seconds, seed):
+    rng = random.Random(seed)
+    client = AgentClient(socket_path)
+    latencies = []
+    deadline = time.perf_counter() + seconds
+    while True:
+        start = time.perf_counter()
+        if start >= deadline:
+            break
+        client.codes(rng.sample(names, batch))
+        latencies.append(time.perf_counter() - start)
+    client.close()
+    return latencies
+
+
+# Function to run the clients in parallel and print one result line
+def load(socket_path, names, clients, batch, seconds):
+    with multiprocessing.Pool(clients) as pool:
+        start = time.perf_counter()
+        runs = pool.starmap(client_worker, [(socket_path, names, batch, seconds, seed) for seed in range(clients)])
+        elapsed = time.perf_counter() - start
+    latencies = sorted(latency for run in runs for latency in run)
+    requests = len(latencies)
+    p99 = latencies[min(int(requests * 0.99), requests - 1)]
+    print(f"  batch {batch:4d}: {requests / elapsed:9.0f} requests/s {requests * batch / elapsed:10.0f} codes/s"
+          f"   p50 {statistics.median(latencies) * 1000:6.2f} ms   p99 {p99 * 1000:6.2f} ms")
+
+
+# Function to wait until the agent accepts connections
+def wait_for_agent(socket_path, process, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise SystemExit("agent exited during startup")
+        try:
+            AgentClient(socket_path).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise SystemExit("agent did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entries", type=int, default=1000)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--batch", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'vault.json')
+        socket_path = os.path.join(tmp, 'agent.sock')
+        data_key = kdf.new_data_key()
+        cipher = EntryCipher(data_key)
+        names = [f"account-{i}" for i in range(args.entries)]
+        VaultStore(path).save(kdf.hash_password(PASSWORD, data_key),
+                              {name: cipher.encrypt(name, "JBSWY3DPEHPK3PXP") for name in names})
+        env = dict(os.environ, AUTHTERM_VAULT=path, AUTHTERM_PASSWORD=PASSWORD, AUTHTERM_AGENT_SOCKET=socket_path)
+        cli = [sys.executable, os.path.join(SRC_DIR, 'cli.py')]
+
+        start = time.perf_counter()
+        subprocess.run(cli + ["code", names[0]], env=env, check=True, stdout=subprocess.DEVNULL)
+        print(f"  one cli.py code process without the agent: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+        process = subprocess.Popen(cli + ["agent", "--foreground"], env=env, stdout=subprocess.DEVNULL)
+        try:
+            wait_for_agent(socket_path, process)
+            print(f"{args.clients} clients, {args.entries} entries, {args.seconds:g} s per run")
+            load(socket_path, names, args.clients, 1, args.seconds)
+            load(socket_path, names, args.clients, min(args.batch, len(names)), args.seconds)
+            subprocess.run(cli + ["agent", "stop"], env=env, check=True)
+            process.wait(timeout=10)
+        finally:
+            if process.poll() is None:
+                process.kill()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""Benchmark: opening vault.json vs the mmapped vault.bin and reading one secret.
+
+    python3 benchmarks/bench_binary_vault.py [--entries 100000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from storage import VaultStore  # noqa: E402
+
+
+# Function to time loading a vault and reading one entry, with the memory allocated for it
+def open_and_read(path, name):
+    tracemalloc.start()
+    start = time.perf_counter()
+    _, secrets = VaultStore(path).load()
+    opened = time.perf_counter() - start
+    secrets[name]
+    first_code = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return opened, first_code, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entries", type=int, default=100000)
+    args = parser.parse_args()
+
+    secrets = {f"account-{i:06d}": "JBSWY3DPEHPK3PXP" for i in range(args.entries)}
+    name = f"account-{args.entries // 2:06d}"
+    with tempfile.TemporaryDirectory() as tmp:
+        print(f"{args.entries} entries")
+        for file_name in ("vault.json", "vault.bin"):
+            path = os.path.join(tmp, file_name)
+            VaultStore(path).save("hash", secrets)
+            opened, first_code, peak = open_and_read(path, name)
+            print(f"  {file_name:10s} open {opened * 1000:8.2f} ms  open+lookup {first_code * 1000:8.2f} ms"
+                  f"  peak {peak / 1024:10.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Benchmark: cold start of the headless CLI (time to first code).
+
+Runs `cli.py list` and `cli.py code NAME` as fresh processes against a temporary vault
+and reports the median wall time next to a bare interpreter start and the KDF unlock
+time. The KDF cost is chosen on purpose (AUTHTERM_UNLOCK_TIME), so "code minus KDF" is
+the number to keep well under 100 ms.
+
+    python3 benchmarks/bench_cli.py [--entries 1000] [--runs 15] [--json results.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+sys.path.insert(0, SRC_DIR)
+
+import kdf  # noqa: E402
+from entry_crypto import EntryCipher  # noqa: E402
+from storage import VaultStore  # noqa: E402
+
+PASSWORD = "benchmark"
+
+
+# Function to get the median wall time of a command, in seconds
+def median_run(command, env, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, env=env, check=True, stdout=subprocess.DEVNULL)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entries", type=int, default=1000)
+    parser.add_argument("--runs", type=int, default=15)
+    parser.add_argument("--json", help="append the results to this JSON lines file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'vault.json')
+        data_key = kdf.new_data_key()
+        password_hash = kdf.hash_password(PASSWORD, data_key)
+        cipher = EntryCipher(data_key)
+        VaultStore(path).save(password_hash, {f"account-{i}": cipher.encrypt(f"account-{i}", "JBSWY3DPEHPK3PXP")
+                                              for i in range(args.entries)})
+
+        start = time.perf_counter()
+        kdf.unlock(PASSWORD, password_hash)
+        unlock_time = time.perf_counter() - start
+
+        env = dict(os.environ, AUTHTERM_VAULT=path, AUTHTERM_PASSWORD=PASSWORD)
+        cli = [sys.executable, os.path.join(SRC_DIR, 'cli.py')]
+        results = {
+            "entries": args.entries,
+            "interpreter": median_run([sys.executable, "-c", "pass"], env, args.runs),
+            "list": median_run(cli + ["list"], env, args.runs),
+            "code": median_run(cli + ["code", "account-0"], env, args.runs),
+            "kdf_unlock": unlock_time,
+        }
+        results["code_minus_kdf"] = results["code"] - unlock_time
+
+    for key, value in results.items():
+        if key != "entries":
+            print(f"  {key:16s} {value * 1000:8.1f} ms")
+    if args.json:
+        results["timestamp"] = time.time()
+        with open(args.json, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(results) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Benchmark: many processes writing to one vault at the same time.
+
+Starts --writers processes that each commit --commits changes (one secret per commit)
+to the same vault while a reader process keeps merging their changes with refresh().
+Afterwards the vault must hold every secret written by every process (no lost updates),
+and the reader's state must match a fresh load. Reports commits/s and how long a
+refresh takes (waiting for the lock included) next to a full load.
+
+    python3 benchmarks/bench_contention.py [--entries 10000] [--writers 8] [--commits 200] [--binary]
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from storage import VaultStore  # noqa: E402
+
+
+# Function run by each writer process: commit its own secrets one by one, returns the seconds taken
+def writer(path, writer_id, commits, start_event):
+    store = VaultStore(path)
+    password_hash, secrets = store.load()
+    start_event.wait()
+    start = time.perf_counter()
+    for i in range(commits):
+        name = f"writer-{writer_id}-{i}"
+        secrets[name] = "JBSWY3DPEHPK3PXP"
+        password_hash, secrets, _ = store.commit([("set", name, secrets[name])], password_hash, secrets)
+    store.wait()
+    return time.perf_counter() - start
+
+
+# Function run by the reader process while the writers run: refresh until they are done
+# Returns (refreshes that found changes, their total seconds, full reloads among them, its final secrets)
+def reader(path, done_event):
+    store = VaultStore(path)
+    password_hash, secrets = store.load()
+    refreshes, elapsed, reloads = 0, 0.0, 0
+    while True:
+        finished = done_event.is_set()
+        start = time.perf_counter()
+        password_hash, secrets, changed = store.refresh(password_hash, secrets)
+        if changed != set():
+            elapsed += time.perf_counter() - start
+            refreshes += 1
+            reloads += changed is None
+        if finished:
+            return refreshes, elapsed, reloads, dict(secrets)
+        time.sleep(0.001)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entries", type=int, default=10000)
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--commits", type=int, default=200)
+    parser.add_argument("--binary", action="store_true", help="use the binary vault format (vault.bin)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'vault.bin' if args.binary else 'vault.json')
+        base = {f"account-{i:06d}": "GEZDGNBVGY3TQOJQ" for i in range(args.entries)}
+        VaultStore(path).save("hash", base)
+
+        start = time.perf_counter()
+        VaultStore(path).load()
+        load_time = time.perf_counter() - start
+
+        manager = multiprocessing.Manager()
+        start_event, done_event = manager.Event(), manager.Event()
+        with multiprocessing.Pool(args.writers + 1) as pool:
+            read = pool.apply_async(reader, (path, done_event))
+            writes = [pool.apply_async(writer, (path, i, args.commits, start_event)) for i in range(args.writers)]
+            time.sleep(0.5)  # Let every writer load the vault first
+            start = time.perf_counter()
+            start_event.set()
+            for result in writes:
+                result.get()
+            elapsed = time.perf_counter() - start
+            done_event.set()
+            refreshes, refresh_time, reloads, reader_secrets = read.get()
+
+        password_hash, secrets = VaultStore(path).load()
+        expected = dict(base, **{f"writer-{w}-{i}": "JBSWY3DPEHPK3PXP"
+                                 for w in range(args.writers) for i in range(args.commits)})
+        lost = len(expected) - len(expected.keys() & secrets.keys())
+        total = args.writers * args.commits
+        print(f"{args.writers} writers x {args.commits} commits on {args.entries} entries "
+              f"({os.path.basename(path)})")
+        print(f"  commits:   {total / elapsed:9.0f} commits/s   {elapsed * 1000 / total:.3f} ms each, "
+              f"{lost} lost updates")
+        print(f"  reader:    {refreshes} refreshes, {refresh_time * 1000 / max(refreshes, 1):.3f} ms each "
+              f"({reloads} full reloads), full load {load_time * 1000:.1f} ms")
+        if lost or dict(secrets) != expected or reader_secrets != expected:
+            raise SystemExit("vault contents do not match the commits")
+
+
+if __name__ == "__main__":
+    main()
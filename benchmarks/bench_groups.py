@@ -0,0 +1,73 @@
+"""Benchmark: one big vault against the same secrets split into groups.
+
+Startup reads the default group (which holds the password record) and opens the group
+in use; a change is written to that group only. With --journal off every change is a
+full rewrite of the file it goes to, which is where splitting pays most.
+
+    python3 benchmarks/bench_groups.py [--entries 100000] [--groups 20] [--journal on|off]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from entry_crypto import EntryCipher  # noqa: E402
+from groups import DEFAULT_GROUP, VaultGroups  # noqa: E402
+from storage import VaultStore  # noqa: E402
+
+
+# Function to write a vault of `entries` secrets, split evenly into `group_count` groups (1: a single vault)
+def build_vault(tmp, entries, group_count, journal):
+    cipher = EntryCipher(os.urandom(32))
+    token = cipher.encrypt("account", "JBSWY3DPEHPK3PXP")  # One value for all names, never decrypted here
+    groups = VaultGroups(VaultStore(os.path.join(tmp, 'vault.json'), journal=journal))
+    per_group = entries // group_count
+    groups.main.save("hash", {f"account-{i:06d}": token for i in range(per_group)})
+    for g in range(1, group_count):
+        groups.store(groups.create(f"group-{g:03d}")).save(
+            None, {f"account-{g:03d}-{i:06d}": token for i in range(per_group)})
+    return groups.main.path, token
+
+
+# Function to time opening the vault in a fresh process state and `commits` changes to one group
+def run(path, group, token, commits, journal):
+    start = time.perf_counter()
+    groups = VaultGroups(VaultStore(path, journal=journal))
+    groups.open(DEFAULT_GROUP)
+    secrets = groups.open(group)
+    opened = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(commits):
+        secrets[f"new-{i}"] = token
+        groups.commit(group, [("set", f"new-{i}", token)])
+    committed = (time.perf_counter() - start) / commits
+    for store in groups._stores.values():
+        store.wait()
+    return opened, committed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entries", type=int, default=100000)
+    parser.add_argument("--groups", type=int, default=20)
+    parser.add_argument("--commits", type=int, default=50)
+    parser.add_argument("--journal", choices=("on", "off"), default="off")
+    args = parser.parse_args()
+    journal = args.journal == "on"
+
+    print(f"{args.entries} secrets, journal {args.journal}, {args.commits} changes")
+    for group_count in (1, args.groups):
+        with tempfile.TemporaryDirectory() as tmp:
+            path, token = build_vault(tmp, args.entries, group_count, journal)
+            group = DEFAULT_GROUP if group_count == 1 else "group-001"
+            opened, committed = run(path, group, token, args.commits, journal)
+            label = "one vault" if group_count == 1 else f"{group_count} groups"
+            print(f"  {label:10}  open {opened * 1000:8.1f} ms   change {committed * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Benchmark: cost of keeping the vault history, per change and in disk space.
+
+Builds a vault of --entries secrets, then commits --commits changes of one secret each,
+with the history on and off. Reports the time per commit, the history bytes written
+per commit (full versions included) and the time to read back the newest version.
+
+    python3 benchmarks/bench_history.py [--entries 100000] [--commits 2000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from entry_crypto import EntryCipher  # noqa: E402
+from storage import VaultStore  # noqa: E402
+
+
+# Function to get the bytes in the history directory of a store
+def history_size(store):
+    if store.history is None or not os.path.isdir(store.history.dir):
+        return 0
+    return sum(os.path.getsize(os.path.join(store.history.dir, name)) for name in os.listdir(store.history.dir))
+
+
+# Function to build a vault and commit changes to it, returns (seconds per commit, bytes per commit, store)
+def run(tmp, entries, commits, history):
+    cipher = EntryCipher(os.urandom(32))
+    store = VaultStore(os.path.join(tmp, 'vault.json'), history=history)
+    secrets = {name: cipher.encrypt(name, "JBSWY3DPEHPK3PXP") for name in (f"account-{i:06d}" for i in range(entries))}
+    password_hash, secrets, _ = store.save("hash", secrets)
+    start_size = history_size(store)
+    names = [f"account-{(i * 7919) % entries:06d}" for i in range(commits)]
+    tokens = [cipher.encrypt(name, f"GEZDGNBVGY3TQOJ{'QRSTUVWXYZ'[i % 10]}") for i, name in enumerate(names)]
+    start = time.perf_counter()
+    for name, token in zip(names, tokens):
+        secrets[name] = token
+        password_hash, secrets, _ = store.commit([("set", name, token)], password_hash, secrets)
+    elapsed = time.perf_counter() - start
+    store.wait()
+    return elapsed / commits, (history_size(store) - start_size) / commits, start_size, store
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entries", type=int, default=100000)
+    parser.add_argument("--commits", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{args.entries} secrets, {args.commits} commits of one secret each")
+    for history in (False, True):
+        with tempfile.TemporaryDirectory() as tmp:
+            per_commit, per_commit_bytes, first_size, store = run(tmp, args.entries, args.commits, history)
+            line = f"  history {'on ' if history else 'off'}  {per_commit * 1000:7.3f} ms/commit"
+            if history:
+                versions = store.history.versions()
+                start = time.perf_counter()
+                store.history.secrets(versions[-1]["version"])
+                read = time.perf_counter() - start
+                line += (f"  {per_commit_bytes:8.0f} bytes/commit  first version {first_size / 1e6:.1f} MB"
+                         f"  {sum(v['kind'] == 'full' for v in versions)} full versions"
+                         f"  newest read back in {read * 1000:.0f} ms")
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
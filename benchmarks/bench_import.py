@@ -0,0 +1,65 @@
+"""Benchmark: bulk import and export of secrets in every supported format.
+
+Writes --entries secrets as otpauth URIs, CSV and JSON lines, then imports each
+file into an empty vault (parse, validate, encrypt, one atomic commit) and exports
+it again. The KDF unlock is not part of the timings.
+
+    python3 benchmarks/bench_import.py [--entries 100000] [--binary]
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+import kdf  # noqa: E402
+import transfer  # noqa: E402
+from entry_crypto import EntryCipher  # noqa: E402
+from storage import VaultStore  # noqa: E402
+
+ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZ234567"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entries", type=int, default=100000)
+    parser.add_argument("--binary", action="store_true", help="import into vault.bin instead of vault.json")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    values = {f"Issuer{i % 100}:user{i}@example.com": "".join(rng.choice(ALPHABET) for _ in range(32))
+              for i in range(args.entries)}
+    data_key = kdf.new_data_key()
+    password_hash = kdf.hash_password("benchmark", data_key, {"kdf": "pbkdf2_sha256", "iterations": 1000})
+
+    print(f"{args.entries} entries")
+    with tempfile.TemporaryDirectory() as tmp:
+        for file_format in transfer.FORMATS:
+            source = io.StringIO()
+            transfer.export_entries(source, file_format, values, EntryCipher(data_key))  # Plain values pass through
+            path = os.path.join(tmp, 'vault.bin' if args.binary else 'vault.json')
+            store = VaultStore(path)
+            secrets = {}
+            cipher = EntryCipher(data_key)
+
+            start = time.perf_counter()
+            added, errors = transfer.import_entries(io.StringIO(source.getvalue()), file_format, store,
+                                                    password_hash, secrets, cipher)
+            import_time = time.perf_counter() - start
+            assert added == args.entries and not errors
+
+            start = time.perf_counter()
+            transfer.export_entries(io.StringIO(), file_format, store.load()[1], cipher)
+            export_time = time.perf_counter() - start
+            print(f"  {file_format:8s} import {import_time:6.2f} s ({added / import_time:8.0f}/s)"
+                  f"   export {export_time:6.2f} s ({added / export_time:8.0f}/s)")
+            store.wait()
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Benchmark: full vault.json rewrite vs journal append for single-secret edits.
+
+    python3 benchmarks/bench_journal.py [--entries 10000] [--edits 200]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from storage import VaultStore  # noqa: E402
+
+
+# Function to build a synthetic vault with the given number of entries
+def synthetic_secrets(count):
+    return {f"account-{i:06d}": "JBSWY3DPEHPK3PXP" for i in range(count)}
+
+
+# Function to time a number of single-entry edits against a fresh store
+def run(journal, entries, edits):
+    with tempfile.TemporaryDirectory() as tmp:
+        store = VaultStore(os.path.join(tmp, 'vault.json'), journal=journal)
+        secrets = synthetic_secrets(entries)
+        store.save("hash", secrets)
+
+        start = time.perf_counter()
+        for i in range(edits):
+            name = f"account-{i % entries:06d}"
+            secrets[name] = "GEZDGNBVGY3TQOJQ"
+            store.commit([("set", name, secrets[name])], "hash", secrets)
+        elapsed = time.perf_counter() - start
+        store.wait()
+
+        # Make sure nothing was lost on the way
+        password_hash, loaded = store.load()
+        assert loaded == secrets and password_hash == "hash"
+        return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entries", type=int, default=10000)
+    parser.add_argument("--edits", type=int, default=200)
+    args = parser.parse_args()
+
+    rewrite = run(False, args.entries, args.edits)
+    journal = run(True, args.entries, args.edits)
+    print(f"{args.entries} entries, {args.edits} edits")
+    print(f"  full rewrite: {rewrite * 1000 / args.edits:8.3f} ms/edit")
+    print(f"  journal:      {journal * 1000 / args.edits:8.3f} ms/edit  ({rewrite / journal:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Benchmark: terminal output and time per arrow key in the main menu.
+
+Compares main_menu (layout cached per terminal size, two rows redrawn per key) with
+the old loop, which reloaded nothing but cleared the screen and redrew the splash art
+and every menu row on each key.
+
+    python3 benchmarks/bench_menu.py [--keys 1000]
+"""
+import argparse
+import curses
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+import authenticator  # noqa: E402
+import layout  # noqa: E402
+
+
+class Done(Exception):
+    pass
+
+
+class FakeScreen:
+    """Minimal curses window: counts the bytes written and feeds arrow keys."""
+
+    def __init__(self, keys, h=24, w=80):
+        self.keys = keys
+        self.h, self.w = h, w
+        self.bytes_written = 0
+
+    def getmaxyx(self):
+        return self.h, self.w
+
+    def addstr(self, y, x, text, attr=0):
+        self.bytes_written += len(text.encode('utf-8'))
+
+    def clear(self):
+        self.bytes_written += 4  # Clear screen escape sequence
+
+    def refresh(self):
+        pass
+
+    def getch(self):
+        if not self.keys:
+            raise Done
+        return self.keys.pop()
+
+
+# The old main menu loop: full clear and redraw on every key
+def old_main_menu(stdscr):
+    splash_art = layout.splash_art()
+    selected_option = 0
+    h, w = stdscr.getmaxyx()
+    menu = authenticator.MENU
+    while True:
+        stdscr.clear()
+        art_start_y = max((h - len(splash_art)) // 2 - 4, 0)
+        for i, line in enumerate(splash_art):
+            x = max((w - len(line)) // 2, 0)
+            stdscr.addstr(art_start_y + i, x, line.strip())
+        stdscr.addstr(art_start_y + len(splash_art) + 2, (w - len("Main Menu")) // 2, "Main Menu")
+        for i in range(len(menu)):
+            attr = curses.A_REVERSE if i == selected_option else curses.A_NORMAL
+            stdscr.addstr(art_start_y + len(splash_art) + 4 + i, (w - len(menu[i])) // 2, menu[i], attr)
+        stdscr.refresh()
+        key = stdscr.getch()
+        if key == curses.KEY_UP and selected_option > 0:
+            selected_option -= 1
+        elif key == curses.KEY_DOWN and selected_option < len(menu) - 1:
+            selected_option += 1
+
+
+# Function to press `count` arrow keys (down through the menu and back up), returns (bytes, seconds) per key
+def run(menu_loop, count):
+    rows = len(authenticator.MENU) - 1
+    keys = [curses.KEY_DOWN if (i // rows) % 2 == 0 else curses.KEY_UP for i in range(count)]
+    screen = FakeScreen(list(reversed(keys)))
+    start = time.perf_counter()
+    try:
+        menu_loop(screen)
+    except Done:
+        pass
+    return screen.bytes_written / count, (time.perf_counter() - start) / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--keys", type=int, default=1000)
+    args = parser.parse_args()
+
+    curses.curs_set = lambda visibility: None  # No terminal here
+    old_bytes, old_time = run(old_main_menu, args.keys)
+    new_bytes, new_time = run(authenticator.main_menu, args.keys)
+    print(f"{args.keys} arrow keys in the main menu (80x24)")
+    print(f"  full redraw:   {old_bytes:8.1f} bytes/key  {old_time * 1e6:8.1f} us/key")
+    print(f"  cached layout: {new_bytes:8.1f} bytes/key  {new_time * 1e6:8.1f} us/key"
+          f"  ({old_bytes / new_bytes:.0f}x fewer bytes)")
+
+
+if __name__ == "__main__":
+    main()
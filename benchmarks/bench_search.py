@@ -0,0 +1,46 @@
+"""Benchmark: type-to-filter search over secret names, one query per keystroke.
+
+    python3 benchmarks/bench_search.py [--names 50000] [--query github-prod]
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from name_index import NameIndex  # noqa: E402
+
+WORDS = ["github", "google", "aws", "azure", "gitlab", "slack", "okta", "prod", "staging", "admin",
+         "root", "dev", "ops", "mail", "vpn", "db", "infra", "backup", "ci", "jira"]
+
+
+# Function to build synthetic account names like "github-prod-k123"
+def synthetic_names(count, seed=1):
+    rng = random.Random(seed)
+    return [f"{rng.choice(WORDS)}-{rng.choice(WORDS)}-{rng.choice(string.ascii_lowercase)}{i}" for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--names", type=int, default=50000)
+    parser.add_argument("--query", default="github-prod")
+    args = parser.parse_args()
+
+    names = synthetic_names(args.names)
+    start = time.perf_counter()
+    index = NameIndex(names)
+    print(f"{args.names} names, index built in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    for i in range(1, len(args.query) + 1):
+        query = args.query[:i]
+        start = time.perf_counter()
+        results = index.search(query)
+        elapsed = time.perf_counter() - start
+        print(f"  {query!r:16s} {len(results):4d} results  {elapsed * 1000:7.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""Benchmark suite: vault I/O, code generation and screen rendering at several vault sizes.
+
+For each size (10, 1000 and 100000 secrets by default) a synthetic encrypted vault is
+written to a temporary directory and the curses app is pointed at it. Measured are
+load_secrets, save_secrets, generate_code (cycling through all secrets), is_base32, and
+one frame of main_menu, list_secrets and draw_timer drawn on an in-memory window, so no
+terminal is needed. load_secrets includes building the name index; generate_code:cold
+empties the code cache before each call. Every result is the median over repeated runs.
+
+Results are written as JSON (with the commit, Python version and machine) so two runs
+can be compared; --compare prints the ratios against an older results file and exits
+with status 1 if anything got slower than --threshold.
+
+    python3 benchmarks/bench_suite.py [--sizes 10,1000,100000] [--output bench_results.json]
+    python3 benchmarks/bench_suite.py --output new.json --compare old.json [--threshold 1.25]
+"""
+import argparse
+import curses
+import itertools
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, 'src'))
+
+import authenticator  # noqa: E402
+from code_engine import engine, is_base32  # noqa: E402
+from entry_crypto import EntryCipher  # noqa: E402
+from groups import VaultGroups  # noqa: E402
+from storage import VaultStore  # noqa: E402
+
+ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZ234567"
+MIN_TIME = 0.3  # Seconds spent per measurement, at least MIN_RUNS runs
+MIN_RUNS = 3
+
+
+class FrameDone(Exception):
+    pass
+
+
+class FakeWindow:
+    """In-memory curses window: keeps the cells written, ends the frame at the first getch."""
+
+    def __init__(self, h=24, w=80):
+        self.h, self.w = h, w
+        self.cells = {}
+        self.cells_written = 0
+
+    def getmaxyx(self):
+        return self.h, self.w
+
+    def addstr(self, y, x, text, attr=0):
+        if not (0 <= y < self.h and 0 <= x and x + len(text) <= self.w):
+            raise curses.error(f"addstr({y}, {x}) outside the {self.h}x{self.w} window")
+        for i, char in enumerate(text):
+            self.cells[(y, x + i)] = char
+        self.cells_written += len(text)
+
+    def addnstr(self, y, x, text, n, attr=0):
+        self.addstr(y, x, text[:n], attr)
+
+    def clear(self):
+        self.cells.clear()
+
+    def getch(self):
+        raise FrameDone
+
+    # refresh, timeout, move, clrtoeol, keypad ... are not needed in memory
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+# Function to time a call, returns {"median_s", "min_s", "runs", "number"} per call
+# Fast calls are repeated `number` times per run so the timer resolution does not matter
+def measure(func):
+    number = 1
+    while number < 10 ** 6:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        if time.perf_counter() - start >= 0.01:
+            break
+        number *= 10
+    runs = []
+    deadline = time.perf_counter() + MIN_TIME
+    while len(runs) < MIN_RUNS or time.perf_counter() < deadline:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        runs.append((time.perf_counter() - start) / number)
+    return {"median_s": statistics.median(runs), "min_s": min(runs), "runs": len(runs), "number": number}
+
+
+# Function to draw one frame of a screen on a fresh fake window, returns the cells it wrote
+def frame(screen, *args):
+    window = FakeWindow()
+    try:
+        screen(window, *args)
+    except FrameDone:
+        pass
+    return window.cells_written
+
+
+# Function to write a synthetic vault and point the app at it, returns the plaintext values
+def setup_vault(tmp, size, seed=0):
+    rng = random.Random(seed)
+    cipher = EntryCipher(os.urandom(32), max_cached=size)
+    values = ["".join(rng.choice(ALPHABET) for _ in range(32)) for _ in range(size)]
+    secrets = {f"account-{i:06d}": cipher.encrypt(f"account-{i:06d}", value) for i, value in enumerate(values)}
+    authenticator.store = VaultStore(os.path.join(tmp, 'vault.json'))
+    authenticator.store.save("hash", secrets)
+    authenticator.vault_cipher = cipher
+    return values
+
+
+# Function to load the vault in the app and wait for the name index (started in the background)
+# The groups are created again each time, they keep what they have read
+def load_secrets():
+    authenticator.groups = VaultGroups(authenticator.store)
+    authenticator.load_secrets()
+    authenticator.get_name_index()
+
+
+# Function to run every measurement for one vault size
+def run_size(size):
+    with tempfile.TemporaryDirectory() as tmp:
+        values = setup_vault(tmp, size)
+        results = {"load_secrets": measure(load_secrets), "save_secrets": measure(authenticator.save_secrets)}
+
+        codes = itertools.cycle(values)
+        results["generate_code"] = measure(lambda: authenticator.generate_code(next(codes)))
+        results["generate_code:cold"] = measure(lambda: (engine.forget(),
+                                                         authenticator.generate_code(next(codes))))
+        results["is_base32"] = measure(lambda: is_base32(values[0]))
+
+        curses.curs_set = lambda visibility: None  # Needs a real terminal, nothing to hide in memory
+        for name, screen, args in [("frame:main_menu", authenticator.main_menu, ()),
+                                   ("frame:list_secrets", authenticator.list_secrets, ()),
+                                   ("frame:draw_timer", authenticator.draw_timer, (values[0],))]:
+            results[name] = measure(lambda: frame(screen, *args))
+            results[name]["cells"] = frame(screen, *args)
+        return results
+
+
+# Function to describe where the results come from
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"commit": commit, "python": platform.python_version(), "machine": platform.machine(),
+            "system": platform.system(), "cpus": os.cpu_count(), "date": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+# Function to print the ratios against older results, returns the names of the regressions
+def compare(results, old_results, threshold):
+    regressions = []
+    print(f"\ncompared with {old_results['environment'].get('commit')} (new / old fastest run, the least noisy)")
+    for size, metrics in results["sizes"].items():
+        old_metrics = old_results["sizes"].get(size, {})
+        for name, result in metrics.items():
+            if name not in old_metrics:
+                continue
+            ratio = result["min_s"] / old_metrics[name]["min_s"]
+            flag = "  SLOWER" if ratio > threshold else ""
+            print(f"  {size:>7} {name:22} {ratio:6.2f}x{flag}")
+            if flag:
+                regressions.append(f"{name} at {size}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10,1000,100000", help="comma separated vault sizes")
+    parser.add_argument("--output", default="bench_results.json", help="JSON results file")
+    parser.add_argument("--compare", help="older JSON results file to compare with")
+    parser.add_argument("--threshold", type=float, default=1.25, help="slowdown ratio reported as a regression")
+    args = parser.parse_args()
+
+    results = {"environment": environment(), "sizes": {}}
+    for size in (int(size) for size in args.sizes.split(",")):
+        print(f"{size} secrets")
+        results["sizes"][str(size)] = metrics = run_size(size)
+        for name, result in metrics.items():
+            print(f"  {name:22} {result['median_s'] * 1e6:12.1f} us  (min {result['min_s'] * 1e6:.1f} us, "
+                  f"{result['runs']} runs)")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            raise SystemExit(f"slower than {args.threshold:g}x: {', '.join(regressions)}")
+
+
+if __name__ == "__main__":
+    main()
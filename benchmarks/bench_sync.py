@@ -0,0 +1,82 @@
+"""Benchmark: syncing two copies of a large vault that differ in a few secrets.
+
+Builds a vault of --entries secrets and a copy of it, syncs them once (the first sync
+stamps every entry), then makes --changes changes on each copy and syncs again. It
+reports the time of the first sync, of the sync of the changes (with the vault
+history, and without it, where every entry is compared), of a sync with a mirror
+directory and the time it takes to load the two vaults, for comparison.
+
+    python3 benchmarks/bench_sync.py [--entries 100000] [--changes 5]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+import sync  # noqa: E402
+from entry_crypto import EntryCipher  # noqa: E402
+from storage import VaultStore  # noqa: E402
+
+
+# Function to open a vault file as a sync replica
+def replica(path, history):
+    store = VaultStore(path, history=history)
+    password_hash, secrets = store.load()
+    return sync.VaultReplica(store, password_hash, secrets)
+
+
+# Function to change `count` secrets of a vault (edits and one delete), different ones for each `seed`
+def change(replica, cipher, count, seed):
+    names = [f"account-{(seed * 1000 + i) * 7919 % len(replica.secrets):06d}" for i in range(count)]
+    ops = [("set", name, cipher.encrypt(name, "GEZDGNBVGY3TQOJQ")) for name in names[1:]] + [("del", names[0])]
+    replica.store.commit(ops, replica.password_hash, replica.secrets)
+
+
+# Function to time a sync between a vault and another copy, returns (seconds, taken, sent)
+def timed_sync(local_path, other, history):
+    start = time.perf_counter()
+    received, sent = sync.sync(replica(local_path, history), other)
+    return time.perf_counter() - start, received, sent
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entries", type=int, default=100000)
+    parser.add_argument("--changes", type=int, default=5)
+    args = parser.parse_args()
+
+    cipher = EntryCipher(os.urandom(32))
+    print(f"{args.entries} secrets, {args.changes} changes on each copy")
+    for history in (True, False):
+        with tempfile.TemporaryDirectory() as tmp:
+            a, b = os.path.join(tmp, 'a.json'), os.path.join(tmp, 'b.json')
+            secrets = {name: cipher.encrypt(name, "JBSWY3DPEHPK3PXP")
+                       for name in (f"account-{i:06d}" for i in range(args.entries))}
+            for path in (a, b):  # The same values: b is a copy of a
+                VaultStore(path, history=history).save({"kdf": "none"}, secrets)
+
+            first, _, _ = timed_sync(a, replica(b, history), history)
+            change(replica(a, history), cipher, args.changes, 1)
+            change(replica(b, history), cipher, args.changes, 2)
+            start = time.perf_counter()
+            replica(a, history), replica(b, history)
+            load = time.perf_counter() - start
+            elapsed, received, sent = timed_sync(a, replica(b, history), history)
+            again, _, _ = timed_sync(a, replica(b, history), history)
+            line = (f"  history {'on ' if history else 'off'}  first sync {first * 1000:6.0f} ms  "
+                    f"sync of the changes {elapsed * 1000:6.0f} ms ({len(received)} taken, {len(sent)} sent)  "
+                    f"in sync {again * 1000:5.0f} ms  loading both vaults {load * 1000:5.0f} ms")
+            if history:
+                mirror = os.path.join(tmp, 'mirror')
+                sync.sync(replica(a, history), sync.MirrorReplica(mirror))
+                change(replica(a, history), cipher, args.changes, 3)
+                mirrored, received, sent = timed_sync(a, sync.MirrorReplica(mirror), history)
+                line += f"\n  mirror directory  sync of the changes {mirrored * 1000:6.0f} ms ({len(sent)} sent)"
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
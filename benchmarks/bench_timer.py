@@ -0,0 +1,94 @@
+"""Benchmark: terminal output of the code timer screen over one simulated minute.
+
+Compares the diff-based draw_timer with the old loop, which cleared the screen and
+rewrote every line every 0.5 s.
+
+    python3 benchmarks/bench_timer.py [--seconds 60]
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+import authenticator  # noqa: E402
+import code_engine  # noqa: E402
+
+SECRET = "JBSWY3DPEHPK3PXP"
+
+
+class FakeClock:
+    def __init__(self, start):
+        self.now = start
+
+    def time(self):
+        return self.now
+
+
+class FakeScreen:
+    """Minimal curses window: counts what is written and advances the clock on getch timeouts."""
+
+    def __init__(self, clock, seconds, h=24, w=80):
+        self.clock = clock
+        self.end = clock.now + seconds
+        self.h, self.w = h, w
+        self.bytes_written = 0
+        self.wakeups = 0
+        self._timeout = -1
+
+    def getmaxyx(self):
+        return self.h, self.w
+
+    def addstr(self, y, x, text, attr=0):
+        self.bytes_written += len(text.encode('utf-8'))
+
+    def clear(self):
+        self.bytes_written += 4  # Clear screen escape sequence
+
+    def timeout(self, ms):
+        self._timeout = ms
+
+    def refresh(self):
+        pass
+
+    def getch(self):
+        self.wakeups += 1
+        if self.clock.now >= self.end:
+            return ord('q')
+        self.clock.now += self._timeout / 1000
+        return -1
+
+
+# Function to count the bytes the old full-redraw loop wrote for the same duration
+def legacy_bytes(seconds, start):
+    total = 0
+    t = start
+    while t < start + seconds:
+        remaining = authenticator.engine.seconds_remaining(t)
+        progress = int(remaining / 30 * 30)
+        lines = [f"Current Code: {authenticator.engine.now(SECRET, t)}", f"Time remaining: {int(remaining)} seconds",
+                 "█" * progress + "─" * (30 - progress), "Press 'q' to return to the secrets list."]
+        total += sum(len(line.encode('utf-8')) for line in lines)
+        t += 0.5
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=int, default=60)
+    args = parser.parse_args()
+
+    clock = FakeClock(1700000000.25)
+    authenticator.time = clock  # draw_timer and the code engine only use time.time()
+    code_engine.time = clock
+    screen = FakeScreen(clock, args.seconds)
+    authenticator.draw_timer(screen, SECRET)
+
+    legacy = legacy_bytes(args.seconds, 1700000000.25)
+    print(f"{args.seconds} s of draw_timer")
+    print(f"  old full redraw: {legacy:8d} bytes, {args.seconds * 2:5d} wakeups")
+    print(f"  diff renderer:   {screen.bytes_written:8d} bytes, {screen.wakeups:5d} wakeups")
+
+
+if __name__ == "__main__":
+    main()
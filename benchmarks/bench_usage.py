@@ -0,0 +1,58 @@
+"""Benchmark: cost of counting secret uses and of ranking a vault by use.
+
+Records --uses uses spread over --entries secrets (a few hot ones, as in real use), with
+the uses flushed every --flush uses, and reports the time per recorded use, the lines
+and bytes the usage file grew by, and the time to rank all secrets and to read the file.
+
+    python3 benchmarks/bench_usage.py [--entries 100000] [--uses 100000] [--flush 50]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from usage import UsageStats  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entries", type=int, default=100000)
+    parser.add_argument("--uses", type=int, default=100000)
+    parser.add_argument("--flush", type=int, default=50, help="uses between flushes")
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    names = [f"account-{i:06d}" for i in range(args.entries)]
+    picks = [names[min(int(rng.paretovariate(1.2)) - 1, args.entries - 1)] for _ in range(args.uses)]
+    with tempfile.TemporaryDirectory() as tmp:
+        vault = os.path.join(tmp, 'vault.json')
+        usage = UsageStats(vault, flush_interval=float('inf'))
+        now = time.time()
+        start = time.perf_counter()
+        for i, name in enumerate(picks):
+            usage.record(name, now + i)
+            if (i + 1) % args.flush == 0:
+                usage.flush()
+        usage.flush()
+        elapsed = time.perf_counter() - start
+        size = os.path.getsize(usage.path)
+        lines = sum(1 for _ in open(usage.path, 'rb'))
+
+        start = time.perf_counter()
+        usage.ranked(names)
+        rank = time.perf_counter() - start
+        start = time.perf_counter()
+        UsageStats(vault)
+        load = time.perf_counter() - start
+
+    print(f"{args.uses} uses of {len(set(picks))} of {args.entries} secrets, flushed every {args.flush}")
+    print(f"  {elapsed * 1e6 / args.uses:.1f} us per use, {lines} lines ({size / 1024:.0f} KB) in the usage file")
+    print(f"  ranking all secrets {rank * 1000:.1f} ms, reading the usage file {load * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
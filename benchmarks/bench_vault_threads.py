@@ -0,0 +1,102 @@
+"""Benchmark: reader threads on a Vault while another thread keeps saving.
+
+Reader threads take a snapshot and read the code of a random secret, over and over.
+Runs once with no writer, then with a writer thread committing changes back to back
+(--journal off makes every write a full rewrite of the vault file). The third run
+locks the vault for every read and every write, like a design without snapshots would,
+to show what the readers would otherwise wait for.
+
+    python3 benchmarks/bench_vault_threads.py [--entries 10000] [--readers 4] [--seconds 3] [--journal off]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+import kdf  # noqa: E402
+from entry_crypto import EntryCipher  # noqa: E402
+from storage import VaultStore  # noqa: E402
+from vault import Vault  # noqa: E402
+
+PASSWORD = "benchmark"
+
+
+# Function to write a vault of `entries` secrets, returns its path
+def build_vault(tmp, entries):
+    path = os.path.join(tmp, 'vault.json')
+    data_key = kdf.new_data_key()
+    cipher = EntryCipher(data_key)
+    secrets = {name: cipher.encrypt(name, "JBSWY3DPEHPK3PXP") for name in (f"account-{i:06d}" for i in range(entries))}
+    VaultStore(path).save(kdf.hash_password(PASSWORD, data_key, {"kdf": "pbkdf2_sha256", "iterations": 1000}),
+                          secrets)
+    return path
+
+
+# Function to run readers (and optionally a writer) for `seconds`, returns (reads/s, p99 and max read latency, writes)
+def run(vault, readers, seconds, write, global_lock=None):
+    names = vault.snapshot().names()
+    stop = threading.Event()
+    latencies = [[] for _ in range(readers)]
+    writes = [0]
+
+    def reader(i):
+        rng = random.Random(i)
+        while not stop.is_set():
+            start = time.perf_counter()
+            if global_lock is not None:
+                with global_lock:
+                    vault.snapshot().code(rng.choice(names))
+            else:
+                vault.snapshot().code(rng.choice(names))
+            latencies[i].append(time.perf_counter() - start)
+
+    def writer():
+        while not stop.is_set():
+            if global_lock is not None:
+                with global_lock:
+                    vault.set(f"writer-{writes[0] % 100}", "GEZDGNBVGY3TQOJQ")
+            else:
+                vault.set(f"writer-{writes[0] % 100}", "GEZDGNBVGY3TQOJQ")
+            writes[0] += 1
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    if write:
+        threads.append(threading.Thread(target=writer))
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    vault.close()
+    merged = sorted(latency for run in latencies for latency in run)
+    return len(merged) / seconds, merged[int(len(merged) * 0.99)], merged[-1], writes[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entries", type=int, default=10000)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--journal", choices=("on", "off"), default="on")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = build_vault(tmp, args.entries)
+        vault = Vault(path, journal=args.journal == "on")
+        vault.unlock(PASSWORD)
+        print(f"{args.readers} readers, {args.entries} entries, journal {args.journal}, {args.seconds:g} s per run")
+        for label, write, global_lock in [("no writer", False, None), ("writer, snapshots", True, None),
+                                          ("writer, one lock", True, threading.Lock())]:
+            rate, p99, worst, writes = run(vault, args.readers, args.seconds, write, global_lock)
+            print(f"  {label:18} {rate:10.0f} reads/s   p99 {p99 * 1e6:8.1f} us   max {worst * 1000:7.2f} ms"
+                  f"   {writes / args.seconds:7.0f} writes/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Benchmark: sustained code verifications per second.
+
+Builds a vault of --entries encrypted secrets and verifies batches of (name, code) pairs:
+mostly valid codes with up to one step of clock drift, plus wrong codes and replays.
+Runs the batches in one thread, in a thread pool sharing one Verifier, and in a process
+pool where each process owns the verifier of one shard of the names.
+
+    python3 benchmarks/bench_verify.py [--entries 10000] [--workers 4] [--seconds 3] [--batch 100]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+from code_engine import CodeEngine  # noqa: E402
+from entry_crypto import EntryCipher  # noqa: E402
+from verifier import Verifier  # noqa: E402
+
+ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZ234567"
+
+
+# Function to build a vault of random secrets, returns (secrets, cipher, plaintext values)
+def build_vault(entries, seed=0):
+    rng = random.Random(seed)
+    cipher = EntryCipher(bytes(32), max_cached=entries)  # Sized to the vault, like the agent
+    values = {f"user-{i}": "".join(rng.choice(ALPHABET) for _ in range(32)) for i in range(entries)}
+    return {name: cipher.encrypt(name, value) for name, value in values.items()}, cipher, values
+
+
+# Function to make submitted pairs: valid codes with drift, 10% wrong codes, 10% replays
+def make_pairs(values, count, seed):
+    rng = random.Random(seed)
+    engine = CodeEngine()
+    step = engine.step_at()
+    names = list(values)
+    pairs = []
+    for _ in range(count):
+        name = rng.choice(names)
+        roll = rng.random()
+        if roll < 0.1:
+            pairs.append((name, f"{rng.randrange(10 ** 6):06d}"))
+        elif roll < 0.2 and pairs:
+            pairs.append(rng.choice(pairs))
+        else:
+            pairs.append((name, engine.code_at(values[name], step + rng.choice((-1, 0, 0, 0, 1)))))
+    return pairs
+
+
+# Function to verify batches for `seconds`, returns the number of verifications per second
+def run_batches(verifier, batches, seconds):
+    done = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        pairs = batches[done // len(batches[0]) % len(batches)]
+        verifier.verify_many(pairs)
+        done += len(pairs)
+    return done / (time.perf_counter() - start)
+
+
+# Function run in each worker process: verifier over one shard of the vault, returns its rate
+def shard_worker(entries, shard, shards, batch, seconds):
+    secrets, cipher, values = build_vault(entries)
+    names = [name for i, name in enumerate(values) if i % shards == shard]
+    verifier = Verifier({name: secrets[name] for name in names}, cipher)
+    shard_values = {name: values[name] for name in names}
+    batches = [make_pairs(shard_values, batch, seed) for seed in range(20)]
+    return run_batches(verifier, batches, seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entries", type=int, default=10000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--batch", type=int, default=100)
+    args = parser.parse_args()
+
+    secrets, cipher, values = build_vault(args.entries)
+    batches = [make_pairs(values, args.batch, seed) for seed in range(20)]
+    print(f"{args.entries} secrets, batches of {args.batch}, {args.seconds:g} s per run")
+
+    verifier = Verifier(secrets, cipher)
+    rate = run_batches(verifier, batches, args.seconds)
+    print(f"  1 thread           {rate:10.0f} verifications/s")
+
+    verifier = Verifier(secrets, cipher)
+    with ThreadPoolExecutor(args.workers) as pool:
+        rate = sum(pool.map(run_batches, [verifier] * args.workers, [batches] * args.workers,
+                            [args.seconds] * args.workers))
+    print(f"  {args.workers} threads          {rate:10.0f} verifications/s")
+
+    with ProcessPoolExecutor(args.workers) as pool:
+        futures = [pool.submit(shard_worker, args.entries, shard, args.workers, args.batch, args.seconds)
+                   for shard in range(args.workers)]
+        rate = sum(future.result() for future in futures)
+    print(f"  {args.workers} processes        {rate:10.0f} verifications/s (sharded by name)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""Benchmark: cost of the `authterm watch` pipeline per line written.
+
+Runs the pipeline (ticks, batches, ndjson, write) on a simulated clock over --hours of
+codes for --entries secrets with 30 and 60 second periods, writing to /dev/null, and
+reports the lines written and the CPU time per line. One watch process replaces a
+process start per code (see bench_cli.py for that cost).
+
+    python3 benchmarks/bench_watch.py [--entries 1000] [--hours 1]
+"""
+import argparse
+import itertools
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+import watch  # noqa: E402
+from code_engine import make_value  # noqa: E402
+
+
+class Source:
+    """Fixed secrets, the vault never changes."""
+
+    def __init__(self, entries):
+        self._entries = entries
+
+    def entries(self):
+        return self._entries
+
+    def changed(self):
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--entries", type=int, default=1000)
+    parser.add_argument("--hours", type=float, default=1.0)
+    args = parser.parse_args()
+
+    entries = [(f"account-{i:06d}", make_value("JBSWY3DPEHPK3PXP", period=30 if i % 2 else 60))
+               for i in range(args.entries)]
+    clock = [1700000000.0]
+    end = clock[0] + args.hours * 3600
+
+    def sleep(seconds):
+        clock[0] += seconds
+
+    batches = watch.batches(Source(entries), clock=lambda: clock[0], sleep=sleep)
+    batches = itertools.takewhile(lambda events: clock[0] < end, batches)
+    lines = [0]
+
+    def count(chunks):
+        for chunk in chunks:
+            lines[0] += chunk.count("\n")
+            yield chunk
+
+    with open(os.devnull, 'w') as out:
+        start = time.process_time()
+        watch.write(count(watch.ndjson(batches)), out)
+        cpu = time.process_time() - start
+    print(f"{args.entries} secrets, {args.hours:g} h simulated: {lines[0]} lines, "
+          f"{cpu * 1e6 / lines[0]:.1f} us CPU per line, {cpu:.2f} s CPU in total")
+
+
+if __name__ == "__main__":
+    main()
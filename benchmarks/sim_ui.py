@@ -0,0 +1,315 @@
+"""UI load simulator: runs the whole curses app headless, driven by a keystroke script.
+
+Builds a synthetic vault of --entries secrets, then runs authenticator.main() on an
+in-memory screen. The screen raises curses.error for writes outside the window, as
+curses does, so a screen that overflows crashes here too. For every key, the simulator
+records the time the app took to handle it: from getch() returning the key to the app's
+next read. It also records the cells written meanwhile; a refresh after clear() counts as a
+full repaint.
+It then reports p50/p95/p99/max per screen. It exits with 1 if the app raises, if the
+p99 latency goes over budget, or if a key makes more than --budget-repaints full screens
+of writes.
+
+    python3 benchmarks/sim_ui.py [--entries 1000] [--size 24x80] [--script FILE]
+                                 [--budget-ms 50] [--budget-repaints 2] [--json results.json]
+
+A script is a list of steps separated by whitespace (# starts a comment):
+
+    down  up  left  right  pgup  pgdn  home  end  enter  esc  backspace  KEY*N (repeated)
+    q  x  /  ...           a single character is that key
+    type:TEXT              the characters of TEXT, one key each
+    line:TEXT              an answer to a getstr() prompt (line: alone answers an empty line)
+    tick  tick*N           a timed getch() runs out: no key, the clock moves on by its timeout
+    wait                   timed getch() calls run out until the app waits for a key (progress bars)
+    pause:MS               the user thinks for MS milliseconds (real time, lets background work finish)
+    resize:HxW             the terminal is resized, the app gets KEY_RESIZE
+"""
+import argparse
+import curses
+import json
+import os
+import sys
+import tempfile
+import time
+import traceback
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+import authenticator  # noqa: E402
+import kdf  # noqa: E402
+from entry_crypto import EntryCipher  # noqa: E402
+from groups import VaultGroups  # noqa: E402
+from storage import VaultStore  # noqa: E402
+
+PASSWORD = "simulator"
+KEYS = {"up": curses.KEY_UP, "down": curses.KEY_DOWN, "left": curses.KEY_LEFT, "right": curses.KEY_RIGHT,
+        "pgup": curses.KEY_PPAGE, "pgdn": curses.KEY_NPAGE, "home": curses.KEY_HOME, "end": curses.KEY_END,
+        "enter": 10, "esc": 27, "backspace": 127}
+
+# Every menu entry once, with scrolling, search, edit, delete and the live code screens
+DEFAULT_SCRIPT = """
+enter                                   # splash screen
+line:simulator wait pause:500 enter     # unlock, then read the menu
+enter type:sim-new enter type:JBSWY3DPEHPK3PXP enter enter        # 1. Create Secret
+down enter down*30 pgdn*5 / type:account-00 enter down*5 enter line: line: x    # 2. Edit Secret
+down enter pgdn*20 end home / type:account-0001 enter enter tick*3 q x      # 3. List Secrets
+down enter tick*5 pgdn*10 down*3 q      # 4. All Codes
+down enter down*10 enter y enter        # 5. Delete Secret
+down enter enter                        # 6. Switch Group
+resize:40x120 down*2 enter enter        # 8. About, in a larger terminal
+resize:24x80 down*3 enter               # 10. Exit
+enter
+"""
+
+
+class ScriptError(Exception):
+    pass
+
+
+class ScriptEnd(Exception):
+    pass
+
+
+# Function to parse a script into steps: ("key", code), ("line", text), ("tick",), ("wait",), ("pause", ms),
+# ("resize", h, w)
+def parse_script(text):
+    steps = []
+    for line in text.splitlines():
+        for token in line.split("#", 1)[0].split():
+            count = 1
+            if "*" in token and token.rsplit("*", 1)[1].isdigit():
+                token, count = token.rsplit("*", 1)[0], int(token.rsplit("*", 1)[1])
+            if token.startswith("type:"):
+                step = [("key", ord(char)) for char in token[5:]]
+            elif token.startswith("line:"):
+                step = [("line", token[5:])]
+            elif token.startswith("resize:"):
+                h, w = token[7:].split("x")
+                step = [("resize", int(h), int(w))]
+            elif token.startswith("pause:"):
+                step = [("pause", int(token[6:]))]
+            elif token in ("tick", "wait"):
+                step = [(token,)]
+            elif token in KEYS:
+                step = [("key", KEYS[token])]
+            elif len(token) == 1:
+                step = [("key", ord(token))]
+            else:
+                raise ScriptError(f"unknown script step '{token}'")
+            steps += step * count
+    return steps
+
+
+class SimScreen:
+    """In-memory curses window fed by a script; times the handling of every key."""
+
+    def __init__(self, steps, h, w, clock):
+        self.steps = steps
+        self.position = 0  # Next step
+        self.h, self.w = h, w
+        self.clock = clock  # Simulated time offset, moved on by ticks
+        self.delay = -1  # Milliseconds set by timeout(), -1 for blocking reads
+        self.samples = []  # (screen, kind, seconds, cells, script step, screen cells) per key or tick handled
+        self.wrapped = 0  # Writes that ran past the right edge onto the next line
+        self._pending = None  # (screen, kind, start, script step) of the input being handled
+        self._cells = 0
+        self._cleared = False  # clear() since the last refresh
+
+    def getmaxyx(self):
+        return self.h, self.w
+
+    def addstr(self, y, x, text, attr=0):
+        start = y * self.w + x
+        if not (0 <= y < self.h and 0 <= x < self.w) or start + len(text) >= self.h * self.w:
+            raise curses.error(f"addstr({y}, {x}, {text[:20]!r}...) outside the {self.h}x{self.w} window")
+        if x + len(text) > self.w:
+            self.wrapped += 1
+        self._cells += len(text)
+
+    def addnstr(self, y, x, text, n, attr=0):
+        self.addstr(y, x, text[:n], attr)
+
+    def move(self, y, x):
+        if not (0 <= y < self.h and 0 <= x < self.w):
+            raise curses.error(f"move({y}, {x}) outside the {self.h}x{self.w} window")
+
+    def clear(self):
+        self._cleared = True  # The whole screen is sent again on the next refresh, once
+
+    def refresh(self):
+        if self._cleared:
+            self._cells += self.h * self.w
+            self._cleared = False
+
+    def timeout(self, delay):
+        self.delay = delay
+
+    # clrtoeol, clrtobot, keypad ... write nothing that needs counting
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+    # Function to close the sample of the input handled so far, when the app asks for the next one
+    def _finish(self):
+        self.refresh()  # Reading input refreshes the screen
+        if self._pending is not None:
+            screen, kind, start, step = self._pending
+            self.samples.append((screen, kind, time.perf_counter() - start, self._cells, step, self.h * self.w))
+        self._pending = None
+        self._cells = 0
+
+    def _begin(self, kind):
+        screen = sys._getframe(2).f_code.co_name  # The app function that asked for input
+        self._pending = (screen, kind, time.perf_counter(), self.position)
+
+    # Function to sleep through the pauses before the next step
+    def _pause(self):
+        while self.position < len(self.steps) and self.steps[self.position][0] == "pause":
+            time.sleep(self.steps[self.position][1] / 1000)
+            self.position += 1
+
+    def getch(self):
+        self._finish()
+        while True:
+            self._pause()
+            if self.position >= len(self.steps):
+                raise ScriptEnd
+            step = self.steps[self.position]
+            if step[0] == "wait":
+                if self.delay >= 0:
+                    time.sleep(min(self.delay, 10) / 1000)  # Lets the worker thread of a progress bar run
+                    return -1
+                self.position += 1  # The app waits for a key: the wait is over
+                continue
+            self.position += 1
+            if step[0] == "tick":
+                if self.delay < 0:
+                    raise ScriptError(f"step {self.position}: tick, but the app waits for a key")
+                self.clock[0] += self.delay / 1000
+                self._begin("tick")
+                return -1
+            if step[0] == "resize":
+                self.h, self.w = step[1], step[2]
+                self._begin("key")
+                return curses.KEY_RESIZE
+            if step[0] == "line":
+                raise ScriptError(f"step {self.position}: line, but the app reads a key")
+            self._begin("key")
+            return step[1]
+
+    def getstr(self, y, x, n):
+        self._finish()
+        self.move(y, x)
+        self._pause()
+        if self.position >= len(self.steps):
+            raise ScriptEnd
+        step = self.steps[self.position]
+        self.position += 1
+        if step[0] != "line":
+            raise ScriptError(f"step {self.position}: {step[0]}, but the app reads a line (getstr)")
+        self._cells += len(step[1][:n])  # Echoed as it is typed
+        self._begin("key")
+        return step[1][:n].encode('utf-8')
+
+
+# Function to write a vault of `entries` secrets and point the app at it
+def setup_vault(tmp, entries):
+    data_key = kdf.new_data_key()
+    cipher = EntryCipher(data_key)
+    secrets = {name: cipher.encrypt(name, "JBSWY3DPEHPK3PXP") for name in (f"account-{i:06d}" for i in range(entries))}
+    store = VaultStore(os.path.join(tmp, 'vault.json'))
+    store.save(kdf.hash_password(PASSWORD, data_key, {"kdf": "pbkdf2_sha256", "iterations": 1000}), secrets)
+    authenticator.store = store
+    authenticator.groups = VaultGroups(store)
+
+
+# Function to get a percentile (nearest rank) of sorted values
+def percentile(values, fraction):
+    return values[min(int(fraction * len(values)), len(values) - 1)]
+
+
+# Function to summarize samples: count and latency/cells percentiles
+def summarize(samples):
+    latencies = sorted(sample[2] for sample in samples)
+    cells = sorted(sample[3] for sample in samples)
+    return {"count": len(samples),
+            "p50_ms": percentile(latencies, 0.50) * 1000, "p95_ms": percentile(latencies, 0.95) * 1000,
+            "p99_ms": percentile(latencies, 0.99) * 1000, "max_ms": latencies[-1] * 1000,
+            "cells_p50": percentile(cells, 0.50), "cells_max": cells[-1]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=1000)
+    parser.add_argument("--size", default="24x80", help="terminal size, HxW")
+    parser.add_argument("--script", help="file with the keystroke script (default: every menu entry)")
+    parser.add_argument("--budget-ms", type=float, default=50.0, help="p99 time to handle a key")
+    parser.add_argument("--budget-repaints", type=float, default=2.0,
+                        help="most cells written for one key, in full screens")
+    parser.add_argument("--json", help="write the results to this file")
+    args = parser.parse_args()
+
+    if args.script:
+        with open(args.script, 'r', encoding='utf-8') as f:
+            steps = parse_script(f.read())
+    else:
+        steps = parse_script(DEFAULT_SCRIPT)
+    h, w = (int(part) for part in args.size.split("x"))
+
+    # No terminal: curses calls that need one do nothing, the clock moves on with the ticks
+    curses.curs_set = curses.echo = curses.noecho = lambda *args: None
+    clock = [0.0]
+    real_time = time.time
+    time.time = lambda: real_time() + clock[0]
+
+    screen = SimScreen(steps, h, w, clock)
+    error = None
+    with tempfile.TemporaryDirectory() as tmp:
+        setup_vault(tmp, args.entries)
+        try:
+            authenticator.main(screen)
+        except (SystemExit, ScriptEnd):
+            screen._finish()
+        except Exception:
+            error = traceback.format_exc()
+
+    keys = [sample for sample in screen.samples if sample[1] == "key"]
+    results = {"entries": args.entries, "size": args.size, "steps": len(steps), "steps_run": screen.position,
+               "wrapped_writes": screen.wrapped, "error": error, "screens": {}}
+    print(f"{args.entries} secrets, {args.size}, {screen.position}/{len(steps)} script steps")
+    print(f"  {'screen':18} {'inputs':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} "
+          f"{'cells p50':>9} {'cells max':>9}")
+    for name in sorted({sample[0] for sample in screen.samples}):
+        stats = summarize([sample for sample in screen.samples if sample[0] == name])
+        results["screens"][name] = stats
+        print(f"  {name:18} {stats['count']:6d} {stats['p50_ms']:8.2f} {stats['p95_ms']:8.2f} {stats['p99_ms']:8.2f} "
+              f"{stats['max_ms']:8.2f} {stats['cells_p50']:9d} {stats['cells_max']:9d}")
+
+    failures = []
+    if error:
+        failures.append(f"the app raised at script step {screen.position}:\n{error}")
+    if keys:
+        results["keys"] = stats = summarize(keys)
+        print(f"  {'all keys':18} {stats['count']:6d} {stats['p50_ms']:8.2f} {stats['p95_ms']:8.2f} "
+              f"{stats['p99_ms']:8.2f} {stats['max_ms']:8.2f} {stats['cells_p50']:9d} {stats['cells_max']:9d}")
+        if stats["p99_ms"] > args.budget_ms:
+            failures.append(f"p99 key latency {stats['p99_ms']:.2f} ms is over the budget of {args.budget_ms:g} ms")
+        over = [sample for sample in keys if sample[3] > args.budget_repaints * sample[5]]
+        if over:
+            sample = max(over, key=lambda sample: sample[3] / sample[5])
+            failures.append(f"{len(over)} keys wrote more than {args.budget_repaints:g} screens, "
+                            f"step {sample[4]} in {sample[0]}: {sample[3]} cells on a {sample[5]} cell screen")
+    if keys:
+        print("  slowest keys: " + ", ".join(f"step {sample[4]} in {sample[0]} {sample[2] * 1000:.1f} ms"
+                                              for sample in sorted(keys, key=lambda sample: -sample[2])[:3]))
+    if screen.wrapped:
+        print(f"  {screen.wrapped} writes ran past the right edge of the screen")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -52,7 +52,7 @@ echo "Creating executable script for authterm..."
 cat << EOF > /usr/local/bin/authterm
 #!/bin/bash
 source "$SCRIPT_DIR/venv/bin/activate"  # Path to your virtual environment
-exec python3 "$SCRIPT_DIR/src/authenticator.py"  # Path to your script
+exec python3 "$SCRIPT_DIR/src/cli.py" "\$@"  # Path to your script, subcommands run without curses
 EOF
 
 # Make the script executable
@@ -0,0 +1,328 @@
+"""Background agent that keeps the vault unlocked and serves codes over a Unix socket.
+
+The agent unlocks the vault once, keeps it in memory and exits after IDLE_TIMEOUT
+seconds without requests. Clients send one JSON object per line and get one JSON
+object per line back, in order, so requests can be pipelined on one connection:
+
+    {"op": "code", "names": ["github", "aws"], "next": false}
+        -> {"ok": true, "codes": {"github": "123456", "aws": "654321"}, "missing": [],
+            "remaining": {"github": 17, "aws": 47}}   (seconds left, not given for counter based secrets)
+    {"op": "list"}   -> {"ok": true, "names": [...]}
+    {"op": "verify", "pairs": [["github", "123456"]], "window": 1}
+        -> {"ok": true, "valid": [true]}   (a code is only valid once, see verifier.py)
+    {"op": "ping"}   -> {"ok": true, "pid": 1234}
+    {"op": "stop"}   -> {"ok": true}, then the agent exits
+
+Errors are answered with {"ok": false, "error": "..."}. The socket is only
+accessible by its owner (mode 0600). An agent serves one group of the vault, each
+group has its own socket (see socket_path).
+"""
+import json
+import math
+import os
+import socket
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOCKET_PATH = os.environ.get("AUTHTERM_AGENT_SOCKET") or os.path.join(BASE_DIR, 'agent.sock')
+IDLE_TIMEOUT = float(os.environ.get("AUTHTERM_AGENT_IDLE", "900"))  # Seconds, 0 keeps the agent running
+MAX_REQUEST_BYTES = 1 << 20  # Longest request line, enough for a few thousand names
+MIN_CACHED = 1024  # Decrypted values the agent keeps at least, more for larger vaults
+
+
+class AgentError(Exception):
+    pass
+
+
+# Function to get the socket of the agent serving a group: agent.sock for the default group, agent-<group>.sock else
+def socket_path(group=None):
+    from groups import DEFAULT_GROUP, group_slug
+    if group is None or group == DEFAULT_GROUP:
+        return SOCKET_PATH
+    base, ext = os.path.splitext(SOCKET_PATH)
+    return f"{base}-{group_slug(group)}{ext}"
+
+
+class Agent:
+    """Unlocked vault state and the request handlers of the agent."""
+
+    def __init__(self, store, password_hash, secrets, cipher, idle_timeout=IDLE_TIMEOUT):
+        from code_engine import engine
+        from usage import UsageStats
+        self.store = store
+        self.password_hash = password_hash
+        self.secrets = secrets
+        self.cipher = cipher
+        self.engine = engine
+        self.usage = UsageStats(store.path)  # Codes served count as uses, written in batches
+        self.idle_timeout = idle_timeout
+        self.last_used = time.monotonic()
+        self.requests = 0
+        self._verifier = None  # Created on the first verify request
+        self._stopping = None  # asyncio.Event, created inside the event loop
+        self._clients = set()  # Open connections (stream writers), closed when the agent stops
+
+    # Function to merge changes made by other processes (authterm, authterm add ...) into the vault
+    # Only the new journal records are read; the data key does not change with the password,
+    # so the cipher stays valid
+    def _refresh(self):
+        self.password_hash, secrets, _ = self.store.refresh(self.password_hash, self.secrets)
+        self._use_secrets(secrets)
+
+    # Function to switch to a new secrets mapping (after a full reload)
+    def _use_secrets(self, secrets):
+        if secrets is not self.secrets:
+            self.secrets = secrets
+            if self._verifier is not None:
+                self._verifier.secrets = secrets
+
+    # Function to answer one request object
+    def handle(self, request):
+        if not isinstance(request, dict):
+            raise AgentError("request must be a JSON object")
+        op = request.get("op")
+        if op == "ping":
+            return {"ok": True, "pid": os.getpid()}
+        if op == "stop":
+            self._stopping.set()
+            return {"ok": True}
+        self._refresh()
+        if op == "list":
+            return {"ok": True, "names": list(self.secrets)}
+        if op == "code":
+            names = request.get("names")
+            if names is None and "name" in request:
+                names = [request["name"]]
+            if not isinstance(names, list):
+                raise AgentError("'names' must be a list of secret names")
+            return self.codes(names, bool(request.get("next")))
+        if op == "verify":
+            return self.verify(request)
+        raise AgentError(f"unknown op '{op}'")
+
+    # Function to answer a code request; counter based secrets move on to their next code
+    def codes(self, names, upcoming):
+        from code_engine import advance_counter
+        from entry_crypto import DecryptionError
+        codes, remaining, missing, counter_names = {}, {}, [], []
+        for name in names:
+            token = self.secrets.get(name) if isinstance(name, str) else None
+            if token is None:
+                missing.append(name)
+                continue
+            try:
+                value = self.cipher.decrypt(name, token)
+            except DecryptionError:
+                raise AgentError(f"secret '{name}' cannot be decrypted")
+            counter_based = self.engine.is_counter_based(value)
+            if counter_based and not upcoming:
+                counter_names.append(name)  # Read again below
+                continue
+            try:
+                codes[name] = self.engine.upcoming(value) if upcoming else self.engine.now(value)
+            except ValueError:  # Also binascii.Error
+                raise AgentError(f"secret '{name}' is not a valid OTP secret")
+            self.usage.record(name)
+            if not counter_based:
+                remaining[name] = math.ceil(self.engine.seconds_remaining(None, value))
+
+        # A counter based code is used once: it is read and its counter advanced with the vault lock held, so
+        # no other process (authterm code, the app) hands out the same code
+        def use_counters(current):
+            ops = []
+            for name in counter_names:
+                token = current.get(name)
+                if token is None:  # Deleted by another process meanwhile
+                    missing.append(name)
+                    continue
+                value = self._value(name, token)
+                codes[name] = self._code(name, value)
+                self.usage.record(name)
+                if self.engine.is_counter_based(value):
+                    ops.append(("set", name, self.cipher.encrypt(name, advance_counter(value))))
+                else:
+                    remaining[name] = math.ceil(self.engine.seconds_remaining(None, value))
+            return ops
+        if counter_names:
+            self.password_hash, secrets, _ = self.store.commit(use_counters, self.password_hash, self.secrets)
+            self._use_secrets(secrets)
+        return {"ok": True, "codes": codes, "missing": missing, "remaining": remaining}
+
+    # Function to decrypt the stored value of a secret read under the vault lock
+    def _value(self, name, token):
+        from entry_crypto import DecryptionError
+        try:
+            return self.cipher.decrypt(name, token)
+        except DecryptionError:
+            raise AgentError(f"secret '{name}' cannot be decrypted")
+
+    # Function to get the current code of a secret read under the vault lock
+    def _code(self, name, value):
+        try:
+            return self.engine.now(value)
+        except ValueError:  # Also binascii.Error
+            raise AgentError(f"secret '{name}' is not a valid OTP secret")
+
+    # Function to answer a verify request, one (name, code) pair or many
+    def verify(self, request):
+        from verifier import Verifier, MAX_WINDOW
+        pairs = request.get("pairs")
+        if pairs is None and "name" in request:
+            pairs = [[request["name"], request.get("code")]]
+        if not isinstance(pairs, list) or not all(isinstance(p, list) and len(p) == 2 for p in pairs):
+            raise AgentError("'pairs' must be a list of [name, code] pairs")
+        window = request.get("window")
+        if window is not None and (not isinstance(window, int) or not 0 <= window <= MAX_WINDOW):
+            raise AgentError(f"'window' must be a number of steps from 0 to {MAX_WINDOW}")
+        if self._verifier is None:
+            self._verifier = Verifier(self.secrets, self.cipher)
+        return {"ok": True, "valid": self._verifier.verify_many(pairs, window)}
+
+    # Function to serve one client connection, one response line per request line
+    async def serve_client(self, reader, writer):
+        self._clients.add(writer)
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:  # Line longer than MAX_REQUEST_BYTES
+                    writer.write(b'{"ok": false, "error": "request too long"}\n')
+                    break
+                if not line:
+                    break
+                self.last_used = time.monotonic()
+                self.requests += 1
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    response = {"ok": False, "error": "request is not valid JSON"}
+                else:
+                    try:
+                        response = self.handle(request)
+                    except AgentError as e:
+                        response = {"ok": False, "error": str(e)}
+                writer.write(json.dumps(response).encode('utf-8') + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self._clients.discard(writer)
+            writer.close()
+
+    # Function to stop the agent once it has been idle for idle_timeout seconds
+    async def watch_idle(self):
+        import asyncio
+        while self.idle_timeout > 0:
+            idle = time.monotonic() - self.last_used
+            if idle >= self.idle_timeout:
+                self._stopping.set()
+                return
+            await asyncio.sleep(self.idle_timeout - idle)
+
+    # Function to run the event loop on an already listening socket until stopped or idle
+    async def run(self, sock):
+        import asyncio
+        self._stopping = asyncio.Event()
+        server = await asyncio.start_unix_server(self.serve_client, sock=sock, limit=MAX_REQUEST_BYTES)
+        watcher = asyncio.ensure_future(self.watch_idle())
+        async with server:
+            await self._stopping.wait()
+            for writer in list(self._clients):
+                writer.close()  # Their handlers see end of file and return
+            await asyncio.sleep(0)
+        watcher.cancel()
+        self.usage.flush()
+
+
+# Function to create the listening socket; fails if another agent already answers on it
+def listen(socket_path=SOCKET_PATH):
+    if os.path.exists(socket_path):
+        try:
+            AgentClient(socket_path).close()
+        except OSError:
+            os.remove(socket_path)  # Left behind by an agent that did not exit cleanly
+        else:
+            raise AgentError(f"an agent is already running on {socket_path}")
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    old_umask = os.umask(0o177)  # Socket file created with mode 0600
+    try:
+        sock.bind(socket_path)
+    finally:
+        os.umask(old_umask)
+    sock.listen(128)
+    return sock
+
+
+# Function to run the agent in this process (foreground) until it is stopped or idle
+def serve(agent, sock, socket_path=SOCKET_PATH):
+    import asyncio
+    try:
+        asyncio.run(agent.run(sock))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sock.close()
+        try:
+            os.remove(socket_path)
+        except FileNotFoundError:
+            pass
+
+
+# Function to move the agent to the background; the socket is bound first so clients can connect at once
+def daemonize():
+    if os.fork() > 0:
+        os._exit(0)
+    os.setsid()
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+        os.dup2(devnull, fd)
+    os.close(devnull)
+
+
+class AgentClient:
+    """Blocking client for the agent socket (no asyncio, so short-lived processes start fast)."""
+
+    def __init__(self, socket_path=SOCKET_PATH, timeout=5.0):
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.settimeout(timeout)
+        try:
+            self._sock.connect(socket_path)
+        except OSError:
+            self._sock.close()
+            raise
+        self._file = self._sock.makefile('rwb')
+
+    # Function to send one request and wait for its response, raises AgentError for error responses
+    def request(self, op, **fields):
+        fields["op"] = op
+        self._file.write(json.dumps(fields).encode('utf-8') + b'\n')
+        self._file.flush()
+        line = self._file.readline()
+        if not line:
+            raise AgentError("agent closed the connection")
+        response = json.loads(line)
+        if not response.get("ok"):
+            raise AgentError(response.get("error", "request failed"))
+        return response
+
+    # Function to get the codes of several secrets in one round trip, returns (codes, missing names)
+    def codes(self, names, upcoming=False):
+        response = self.request("code", names=list(names), next=upcoming)
+        return response["codes"], response["missing"]
+
+    def names(self):
+        return self.request("list")["names"]
+
+    def close(self):
+        self._file.close()
+        self._sock.close()
+
+
+# Function to connect to a running agent, returns None if there is none
+def connect(socket_path=SOCKET_PATH):
+    if not os.path.exists(socket_path):
+        return None
+    try:
+        return AgentClient(socket_path)
+    except OSError:
+        return None
@@ -1,73 +1,235 @@
 import curses
 import time
 import os
-import pyotp
-import json
-import hashlib
-import re
-
-# A simple dictionary to store secrets
+import threading
+import kdf
+import layout
+import tracing
+from entry_crypto import EntryCipher, is_encrypted, is_legacy
+from storage import VaultStore, vault_path
+from groups import VaultGroups, GroupError, DEFAULT_GROUP
+from code_engine import engine, CodeBoard, is_base32, parse_value, make_value, advance_counter
+from render import DiffWriter
+from list_view import ListView, SearchBox
+from name_index import NameIndex
+from usage import UsageStats
+
+# A simple dictionary to store secrets (of the current group)
 secrets = {}
 password_hash = None
+vault_cipher = None  # Decrypts secret values on demand, set once the vault is unlocked
+name_indexes = {}  # Search index over secret names per group, see get_name_index()
+name_index_builders = {}
+usage_stats = {}  # Use counts of the secrets per group, see get_usage()
 
 # File paths
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-VAULT_PATH = os.path.join(BASE_DIR, 'vault.json')
-
-# Function to load splash art from a text file
-def load_splash_art():
-    splash_art_path = os.path.join(BASE_DIR, 'assets', 'splash.txt')  # Correct path to splash.txt
-    if os.path.exists(splash_art_path):
-        with open(splash_art_path, 'r', encoding='utf-8') as f:
-            art_lines = f.read().strip().splitlines()
-            return art_lines if art_lines else ["(Splash art is empty)"]
-    else:
-        return ["(Splash art not found)"]
+# vault.json, or the indexed binary vault.bin if present, or $AUTHTERM_VAULT
+VAULT_PATH = vault_path(BASE_DIR)
+
+# Changes are appended to vault.json.journal and compacted in the background
+# Set AUTHTERM_JOURNAL=0 to rewrite vault.json on every change instead
+JOURNAL_ENABLED = os.environ.get("AUTHTERM_JOURNAL", "1") != "0"
+store = VaultStore(VAULT_PATH, journal=JOURNAL_ENABLED)
+
+# Groups other than the default one are kept in their own files and read when first opened
+# Set AUTHTERM_GROUP to start in another group
+groups = VaultGroups(store)
+current_group = DEFAULT_GROUP
+START_GROUP = os.environ.get("AUTHTERM_GROUP") or DEFAULT_GROUP
 
-# Function to load secrets from vault.json
+MENU = ("1. Create Secret", "2. Edit Secret", "3. List Secrets", "4. All Codes", "5. Delete Secret",
+        "6. Switch Group", "7. Change Password", "8. About", "9. Help", "10. Exit")
+SPLASH_FOOTER = ("wessdvp - 2024", "Press any key to continue...")
+
+# Function to load secrets from vault.json (the default group, which also holds the password)
 def load_secrets():
     global secrets, password_hash  # Declare as global at the start
-    if os.path.exists(VAULT_PATH):
-        with open(VAULT_PATH, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            password_hash = data.get("password_hash")
-            secrets = data.get("secrets", {})
-
-# Function to save secrets to vault.json
+    secrets = groups.open(DEFAULT_GROUP)  # Snapshot with the journal replayed on top
+    password_hash = groups.password_hash
+    build_name_index()
+
+# Function to build the name search index of the current group in a background thread,
+# so a large vault does not delay startup
+def build_name_index():
+    group = current_group
+
+    def build(names):
+        name_indexes[group] = NameIndex(names)
+
+    name_index_builders[group] = threading.Thread(target=build, args=(list(secrets.keys()),), daemon=True)
+    name_index_builders[group].start()
+
+# Function to get the name search index, waiting for the background build if it is still running
+def get_name_index():
+    name_index_builders[current_group].join()
+    return name_indexes[current_group]
+
+# Function to get the usage stats of the current group, read from its side file the first time
+def get_usage():
+    if current_group not in usage_stats:
+        usage_stats[current_group] = UsageStats(groups.store(current_group).path)
+    return usage_stats[current_group]
+
+# Function to write the uses counted so far, in every group opened
+def flush_usage():
+    for usage in usage_stats.values():
+        usage.flush()
+
+# Function to save secrets to vault.json (full atomic rewrite of the default group)
 def save_secrets():
-    global password_hash  # Declare as global at the start
-    with open(VAULT_PATH, 'w', encoding='utf-8') as f:
-        json.dump({"password_hash": password_hash, "secrets": secrets}, f)
-
-# Function to hash the password
-def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
+    groups.password_hash = password_hash
+    store.save(password_hash, secrets)
+
+# Function to record a change in the journal of the current group instead of rewriting its file
+# Changes other authterm processes made in the meantime are merged in first
+def commit_change(*ops):
+    global password_hash
+    changed = groups.commit(current_group, ops)
+    password_hash = groups.password_hash
+    apply_changes(groups.open(current_group), changed)
+
+# Function to make a change that depends on the current state of the current group: `build` gets its secrets,
+# with the changes of other processes merged in, under the vault lock and returns the ops to record
+def commit_update(build):
+    global password_hash
+    changed = groups.commit(current_group, build)
+    password_hash = groups.password_hash
+    apply_changes(groups.open(current_group), changed)
+
+# Function to merge the changes other authterm processes made to the current group since we last read it
+# Two stat() calls when nothing changed, otherwise only the new journal records are read
+def refresh_secrets():
+    global password_hash
+    changed = groups.refresh(current_group)
+    password_hash = groups.password_hash
+    apply_changes(groups.open(current_group), changed)
+
+# Function to make another group the current one; its file is read and indexed the first time only
+def switch_group(group):
+    global secrets, current_group
+    secrets = groups.open(group)  # GroupError if there is no such group
+    current_group = group
+    if group in name_index_builders:
+        refresh_secrets()  # Opened before, only merge what changed since
+    else:
+        build_name_index()
+
+# Function to update the name index after a merge (changed is None when the whole vault was reloaded)
+def apply_changes(merged, changed):
+    global secrets
+    if changed is None:
+        secrets = merged
+        build_name_index()
+    elif changed:
+        index = get_name_index()
+        for name in changed:
+            if name in secrets:
+                index.add(name)
+            else:
+                index.remove(name)
+
+# Function to hash the password (salted KDF record, cost calibrated for this machine)
+# The record also carries the vault data key, wrapped with the password
+def hash_password(password, data_key):
+    return kdf.hash_password(password, data_key)
+
+# Function to get the plaintext value of a secret, decrypted on demand (recent ones are cached)
+def get_secret_value(secret_name):
+    return vault_cipher.decrypt(secret_name, secrets[secret_name])
+
+# Function to encrypt again, in every group, the values stored in plaintext (vaults from before encryption) or
+# not bound to their name (vaults from before names were bound), then store the new password record
+# The record goes last: a vault whose record is still old reads values in both formats
+def upgrade_vault(new_password_hash):
+    global password_hash
+    for group in groups.names():
+        group_secrets = groups.open(group)
+        ops = [("set", name, vault_cipher.encrypt(name, vault_cipher.decrypt(name, value)))
+               for name, value in group_secrets.items() if not is_encrypted(value) or is_legacy(value)]
+        if ops:
+            changed = groups.commit(group, ops)
+            if group == current_group:
+                apply_changes(groups.open(group), changed)
+    groups.commit(DEFAULT_GROUP, [("password", new_password_hash)])
+    password_hash = groups.password_hash
+    vault_cipher.legacy = False
+
+# Function to run a slow call (password hashing) in a worker thread while showing a progress bar
+def run_with_progress(stdscr, y, x, message, expected_seconds, func, *args):
+    result = {}
+
+    def worker():
+        try:
+            result["value"] = func(*args)
+        except Exception as e:  # Re-raised on the UI thread
+            result["error"] = e
+
+    thread = threading.Thread(target=worker, daemon=True)
+    thread.start()
+    start_time = time.time()
+    bar_length = 20
+    stdscr.timeout(100)  # Redraw the bar every 100 ms, input stays responsive
+    try:
+        while thread.is_alive():
+            fraction = min((time.time() - start_time) / max(expected_seconds, 0.1), 0.99)
+            filled = int(fraction * bar_length)
+            stdscr.addstr(y, x, f"{message} " + "█" * filled + "─" * (bar_length - filled))
+            stdscr.refresh()
+            stdscr.getch()
+    finally:
+        stdscr.timeout(-1)
+    stdscr.move(y, x)
+    stdscr.clrtoeol()
+    if "error" in result:
+        raise result["error"]
+    return result["value"]
 
 # Function to handle the first launch password setup
 def setup_password(stdscr):
-    global password_hash  # Declare as global at the start
+    global password_hash, vault_cipher  # Declare as global at the start
     stdscr.clear()
     h, w = stdscr.getmaxyx()
     stdscr.addstr(h//2 - 2, w//2 - 10, "Set up your vault password: ")
     stdscr.refresh()
     curses.noecho()  # Turn off echoing (hide cursor)
     password = stdscr.getstr(h//2 - 1, w//2 - 10, 20).decode('utf-8')
-    password_hash = hash_password(password)
+    data_key = kdf.new_data_key()
+    password_hash = run_with_progress(stdscr, h//2, w//2 - 10, "Securing vault...", kdf.UNLOCK_TIME * 2,
+                                      hash_password, password, data_key)
+    vault_cipher = EntryCipher(data_key)
     save_secrets()  # Save the password hash and empty secrets
     stdscr.addstr(h//2 + 1, w//2 - 10, "Password set successfully!")
     stdscr.refresh()
     stdscr.getch()
     curses.echo()  # Turn on echoing again (show cursor)
 
+# Function to check a password against the vault, showing progress while the KDF runs
+# Returns (ok, data_key), see kdf.unlock
+def check_password(stdscr, y, x, password):
+    return run_with_progress(stdscr, y, x, "Verifying...", kdf.expected_seconds(password_hash),
+                             kdf.unlock, password, password_hash)
+
 # Function to verify password
 def verify_password(stdscr):
+    global password_hash, vault_cipher  # Declare as global at the start
     stdscr.clear()
     h, w = stdscr.getmaxyx()
     stdscr.addstr(h//2 - 2, w//2 - 10, "Enter vault password: ")
     stdscr.refresh()
     curses.noecho()  # Turn off echoing
     password = stdscr.getstr(h//2 - 1, w//2 - 10, 20).decode('utf-8')
-    if hash_password(password) == password_hash:
+    verified, data_key = check_password(stdscr, h//2, w//2 - 10, password)
+    if verified:
+        # Vault from before encryption, or with values not bound to their names: re-hash with the KDF (which
+        # wraps the data key in the current format) and encrypt the values again
+        upgrade = data_key is None or not kdf.names_bound(password_hash)
+        if data_key is None:
+            data_key = kdf.new_data_key()
+        vault_cipher = EntryCipher(data_key, legacy=upgrade)
+        if upgrade:
+            upgrade_vault(run_with_progress(stdscr, h//2, w//2 - 10, "Upgrading vault...", kdf.UNLOCK_TIME * 2,
+                                            hash_password, password, data_key))
         stdscr.addstr(h//2 + 1, w//2 - 10, "Password verified!")
         stdscr.refresh()
         stdscr.getch()
@@ -79,56 +241,40 @@ def verify_password(stdscr):
 
 # splash screen
 def splash_screen(stdscr):
-    stdscr.clear()
-    h, w = stdscr.getmaxyx()
-    splash_art = load_splash_art()
-    art_start_y = max((h - len(splash_art)) // 2 - 4, 0)
-
-    for i, line in enumerate(splash_art):
-        x = max((w - len(line)) // 2, 0)
-        stdscr.addstr(art_start_y + i, x, line.strip())
-
-    developer_text = "wessdvp - 2024"
-    stdscr.addstr(art_start_y + len(splash_art) + 2, (w - len(developer_text)) // 2, developer_text)
-
-    prompt_text = "Press any key to continue..."
-    stdscr.addstr(art_start_y + len(splash_art) + 4, (w - len(prompt_text)) // 2, prompt_text)
-
-    stdscr.refresh()
-    stdscr.getch()
+    while True:
+        h, w = stdscr.getmaxyx()
+        layout.splash_layout(h, w, SPLASH_FOOTER).draw(stdscr)
+        stdscr.refresh()
+        if stdscr.getch() != curses.KEY_RESIZE:
+            return
 
 # Function to display the main menu with the splash art
+# The layout is computed once per terminal size; moving the selection redraws two rows
 def main_menu(stdscr):
     curses.curs_set(0)
-    splash_art = load_splash_art()
     selected_option = 0
-    h, w = stdscr.getmaxyx()
-    menu = ["1. Create Secret", "2. Edit Secret", "3. List Secrets", "4. Delete Secret", "5. Change Password", "6. About", "7. Help", "8. Exit"]
-    
-    while True:
-        stdscr.clear()
-        # Display splash art at the top of the menu
-        art_start_y = max((h - len(splash_art)) // 2 - 4, 0)
-        for i, line in enumerate(splash_art):
-            x = max((w - len(line)) // 2, 0)
-            stdscr.addstr(art_start_y + i, x, line.strip())
-        
-        stdscr.addstr(art_start_y + len(splash_art) + 2, (w - len("Main Menu")) // 2, "Main Menu")
-
-        for i in range(len(menu)):
-            if i == selected_option:
-                stdscr.addstr(art_start_y + len(splash_art) + 4 + i, (w - len(menu[i])) // 2, menu[i], curses.A_REVERSE)
-            else:
-                stdscr.addstr(art_start_y + len(splash_art) + 4 + i, (w - len(menu[i])) // 2, menu[i])
+    screen = None  # Layout on screen, None when the whole menu has to be drawn again
 
+    while True:
+        if screen is None:
+            h, w = stdscr.getmaxyx()
+            title = "Main Menu" if current_group == DEFAULT_GROUP else f"Main Menu - {current_group}"
+            screen = layout.menu_layout(h, w, title, MENU)
+            screen.draw(stdscr, selected_option)
         stdscr.refresh()
         key = stdscr.getch()
 
         if key == curses.KEY_UP and selected_option > 0:
+            screen.select(stdscr, selected_option, selected_option - 1)
             selected_option -= 1
-        elif key == curses.KEY_DOWN and selected_option < len(menu) - 1:
+        elif key == curses.KEY_DOWN and selected_option < len(MENU) - 1:
+            screen.select(stdscr, selected_option, selected_option + 1)
             selected_option += 1
+        elif key == curses.KEY_RESIZE:
+            screen = None
         elif key == curses.KEY_ENTER or key in [10, 13]:  # Enter key
+            refresh_secrets()  # Another authterm may have changed the vault meanwhile
+            screen = None  # The option draws its own screen
             if selected_option == 0:
                 create_secret(stdscr)
             elif selected_option == 1:
@@ -136,14 +282,18 @@ def main_menu(stdscr):
             elif selected_option == 2:
                 list_secrets(stdscr)
             elif selected_option == 3:
-                delete_secret(stdscr)
+                codes_dashboard(stdscr)
             elif selected_option == 4:
-                change_password(stdscr)
+                delete_secret(stdscr)
             elif selected_option == 5:
-                about(stdscr)
+                groups_menu(stdscr)
             elif selected_option == 6:
-                help_menu(stdscr)
+                change_password(stdscr)
             elif selected_option == 7:
+                about(stdscr)
+            elif selected_option == 8:
+                help_menu(stdscr)
+            elif selected_option == 9:
                 exit_app(stdscr)
     curses.curs_set(1)
 
@@ -185,14 +335,17 @@ def change_password(stdscr):
         stdscr.refresh()
         return
 
-    if hash_password(current_password) == password_hash:
+    verified, data_key = check_password(stdscr, h//2, w//2 - 10, current_password)
+    if verified:
         new_password = get_password(h//2 + 2, w//2 - 10, "New Password", 20)
         if new_password is None:  # User pressed ESC
             stdscr.addstr(h//2 + 5, w//2 - 10, "Operation aborted!     ")
             stdscr.refresh()
             return
-        password_hash = hash_password(new_password)
-        save_secrets()
+        # Only the wrapped data key changes, the encrypted secrets stay as they are
+        password_hash = run_with_progress(stdscr, h//2 + 3, w//2 - 10, "Securing vault...", kdf.UNLOCK_TIME * 2,
+                                          hash_password, new_password, data_key)
+        commit_change(("password", password_hash))
         stdscr.addstr(h//2 + 4, w//2 - 10, "Password changed successfully!")
     else:
         stdscr.addstr(h//2 + 4, w//2 - 10, "Invalid current password!")
@@ -221,12 +374,14 @@ def help_menu(stdscr):
         "====",
         "1. Create Secret: Add a new secret to your vault.",
         "2. Edit Secret: Modify an existing secret.",
-        "3. List Secrets: View all stored secrets.",
-        "4. Delete Secret: Delete an existing secret.",
-        "5. Change Password: Update your vault password.",
-        "6. About: Information about the application.",
-        "7. Help: Display this help menu.",
-        "8. Exit: Close the application."
+        "3. List Secrets: View all stored secrets, most used first.",
+        "4. All Codes: View live codes of all secrets at once.",
+        "5. Delete Secret: Delete an existing secret.",
+        "6. Switch Group: Work on another group of secrets.",
+        "7. Change Password: Update your vault password.",
+        "8. About: Information about the application.",
+        "9. Help: Display this help menu.",
+        "10. Exit: Close the application."
     ]
 
     # Pagination variables
@@ -260,11 +415,6 @@ def help_menu(stdscr):
         elif key == 10:  # Enter key
             break  # Exit the help menu
 
-#ft to check base32
-def is_base32(secret_value):
-    base32_regex = r'^[A-Z2-7]+=*$'  # Regex to match Base32 encoding
-    return bool(re.match(base32_regex, secret_value))
-
 # Function to create a secret
 def create_secret(stdscr):
     global secrets  # Assuming secrets is defined somewhere globally
@@ -333,12 +483,22 @@ def create_secret(stdscr):
         stdscr.getch()  # Wait for user input
         return  # Exit the function early if not valid
 
-    secrets[secret_name] = secret_value
-    save_secrets()
+    secrets[secret_name] = vault_cipher.encrypt(secret_name, secret_value)
+    get_name_index().add(secret_name)
+    commit_change(("set", secret_name, secrets[secret_name]))
     stdscr.addstr(h//2 + 3, w//2 - 10, "Secret created successfully!")
     stdscr.refresh()
     stdscr.getch()
 
+# Function to build the scrolling secret list shared by the list, edit and delete screens
+# Only as many rows as fit above the prompts are drawn, whatever the size of the vault
+def secret_list_view(stdscr, secret_names, format_item=None, prompt_rows=7):
+    h, w = stdscr.getmaxyx()
+    top = h // 4 + 1
+    left = max(w // 2 - 10, 0)
+    height = max(min(len(secret_names), h - top - prompt_rows), 1)
+    return ListView(stdscr, secret_names, top, left, height, w - left - 1, format_item)
+
 # Function to edit a secret
 def edit_secret(stdscr):
     stdscr.clear()
@@ -350,44 +510,40 @@ def edit_secret(stdscr):
         stdscr.getch()
         return
 
-    secrets_list = list(secrets.keys())
-    selected_index = 0
+    secret_names = list(secrets.keys())
+    view = secret_list_view(stdscr, secret_names)
+    search = SearchBox(view, get_name_index(), view.bottom(), secret_names)
+    prompt_y = view.bottom() + 1  # First row below the list and the search box
+    stdscr.addstr(view.top - 1, view.left, "[Enter] Edit Secret [x] Return to main menu")
+    search.draw()
 
     while True:
-        stdscr.clear()
-        stdscr.addstr(h // 2 - 1, w // 2 - 10, "[Enter] Edit Secret [x] Return to main menu")
-        for i, secret_name in enumerate(secrets_list):
-            if i == selected_index:
-                stdscr.addstr(h // 2 + i, w // 2 - 10, secret_name, curses.A_REVERSE)
-            else:
-                stdscr.addstr(h // 2 + i, w // 2 - 10, secret_name)
-
+        view.draw()
         stdscr.refresh()
         key = stdscr.getch()
 
-        if key == curses.KEY_UP and selected_index > 0:
-            selected_index -= 1
-        elif key == curses.KEY_DOWN and selected_index < len(secrets_list) - 1:
-            selected_index += 1
-        elif key in [curses.KEY_ENTER, 10, 13]:  # Enter key
-            old_secret_name = secrets_list[selected_index]
-            old_secret_value = secrets[old_secret_name]
+        if search.handle_key(key) or view.handle_key(key):
+            continue
+        elif key in [curses.KEY_ENTER, 10, 13] and view.current() is not None:  # Enter key
+            old_secret_name = view.current()
+            old_secret_value = get_secret_value(old_secret_name)
 
-            stdscr.addstr(h // 2 + len(secrets_list) + 1, w // 2 - 10, "Enter new name (leave empty to keep it): ")
+            stdscr.addstr(prompt_y, w // 2 - 10, "Enter new name (leave empty to keep it): ")
             stdscr.refresh()
             curses.echo()
-            new_secret_name = stdscr.getstr(h // 2 + len(secrets_list) + 2, w // 2 - 10, 20).decode('utf-8')
+            new_secret_name = stdscr.getstr(prompt_y + 1, w // 2 - 10, 20).decode('utf-8')
 
             while True:
-                stdscr.addstr(h // 2 + len(secrets_list) + 3, w // 2 - 10, "Enter new value (leave empty to keep it): ")
+                stdscr.addstr(prompt_y + 2, w // 2 - 10, "Enter new value (leave empty to keep it): ")
                 stdscr.refresh()
-                stdscr.addstr(h // 2 + len(secrets_list) + 4, w // 2 - 10, " " * 20)  # Clear previous input
+                stdscr.addstr(prompt_y + 3, w // 2 - 10, " " * 20)  # Clear previous input
                 stdscr.refresh()
-                new_secret_value = stdscr.getstr(h // 2 + len(secrets_list) + 4, w // 2 - 10, 20).decode('utf-8')
+                new_secret_value = stdscr.getstr(prompt_y + 3, w // 2 - 10, 20).decode('utf-8')
 
                 # Clear the line for previous error messages
-                error_line = h // 2 + len(secrets_list) + 5
-                stdscr.addstr(error_line, w // 2 - 10, " " * 60)  # Clear error line
+                error_line = prompt_y + 4
+                stdscr.move(error_line, w // 2 - 10)
+                stdscr.clrtoeol()  # Clear error line
 
                 # Check if the new value is valid Base32
                 if new_secret_value and not is_base32(new_secret_value):
@@ -396,10 +552,12 @@ def edit_secret(stdscr):
 
                     key = stdscr.getch()
                     if key == ord('x') or key == ord('X'):
-                        stdscr.addstr(error_line, w // 2 - 10, " " * 60)  # Clear error message
+                        stdscr.move(error_line, w // 2 - 10)
+                        stdscr.clrtoeol()  # Clear error message
                         break  # Go back to the secrets list
                     elif key in [curses.KEY_ENTER, 10, 13]:
-                        stdscr.addstr(error_line, w // 2 - 10, " " * 60)  # Clear error message
+                        stdscr.move(error_line, w // 2 - 10)
+                        stdscr.clrtoeol()  # Clear error message
                         continue  # Retry input
 
                 # If the input is valid or empty, exit the loop
@@ -407,22 +565,35 @@ def edit_secret(stdscr):
 
             # If the user pressed 'x', just return to the main edit interface
             if key == ord('x') or key == ord('X'):
-                stdscr.addstr(error_line, w // 2 - 10, " " * 60)  # Clear error message
+                stdscr.move(prompt_y, 0)
+                stdscr.clrtobot()  # Clear the prompts
                 continue
 
             # Only update the secret if valid input was provided
             updated = False  # Flag to track if an update was made
+            ops = []  # Journal records for this edit
+            target_name = new_secret_name if new_secret_name else old_secret_name
             if new_secret_name or new_secret_value:  # If a new name or value is provided
                 if new_secret_name:  # If a new name is provided
-                    secrets[new_secret_name] = secrets.pop(old_secret_name)  # Rename
+                    # Rename; the value is bound to the name, so it is encrypted again for the new one
+                    secrets.pop(old_secret_name)
+                    secrets[new_secret_name] = vault_cipher.encrypt(new_secret_name, old_secret_value)
+                    get_name_index().rename(old_secret_name, new_secret_name)
+                    ops.append(("del", old_secret_name))
                     updated = True
                 if new_secret_value:  # If a new value is provided
-                    secrets[new_secret_name if new_secret_name else old_secret_name] = new_secret_value  # Update value
+                    engine.forget(old_secret_value)  # Drop cached key material of the old value
+                    # Keep the OTP parameters of the old value, a new counter based secret starts at 0
+                    old = parse_value(old_secret_value)
+                    new_secret_value = make_value(new_secret_value, old.period, old.digits, old.algorithm,
+                                                  None if old.counter is None else 0)
+                    secrets[target_name] = vault_cipher.encrypt(target_name, new_secret_value)  # Update value
                     updated = True
 
             if updated:
-                save_secrets()
-                stdscr.addstr(h // 2 + len(secrets_list) + 6, w // 2 - 10, "Secret updated successfully! Click [Enter]")
+                ops.append(("set", target_name, secrets[target_name]))
+                commit_change(*ops)
+                stdscr.addstr(prompt_y + 5, w // 2 - 10, "Secret updated successfully! Click [Enter]")
                 stdscr.refresh()
                 stdscr.getch()  # Wait for user to acknowledge success
                 return  # Return to the main menu after success
@@ -447,145 +618,296 @@ def delete_secret(stdscr):
         stdscr.getch()
         return  # Exit the function if there are no secrets
 
-    stdscr.addstr(h//2 - 1, w//2 - 10, "Select secret to delete:")
-    stdscr.addstr(h//2 + len(secrets) + 3, w//2 - 30, "[Enter] Delete Secret, [Any button] Return to main menu")
+    secret_names = list(secrets.keys())
+    view = secret_list_view(stdscr, secret_names)
+    search = SearchBox(view, get_name_index(), view.bottom(), secret_names)
+    prompt_y = view.bottom() + 1  # First row below the list and the search box
+    stdscr.addstr(view.top - 1, view.left, "Select secret to delete:")
+    search.draw()
+    footer = "[Enter] Delete Secret, [Any button] Return to main menu"
+    stdscr.addstr(prompt_y + 3, max(w//2 - 30, 0), footer[:w - 1])
     stdscr.refresh()
 
-    secrets_list = list(secrets.keys())
-    selected_secret_index = 0
-
     while True:
-        for i, secret_name in enumerate(secrets_list):
-            if i == selected_secret_index:
-                stdscr.addstr(h//2 + i, w//2 - 10, secret_name, curses.A_REVERSE)
-            else:
-                stdscr.addstr(h//2 + i, w//2 - 10, secret_name)
-
+        view.draw()
         stdscr.refresh()
         key = stdscr.getch()
 
-        if key == curses.KEY_UP and selected_secret_index > 0:
-            selected_secret_index -= 1
-        elif key == curses.KEY_DOWN and selected_secret_index < len(secrets_list) - 1:
-            selected_secret_index += 1
+        if search.handle_key(key) or view.handle_key(key):
+            continue
         elif key in [curses.KEY_ENTER, 10, 13]:  # Enter key
+            secret_name = view.current()
+            if secret_name is None:  # No search results
+                continue
             # Ask for confirmation before deleting
-            confirm_msg = f"Are you sure you want to delete '{secrets_list[selected_secret_index]}'? (y/n): "
-            stdscr.addstr(h//2 + len(secrets_list) + 1, w//2 - len(confirm_msg) // 2, confirm_msg)
+            confirm_msg = f"Are you sure you want to delete '{secret_name}'? (y/n): "[:w - 1]
+            stdscr.addstr(prompt_y, max(w//2 - len(confirm_msg) // 2, 0), confirm_msg)
             stdscr.refresh()
 
             confirmation = stdscr.getch()
             if confirmation in [ord('y'), ord('Y')]:  # If user confirms
-                del secrets[secrets_list[selected_secret_index]]
-                save_secrets()
-                stdscr.addstr(h//2 + len(secrets_list) + 2, w//2 - 10, "Secret deleted successfully!")
+                engine.forget(get_secret_value(secret_name))
+                del secrets[secret_name]
+                get_name_index().remove(secret_name)
+                commit_change(("del", secret_name))
+                stdscr.addstr(prompt_y + 1, w//2 - 10, "Secret deleted successfully!")
             else:
-                stdscr.addstr(h//2 + len(secrets_list) + 2, w//2 - 10, "Deletion canceled.")
+                stdscr.addstr(prompt_y + 1, w//2 - 10, "Deletion canceled.")
             
             stdscr.refresh()
             stdscr.getch()
             break  # Exit the loop after deletion or cancellation
-        elif key == ord ('x') or ord('X'):  # Check for 'x' key to exit
-            break  # Exit the loop if 'x' is pressed
+        else:  # Any other key returns to the main menu
+            break
 
-# Function to list and view secrets
-def list_secrets(stdscr):
+# Function to pick the current group, create one or delete an empty one
+def groups_menu(stdscr):
+    new_group = "+ New group"
     while True:
-        stdscr.clear()  # Clear screen to avoid glitches
+        stdscr.clear()
         h, w = stdscr.getmaxyx()
+        group_names = groups.names()
+        view = secret_list_view(stdscr, group_names + [new_group],
+                                lambda i, name: f"{name} *" if name == current_group else name)
+        view.move_to(group_names.index(current_group) if current_group in group_names else 0)
+        prompt_y = view.bottom() + 1
+        stdscr.addstr(view.top - 1, view.left, "Groups (* current):")
+        stdscr.addstr(prompt_y, view.left, "[Enter] Switch [d] Delete empty group [x] Return to main menu"[:w - view.left - 1])
 
-        # List secrets
-        stdscr.addstr(h // 2 - 2, w // 2 - 10, "Available Secrets:")
+        while True:
+            view.draw()
+            stdscr.refresh()
+            key = stdscr.getch()
+            if view.handle_key(key):
+                continue
+            break
 
-        if not secrets:
-            stdscr.addstr(h // 2, w // 2 - 10, "No secrets available.")
+        message = None
+        if key in [curses.KEY_ENTER, 10, 13] and view.current() == new_group:
+            stdscr.addstr(prompt_y + 1, view.left, "Enter group name: ")
+            stdscr.refresh()
+            curses.echo()
+            name = stdscr.getstr(prompt_y + 2, view.left, 20).decode('utf-8')
+            curses.noecho()
+            try:
+                switch_group(groups.create(name))
+                return
+            except GroupError as e:
+                message = f"Error: {e}"
+        elif key in [curses.KEY_ENTER, 10, 13]:
+            try:
+                switch_group(view.current())
+                return
+            except GroupError as e:  # Deleted by another authterm meanwhile
+                message = f"Error: {e}"
+        elif key in [ord('d'), ord('D')] and view.current() != new_group:
+            group = view.current()
+            try:
+                groups.delete(group)
+                name_index_builders.pop(group, None)
+                name_indexes.pop(group, None)
+                if group == current_group:
+                    switch_group(DEFAULT_GROUP)
+                message = f"Group '{group}' deleted."
+            except GroupError as e:
+                message = f"Error: {e}"
+        elif key in [ord('x'), ord('X'), 27]:
+            return
+        if message:
+            stdscr.addstr(prompt_y + 3, view.left, message[:w - view.left - 1])
             stdscr.refresh()
             stdscr.getch()
-            return  # Exit the function after displaying the message
 
-        secret_names = list(secrets.keys())
-        selected_secret = 0
+# Function to list and view secrets
+def list_secrets(stdscr):
+    stdscr.clear()  # Clear screen to avoid glitches
+    h, w = stdscr.getmaxyx()
+
+    if not secrets:
+        stdscr.addstr(h // 2 - 2, w // 2 - 10, "Available Secrets:")
+        stdscr.addstr(h // 2, w // 2 - 10, "No secrets available.")
+        stdscr.refresh()
+        stdscr.getch()
+        return  # Exit the function after displaying the message
+
+    secret_names = get_usage().ranked(secrets)  # Most used first, [Home] jumps back to the top
+    view = secret_list_view(stdscr, secret_names, lambda i, secret_name: f"{i + 1}. {secret_name}")
+    search = SearchBox(view, get_name_index(), view.bottom(), secret_names)
+
+    while True:
+        # List secrets
+        stdscr.clear()
+        stdscr.addstr(view.top - 1, view.left, "Available Secrets (most used first):"[:w - view.left - 1])
+        stdscr.addstr(view.bottom() + 1, view.left, "[Enter] See code [Any button] Return to main menu"[:w - view.left - 1])
+        search.draw()
+        view.invalidate()
 
         while True:
-            stdscr.clear()  # Ensure the screen is cleared on each iteration
-            for i, secret_name in enumerate(secret_names):
-                if i == selected_secret:
-                    stdscr.addstr(h // 2 + i, w // 2 - 10, f"{i + 1}. {secret_name}", curses.A_REVERSE)
-                else:
-                    stdscr.addstr(h // 2 + i, w // 2 - 10, f"{i + 1}. {secret_name}")
-
-            stdscr.addstr(h // 2 + len(secret_names) + 2, w // 2 - 10, "[Enter] See code [Any button] Return to main menu")
+            view.draw()
             stdscr.refresh()
-            
 
             key = stdscr.getch()
-            if key == curses.KEY_UP and selected_secret > 0:
-                selected_secret -= 1
-            elif key == curses.KEY_DOWN and selected_secret < len(secret_names) - 1:
-                selected_secret += 1
+            if search.handle_key(key) or view.handle_key(key):
+                continue
             elif key in (curses.KEY_ENTER, 10, 13):  # Enter key
-                secret_name = secret_names[selected_secret]
-                show_code(stdscr, secret_name)
+                if view.current() is None:  # No search results
+                    continue
+                show_code(stdscr, view.current())
                 break  # Return to the list of secrets after viewing code
-            elif key == ord ('x') or ord('X'):
+            else:
                 return  # Exit listing and return to the main menu
 
 # generate code ft
 def generate_code(secret):
-    """Generate a 6-digit numerical TOTP code."""
-    totp = pyotp.TOTP(secret)
-    return totp.now()  # Get current TOTP code
+    """Generate the current code with the secret's own digits, algorithm and period."""
+    return engine.now(secret)  # Cached per time step, next code is precomputed
+
+# upcoming code ft
+def generate_next_code(secret):
+    """Return the code of the next window (or the next counter value)."""
+    return engine.upcoming(secret)
 
 # timer gui ft
 def draw_timer(stdscr, secret):
-    # Clear the screen
+    # Clear the screen once, after that only changed cells are written
     stdscr.clear()
+    screen = DiffWriter(stdscr)
 
     # Set up dimensions
     h, w = stdscr.getmaxyx()
 
-    # Timer duration (30 seconds)
-    duration = 30
-    start_time = time.time()
+    # Timer duration (the secret's period, 30 seconds by default)
+    duration = engine.params(secret).period
+    bar_length = 30  # 20 + 10
 
-    # Calculate the next code change time
-    next_code_time = (start_time + duration) // duration * duration  # Align to the next 30s boundary
+    try:
+        while True:
+            current_time = time.time()
+            remaining = engine.seconds_remaining(current_time, secret)  # Time remaining until next code change
+
+            # Cached per time step, only recomputed after a rollover
+            screen.put(h // 2 - 2, w // 2 - 10, f"Current Code: {generate_code(secret)}")
+            progress = int((remaining / duration) * bar_length)
+            screen.put(h // 2 - 1, w // 2 - 10, "█" * progress + "─" * (bar_length - progress))
+            screen.put(h // 2, w // 2 - 10, f"Time remaining: {int(remaining)} seconds")
+            screen.put(h // 2 + 1, w // 2 - 10, f"Next Code: {generate_next_code(secret)}")
+            screen.put(h // 2 + 2, w // 2 - 10, "Press 'q' to return to the secrets list.")  # Instruction to quit
+            stdscr.refresh()
 
-    while True:
-        current_time = time.time()
-        remaining = next_code_time - current_time  # Time remaining until next code change
+            # Wait for a key until the countdown changes (the next whole second, which includes the rollover)
+            wait = remaining - int(remaining)
+            stdscr.timeout(int(wait * 1000) + 1)
+            key = stdscr.getch()
+            if key in (ord('q'), ord('Q')):
+                return  # Exit the loop and return to secrets list
+            elif key == curses.KEY_RESIZE:
+                h, w = stdscr.getmaxyx()
+                stdscr.clear()
+                screen.invalidate()
+    finally:
+        stdscr.timeout(-1)  # Back to blocking getch for the other screens
+
+# counter based code ft, a new code is only made when asked for
+def draw_counter(stdscr, secret_name):
+    h, w = stdscr.getmaxyx()
 
-        # Generate code
-        code = generate_code(secret)
+    # Moves the counter on from its value in the vault, which the CLI or the agent may have moved meanwhile
+    def next_code(current):
+        if secret_name not in current:
+            return []
+        value = vault_cipher.decrypt(secret_name, current[secret_name])
+        if not engine.is_counter_based(value):
+            return []
+        return [("set", secret_name, vault_cipher.encrypt(secret_name, advance_counter(value)))]
 
-        # Display code and remaining time
-        stdscr.addstr(h // 2 - 2, w // 2 - 10, f"Current Code: {code}")
-        stdscr.addstr(h // 2, w // 2 - 10, f"Time remaining: {int(remaining)} seconds")
+    while True:
+        refresh_secrets()  # Codes used by other processes are not shown again
+        if secret_name not in secrets:
+            return  # Deleted by another process
+        secret = get_secret_value(secret_name)
+        stdscr.move(h // 2 - 1, 0)
+        stdscr.clrtobot()
+        stdscr.addstr(h // 2 - 1, w // 2 - 10, f"Code: {generate_code(secret)}  (counter {parse_value(secret).counter})")
+        stdscr.addstr(h // 2 + 1, w // 2 - 10, "[n] Next code [q] Back to the list")
+        stdscr.refresh()
+        key = stdscr.getch()
+        if key in (ord('q'), ord('Q')):
+            return
+        elif key in (ord('n'), ord('N')):
+            engine.forget(secret)
+            commit_update(next_code)  # The code shown next is made from the committed value
+
+# label of a dashboard row: the code, plus the period or counter when it is not a plain 30 s code
+def dashboard_row(name, code, params, name_width):
+    if params is not None and params.counter is not None:
+        detail = f"  #{params.counter}"
+    elif params is not None and params.period != engine.period:
+        detail = f"  {params.period}s"
+    else:
+        detail = ""
+    return f"{name[:name_width]:<{name_width}}  {code}{detail}"
 
-        # Modify the progress bar length (add 10 characters to the default length)
-        bar_length = 30  # 20 + 10
-        progress = int((remaining / duration) * bar_length)
-        
-        # Remove the square brackets and just print the bar
-        stdscr.addstr(h // 2 - 1, w // 2 - 10, "█" * progress + "─" * (bar_length - progress))
+# all codes dashboard ft
+def codes_dashboard(stdscr):
+    stdscr.clear()
+    h, w = stdscr.getmaxyx()
 
-        stdscr.addstr(h // 2 + 1, w // 2 - 10, "Press 'q' to return to the secrets list.")  # Instruction to quit
-        stdscr.refresh()  # Refresh display to show updated timer
+    if not secrets:
+        stdscr.addstr(h // 2, w // 2 - 10, "No secrets available.")
+        stdscr.refresh()
+        stdscr.getch()
+        return
 
-        # Check for user input in a non-blocking way
-        stdscr.nodelay(True)  # Set getch to non-blocking
-        key = stdscr.getch()
-        if key == ord('q'):  # Check if 'q' is pressed
-            stdscr.nodelay(False)  # Reset nodelay mode before exiting
-            return  # Exit the loop and return to secrets list
+    names = get_usage().ranked(secrets)  # Most used first
+    name_width = min(max(len(name) for name in names), max(w - 20, 10))
+    page_size = max(h - 4, 1)
+    top = 0
+    screen = DiffWriter(stdscr)  # Only changed cells are written: the countdown and rows that rolled over
+    drawn_top = drawn_size = None
 
-        # Sleep briefly to control the refresh rate
-        time.sleep(0.5)  # Adjust sleep time as needed
+    try:
+        while True:
+            if (drawn_top, drawn_size) != (top, page_size):
+                # Only the secrets of the visible page are decrypted; each code is then recomputed
+                # only when its own window rolls over
+                board = CodeBoard([(name, get_secret_value(name)) for name in names[top:top + page_size]])
+            current_time = time.time()
+            changed = board.refresh(current_time)
+            remaining = engine.seconds_remaining(current_time)
+
+            screen.put(0, 0, f"All Codes ({len(names)})  Time remaining: {int(remaining):2d} seconds"[:w - 1])
+            for i in (range(len(board.names)) if (drawn_top, drawn_size) != (top, page_size) else changed):
+                text = dashboard_row(board.names[i], board.codes[i], board.params[i], name_width)
+                screen.put(2 + i, 0, text[:w - 1])
+            drawn_top, drawn_size = top, page_size
+            screen.put(h - 1, 0, "[Up/Down/PgUp/PgDn] Scroll [q] Return to main menu"[:w - 1])
+            stdscr.refresh()
 
-        # Reset timer when time has elapsed
-        if remaining <= 0:
-            start_time = current_time  # Reset start time
-            next_code_time = (start_time + duration) // duration * duration  # Reset next code time to the next 30s boundary
+            # Sleep until the countdown changes or the next code expires, whichever comes first
+            wait = remaining - int(remaining)
+            next_expiry = board.next_expiry()
+            if next_expiry is not None:
+                wait = min(wait, max(next_expiry - current_time, 0))
+            stdscr.timeout(int(wait * 1000) + 1)
+            key = stdscr.getch()
+            if key in (ord('q'), ord('Q'), 27):
+                return
+            elif key == curses.KEY_DOWN and top + page_size < len(names):
+                top += 1
+            elif key == curses.KEY_UP and top > 0:
+                top -= 1
+            elif key == curses.KEY_NPAGE:
+                top = max(min(top + page_size, len(names) - page_size), 0)
+            elif key == curses.KEY_PPAGE:
+                top = max(top - page_size, 0)
+            elif key == curses.KEY_RESIZE:
+                h, w = stdscr.getmaxyx()
+                page_size = max(h - 4, 1)
+                stdscr.clear()
+                screen.invalidate()
+                drawn_top = None
+    finally:
+        stdscr.timeout(-1)  # Back to blocking getch for the other screens
 
 # show code ft
 def show_code(stdscr, secret_name):
@@ -593,17 +915,22 @@ def show_code(stdscr, secret_name):
     h, w = stdscr.getmaxyx()
 
     # Get the secret key
-    secret = secrets[secret_name]
+    secret = get_secret_value(secret_name)
+    get_usage().record(secret_name)  # Written in batches to the usage file, the vault is not rewritten
 
     # Show the code generation process
     stdscr.addstr(h // 2 - 2, w // 2 - 10, f"Secret: {secret_name}")
 
-    draw_timer(stdscr, secret)  # Call the timer function to display timer and code
+    if engine.is_counter_based(secret):
+        draw_counter(stdscr, secret_name)  # HOTP: no timer, the next code is made on request
+    else:
+        draw_timer(stdscr, secret)  # Call the timer function to display timer and code
 
     stdscr.refresh()
 
 # Main function
 def main(stdscr):
+    stdscr = tracing.window(stdscr)  # Times every frame when AUTHTERM_TRACE is set
     splash_screen(stdscr)
     load_secrets()
 
@@ -612,7 +939,16 @@ def main(stdscr):
     else:
         verify_password(stdscr)
 
-    main_menu(stdscr)
+    if START_GROUP != DEFAULT_GROUP:
+        try:
+            switch_group(START_GROUP)
+        except GroupError:
+            pass  # Unknown group, stay in the default one
+
+    try:
+        main_menu(stdscr)
+    finally:
+        flush_usage()
 
 def exit_app(stdscr):
     stdscr.clear()
@@ -0,0 +1,470 @@
+"""Command line entry point of authterm.
+
+Without arguments the curses app is started. The subcommands never load curses:
+
+    authterm code NAME... [--next]   Print the current (or the next) code of secrets
+                                     (a counter based secret moves on to its next code)
+    authterm list                    Print the names of all secrets
+    authterm add NAME VALUE [--period S] [--digits N] [--algorithm A] [--counter N]
+                                     Add or replace a secret (Base32 value, --counter for HOTP)
+    authterm delete NAME             Delete a secret
+    authterm import FILE [--format F] [--replace]
+                                     Import otpauth URIs, CSV or JSON lines ('-' for stdin)
+    authterm export FILE [--format F]
+                                     Export all secrets, decrypted ('-' for stdout)
+    authterm watch [NAME|PATTERN...] Print a JSON line per secret each time its code rolls over
+    authterm history [diff V [V2] | restore V]
+                                     List the saved versions of the vault, compare two (V2
+                                     defaults to the newest) or go back to one
+    authterm sync OTHER [--dry-run]  Merge the vault with another copy of it (a vault file or a
+                                     mirror directory), the newer version of each secret wins
+    authterm agent [--foreground]    Unlock once and serve codes from a background agent
+    authterm agent stop              Stop the running agent
+    authterm groups [add NAME | delete NAME]
+                                     List the groups of the vault, add one, delete an empty one
+
+    authterm --group NAME ...        Work on a group other than the default one (see groups.py)
+    authterm --trace FILE ...        Record timings of vault, code and screen work (see tracing.py)
+    authterm --group NAME --trace FILE ...
+                                     Global options can be combined, in any order
+
+The vault password is read from $AUTHTERM_PASSWORD, or asked for on the terminal.
+While an agent is running, 'code' and 'list' are answered by it without unlocking.
+The group can also be chosen with $AUTHTERM_GROUP; each group has its own agent.
+Modules are imported by the commands that need them, to keep startup short.
+"""
+import os
+import sys
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class CliError(Exception):
+    pass
+
+
+# Function to get the group the command works on ($AUTHTERM_GROUP, set by --group)
+def selected_group():
+    from groups import DEFAULT_GROUP
+    return os.environ.get("AUTHTERM_GROUP") or DEFAULT_GROUP
+
+
+# Function to get the groups of the vault (no file is read here)
+# Leftover journal records are not compacted on open: the process would wait for it before exiting; a commit
+# still compacts once COMPACT_EVERY records have piled up
+def vault_groups():
+    from storage import VaultStore, vault_path
+    from groups import VaultGroups
+    return VaultGroups(VaultStore(vault_path(BASE_DIR), journal=os.environ.get("AUTHTERM_JOURNAL", "1") != "0"),
+                       compact_on_open=False)
+
+
+# Function to load the selected group without the curses app, returns (store, password_hash, secrets)
+# The password record is in the main vault, so it is read too; other groups are not
+def open_vault():
+    from groups import DEFAULT_GROUP, GroupError
+    groups = vault_groups()
+    secrets = groups.open(DEFAULT_GROUP)
+    if groups.password_hash is None:
+        raise CliError("no vault password set yet, run authterm once to create the vault")
+    group = selected_group()
+    try:
+        return groups.store(group), groups.password_hash, groups.open(group)
+    except GroupError as e:
+        raise CliError(str(e))
+
+
+# Function to get the vault password from $AUTHTERM_PASSWORD or a prompt
+def read_password(prompt="Vault password: "):
+    password = os.environ.get("AUTHTERM_PASSWORD")
+    if password is None:
+        import getpass
+        password = getpass.getpass(prompt)
+    return password
+
+
+# Function to unlock the vault with $AUTHTERM_PASSWORD or a prompt, returns the entry cipher
+def unlock(password_hash, max_cached=None):
+    import kdf
+    from entry_crypto import EntryCipher
+    from entry_crypto import MAX_CACHED
+    verified, data_key = kdf.unlock(read_password(), password_hash)
+    if not verified:
+        raise CliError("invalid password")
+    if data_key is None:
+        raise CliError("this vault needs an upgrade, open it once with authterm")
+    # Values from before they were bound to their names are read until authterm upgrades the vault
+    return EntryCipher(data_key, MAX_CACHED if max_cached is None else max_cached,
+                       legacy=not kdf.names_bound(password_hash))
+
+
+# Function to decrypt a stored value, a value that fails to decrypt (tampered with, or from another vault) is an error
+def decrypt(cipher, name, token):
+    from entry_crypto import DecryptionError
+    try:
+        return cipher.decrypt(name, token)
+    except DecryptionError as e:
+        raise CliError(f"cannot decrypt '{name}': {e}")
+
+
+# Function to look up a secret by name
+def require_secret(secrets, name):
+    if name not in secrets:
+        raise CliError(f"no secret named '{name}'")
+    return secrets[name]
+
+
+# Function to send a request to the running agent, returns None if no agent is running
+def ask_agent(op, **fields):
+    import agent
+    client = agent.connect(agent.socket_path(selected_group()))
+    if client is None:
+        return None
+    try:
+        return client.request(op, **fields)
+    except (agent.AgentError, OSError) as e:
+        raise CliError(f"agent: {e}")
+    finally:
+        client.close()
+
+
+def cmd_code(args):
+    show_next = "--next" in args
+    names = [arg for arg in args if arg != "--next"]
+    if not names:
+        raise CliError("usage: authterm code NAME... [--next]")
+    response = ask_agent("code", names=names, next=show_next)
+    if response is not None:
+        if response["missing"]:
+            raise CliError(f"no secret named '{response['missing'][0]}'")
+        for name in names:
+            print(response["codes"][name])
+        return
+    store, password_hash, secrets = open_vault()
+    tokens = [require_secret(secrets, name) for name in names]
+    cipher = unlock(password_hash)
+    from code_engine import engine, advance_counter
+    codes, counter_names = {}, []
+    for name, token in zip(names, tokens):
+        value = decrypt(cipher, name, token)
+        if engine.is_counter_based(value) and not show_next:
+            counter_names.append(name)  # Read again below
+        else:
+            codes[name] = engine.upcoming(value) if show_next else engine.now(value)
+
+    # A counter based code is used once: it is read and its counter advanced with the vault lock held, so two
+    # processes never show the same code
+    def use_counters(current):
+        ops = []
+        for name in counter_names:
+            value = decrypt(cipher, name, require_secret(current, name))
+            codes[name] = engine.now(value)
+            if engine.is_counter_based(value):
+                ops.append(("set", name, cipher.encrypt(name, advance_counter(value))))
+        return ops
+    if counter_names:
+        store.commit(use_counters, password_hash, secrets)
+    for name in names:
+        print(codes[name])
+    from usage import UsageStats
+    usage = UsageStats(store.path)
+    for name in names:
+        usage.record(name)
+    usage.flush()  # One line per name in the usage file, the vault is not rewritten
+
+
+def cmd_list(args):
+    if args:
+        raise CliError("usage: authterm list")
+    response = ask_agent("list")
+    if response is not None:
+        names = response["names"]
+    else:
+        _, _, names = open_vault()  # Names are not encrypted, no password needed
+    for name in names:
+        print(name)
+
+
+# Function to remove "--flag VALUE" from a list of arguments, returns the value (None if absent)
+def pop_option(args, flag):
+    if flag not in args:
+        return None
+    i = args.index(flag)
+    if i + 1 >= len(args):
+        raise CliError(f"{flag} needs a value")
+    value = args[i + 1]
+    del args[i:i + 2]
+    return value
+
+
+def cmd_add(args):
+    args = list(args)
+    options = {key: pop_option(args, f"--{key}") for key in ("period", "digits", "algorithm", "counter")}
+    if len(args) != 2:
+        raise CliError("usage: authterm add NAME VALUE [--period S] [--digits N] [--algorithm A] [--counter N]")
+    name, value = args
+    from code_engine import make_value
+    try:
+        value = make_value(value, **options)
+    except ValueError as e:
+        raise CliError(f"invalid secret: {e}")
+    store, password_hash, secrets = open_vault()
+    secrets[name] = unlock(password_hash).encrypt(name, value)
+    store.commit([("set", name, secrets[name])], password_hash, secrets)
+
+
+def cmd_delete(args):
+    if len(args) != 1:
+        raise CliError("usage: authterm delete NAME")
+    store, password_hash, secrets = open_vault()
+    require_secret(secrets, args[0])
+    unlock(password_hash)
+    del secrets[args[0]]
+    store.commit([("del", args[0])], password_hash, secrets)
+
+
+# Function to split "--format F" (and other flags) from the arguments, returns (file, format, flags)
+def transfer_args(args, usage, flags=()):
+    import transfer
+    args = list(args)
+    file_format = pop_option(args, "--format")
+    if file_format is not None and file_format not in transfer.FORMATS:
+        raise CliError(f"--format must be one of {', '.join(transfer.FORMATS)}")
+    found = {flag for flag in flags if flag in args}
+    args = [arg for arg in args if arg not in found]
+    if len(args) != 1:
+        raise CliError(usage)
+    return args[0], file_format or transfer.guess_format(args[0]), found
+
+
+def cmd_import(args):
+    import transfer
+    path, file_format, flags = transfer_args(args, "usage: authterm import FILE [--format F] [--replace]",
+                                             ("--replace",))
+    store, password_hash, secrets = open_vault()
+    cipher = unlock(password_hash)
+    try:
+        source = sys.stdin if path == "-" else open(path, 'r', encoding='utf-8', newline='')
+    except OSError as e:
+        raise CliError(str(e))
+    with source:
+        added, errors = transfer.import_entries(source, file_format, store, password_hash, secrets, cipher,
+                                                replace="--replace" in flags)
+    for line_no, error in errors:
+        print(f"{path}:{line_no}: {error}", file=sys.stderr)
+    print(f"imported {added} secrets, skipped {len(errors)} lines", file=sys.stderr)
+    if errors:
+        raise CliError("some lines were not imported")
+
+
+def cmd_export(args):
+    import transfer
+    path, file_format, _ = transfer_args(args, "usage: authterm export FILE [--format F]")
+    _, password_hash, secrets = open_vault()
+    cipher = unlock(password_hash)
+    from entry_crypto import DecryptionError
+    if path == "-":
+        try:
+            transfer.export_entries(sys.stdout, file_format, secrets, cipher)
+        except DecryptionError as e:
+            raise CliError(f"export stopped: {e}")
+        return
+    try:
+        # The export holds the secrets in the clear, only the owner may read it
+        out = os.fdopen(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w', encoding='utf-8',
+                        newline='')
+    except OSError as e:
+        raise CliError(str(e))
+    with out:
+        try:
+            count = transfer.export_entries(out, file_format, secrets, cipher)
+        except DecryptionError as e:
+            raise CliError(f"export stopped: {e}")
+    print(f"exported {count} secrets to {path}", file=sys.stderr)
+
+
+def cmd_watch(args):
+    import watch
+    store, password_hash, secrets = open_vault()
+    if not watch.select(secrets, args):
+        raise CliError("no secret matches " + " ".join(args))
+    cipher = unlock(password_hash, max_cached=max(len(secrets), 256))
+    from entry_crypto import DecryptionError
+    try:
+        watch.write(watch.ndjson(watch.batches(watch.VaultSource(store, password_hash, secrets, cipher, args))),
+                    sys.stdout)
+    except DecryptionError as e:
+        raise CliError(f"watch stopped: {e}")
+    # The reader went away: nothing more can be written, also not the buffered rest at exit
+    os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+
+
+def cmd_history(args):
+    import time
+    from history import HistoryError
+    store, password_hash, secrets = open_vault()
+    if store.history is None:
+        raise CliError("the history is turned off (AUTHTERM_HISTORY=0)")
+    history = store.history
+    try:
+        if not args:
+            for entry in history.versions():
+                when = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(entry["time"]))
+                print(f"{entry['version']:6d}  {when}  {entry['kind']:5}  {entry['entries']:7d} secrets"
+                      f"  +{entry['set']} -{entry['deleted']}")
+        elif args[0] == "diff" and len(args) in (2, 3):
+            versions = [parse_version(arg) for arg in args[1:]]
+            added, deleted, changed = history.diff(versions[0], versions[1] if len(versions) > 1 else history.latest())
+            for mark, names in (("+", added), ("-", deleted), ("~", changed)):
+                for name in names:
+                    print(f"{mark} {name}")
+        elif args[0] == "restore" and len(args) == 2:
+            restored = history.secrets(parse_version(args[1]))
+            unlock(password_hash)
+            store.save(password_hash, restored)
+            print(f"restored version {args[1]} ({len(restored)} secrets) as version {history.latest()}",
+                  file=sys.stderr)
+        else:
+            raise CliError("usage: authterm history [diff V [V2] | restore V]")
+    except HistoryError as e:
+        raise CliError(str(e))
+
+
+# Function to parse a version number argument
+def parse_version(arg):
+    if not arg.isdigit():
+        raise CliError(f"not a version number: {arg}")
+    return int(arg)
+
+
+def cmd_sync(args):
+    import sync
+    from groups import DEFAULT_GROUP, GroupError, VaultGroups
+    from storage import VaultStore
+    dry_run = "--dry-run" in args
+    args = [arg for arg in args if arg != "--dry-run"]
+    if len(args) != 1:
+        raise CliError("usage: authterm sync OTHER [--dry-run]")
+    other_path = args[0]
+    group = selected_group()
+    groups = vault_groups()
+    try:
+        groups.open(DEFAULT_GROUP)  # The password record
+        local = sync.VaultReplica(groups.store(group), groups.password_hash, groups.open(group),
+                                  with_password=group == DEFAULT_GROUP)
+        if os.path.isdir(other_path) or (not os.path.exists(other_path)
+                                         and not other_path.endswith(('.json', '.bin'))):
+            other = sync.MirrorReplica(other_path)
+        elif not os.path.exists(other_path):
+            raise CliError(f"no vault at {other_path}")
+        elif os.path.samefile(other_path, groups.main.path):
+            raise CliError("cannot sync a vault with itself")
+        else:
+            other_groups = VaultGroups(VaultStore(other_path, journal=groups.main.journal), compact_on_open=False)
+            other_groups.open(DEFAULT_GROUP)
+            other = sync.VaultReplica(other_groups.store(group), other_groups.password_hash,
+                                      other_groups.open(group), with_password=group == DEFAULT_GROUP)
+        sync.check_same_key(local, other, read_password)
+        received, sent = sync.sync(local, other, dry_run)
+    except (GroupError, sync.SyncError) as e:
+        raise CliError(str(e))
+    for mark, names in (("<", received), (">", sent)):
+        for name in names:
+            print(f"{mark} {'(password)' if name == sync.PASSWORD_ENTRY else name}")
+    print(f"{len(received)} taken from {other_path}, {len(sent)} sent to it" + (" (dry run)" if dry_run else ""),
+          file=sys.stderr)
+
+
+def cmd_agent(args):
+    import agent
+    if args == ["stop"]:
+        if ask_agent("stop") is None:
+            raise CliError("no agent is running")
+        return
+    if args not in ([], ["--foreground"]):
+        raise CliError("usage: authterm agent [--foreground] | authterm agent stop")
+    store, password_hash, secrets = open_vault()
+    # The agent exists to answer fast, so it keeps every value it decrypted (up to the vault size)
+    cipher = unlock(password_hash, max_cached=max(len(secrets), agent.MIN_CACHED))
+    socket_path = agent.socket_path(selected_group())
+    try:
+        sock = agent.listen(socket_path)
+    except agent.AgentError as e:
+        raise CliError(str(e))
+    print(f"authterm agent listening on {socket_path}")
+    sys.stdout.flush()
+    if not args:
+        agent.daemonize()
+    agent.serve(agent.Agent(store, password_hash, secrets, cipher), sock, socket_path)
+
+
+def cmd_groups(args):
+    from groups import GroupError
+    groups = vault_groups()
+    try:
+        if not args:
+            for name in groups.names():
+                print(name)
+        elif len(args) == 2 and args[0] == "add":
+            if not os.path.exists(groups.main.path):
+                raise CliError("no vault yet, run authterm once to create it")
+            groups.create(args[1])
+        elif len(args) == 2 and args[0] == "delete":
+            groups.delete(args[1])
+        else:
+            raise CliError("usage: authterm groups [add NAME | delete NAME]")
+    except GroupError as e:
+        raise CliError(str(e))
+
+
+COMMANDS = {
+    "code": cmd_code,
+    "list": cmd_list,
+    "add": cmd_add,
+    "delete": cmd_delete,
+    "import": cmd_import,
+    "export": cmd_export,
+    "watch": cmd_watch,
+    "history": cmd_history,
+    "sync": cmd_sync,
+    "agent": cmd_agent,
+    "groups": cmd_groups,
+}
+
+
+# Global options, in any order before the command: option -> (environment variable it sets, what its value is)
+GLOBAL_OPTIONS = {
+    "--trace": ("AUTHTERM_TRACE", "a file name"),  # Read when tracing is first imported
+    "--group": ("AUTHTERM_GROUP", "a group name"),
+}
+
+
+def main(argv):
+    while argv and argv[0] in GLOBAL_OPTIONS:
+        variable, value = GLOBAL_OPTIONS[argv[0]]
+        if len(argv) < 2:
+            print(f"authterm: {argv[0]} needs {value}", file=sys.stderr)
+            return 2
+        os.environ[variable] = argv[1]
+        argv = argv[2:]
+    if not argv:
+        import curses
+        import authenticator
+        curses.wrapper(authenticator.main)
+        return 0
+    command = COMMANDS.get(argv[0])
+    if command is None:
+        print(__doc__.strip(), file=sys.stderr)
+        return 2
+    try:
+        command(argv[1:])
+    except CliError as e:
+        print(f"authterm: {e}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        return 130
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,301 @@
+import base64
+import binascii
+import hashlib
+import heapq
+import hmac
+import re
+import struct
+import time
+from collections import OrderedDict, namedtuple
+
+from tracing import traced
+
+# TOTP defaults (RFC 6238), same as the pyotp defaults the app used before
+DEFAULT_PERIOD = 30
+DEFAULT_DIGITS = 6
+DEFAULT_ALGORITHM = "SHA1"
+
+# Parameters a secret can override (RFC 6238 / the otpauth:// URI format)
+ALGORITHMS = {"SHA1": hashlib.sha1, "SHA256": hashlib.sha256, "SHA512": hashlib.sha512}
+MIN_DIGITS = 6
+MAX_DIGITS = 10
+MAX_PERIOD = 86400
+
+# Cache limits, old entries are evicted in LRU order
+MAX_KEYS = 1024
+MAX_CODES = 4096
+
+
+# Regex to match Base32 encoding
+BASE32_RE = re.compile(r'^[A-Z2-7]+=*$')
+SEPARATORS = str.maketrans("", "", " -\t")  # Characters people put between groups of a secret
+
+
+# Function to check base32
+def is_base32(secret_value):
+    return bool(BASE32_RE.match(secret_value))
+
+
+# Function to normalize a pasted or imported secret (spaces, dashes, lowercase), None if it is not Base32
+def normalize_base32(secret_value):
+    secret_value = secret_value.translate(SEPARATORS).upper()
+    return secret_value if BASE32_RE.match(secret_value) else None
+
+
+# OTP parameters of a stored secret; None means the engine default, counter is only set for HOTP
+OtpParams = namedtuple("OtpParams", "secret period digits algorithm counter")
+
+
+# Function to split a stored value "SECRET[?period=60&digits=8&algorithm=SHA256&counter=5]"
+# into its Base32 secret and parameters, raises ValueError for bad parameters
+def parse_value(value):
+    secret, _, query = value.partition("?")
+    period = digits = algorithm = counter = None
+    for key, _, text in (item.partition("=") for item in query.split("&") if item):
+        if key == "period":
+            period = int(text)
+            if not 0 < period <= MAX_PERIOD:
+                raise ValueError(f"period must be 1 to {MAX_PERIOD} seconds")
+        elif key == "digits":
+            digits = int(text)
+            if not MIN_DIGITS <= digits <= MAX_DIGITS:
+                raise ValueError(f"digits must be {MIN_DIGITS} to {MAX_DIGITS}")
+        elif key == "algorithm":
+            algorithm = text.upper()
+            if algorithm not in ALGORITHMS:
+                raise ValueError(f"algorithm must be one of {', '.join(ALGORITHMS)}")
+        elif key == "counter":
+            counter = int(text)
+            if counter < 0:
+                raise ValueError("counter must not be negative")
+        else:
+            raise ValueError(f"unknown OTP parameter '{key}'")
+    return OtpParams(secret, period, digits, algorithm, counter)
+
+
+# Function to build a stored value from a secret and its parameters, defaults are left out
+# The secret is normalized (see normalize_base32), raises ValueError if it or a parameter is invalid
+def make_value(secret, period=None, digits=None, algorithm=None, counter=None):
+    normalized = normalize_base32(secret)
+    if normalized is None:
+        raise ValueError("secret is not valid Base32")
+    params = []
+    if period is not None and int(period) != DEFAULT_PERIOD:
+        params.append(f"period={int(period)}")
+    if digits is not None and int(digits) != DEFAULT_DIGITS:
+        params.append(f"digits={int(digits)}")
+    if algorithm is not None and str(algorithm).upper() != DEFAULT_ALGORITHM:
+        params.append(f"algorithm={str(algorithm).upper()}")
+    if counter is not None:
+        params.append(f"counter={int(counter)}")
+    value = normalized + ("?" + "&".join(params) if params else "")
+    parse_value(value)  # Range checks
+    return value
+
+
+# Function to get a counter based value with its counter moved forward
+def advance_counter(value, by=1):
+    params = parse_value(value)
+    return make_value(params.secret, params.period, params.digits, params.algorithm, params.counter + by)
+
+
+# Function to decode a Base32 secret the same way pyotp does (padding added, case folded)
+def decode_secret(secret):
+    secret = secret.replace(" ", "")
+    return base64.b32decode(secret + "=" * ((8 - len(secret)) % 8), casefold=True)
+
+
+# Function to turn an HMAC digest into a zero-padded code (RFC 4226 dynamic truncation)
+def truncate(digest_bytes, digits=DEFAULT_DIGITS):
+    offset = digest_bytes[-1] & 0x0F
+    code = struct.unpack_from(">I", digest_bytes, offset)[0] & 0x7FFFFFFF
+    return str(code % 10 ** digits).zfill(digits)
+
+
+# Function to generate the codes of many keyed HMACs for one time step, "-" * digits for a None HMAC
+def batch_codes(macs, step, digits=DEFAULT_DIGITS):
+    msg = struct.pack(">Q", step)
+    codes = []
+    for mac in macs:
+        if mac is None:
+            codes.append("-" * digits)
+            continue
+        mac = mac.copy()
+        mac.update(msg)
+        codes.append(truncate(mac.digest(), digits))
+    return codes
+
+
+class CodeEngine:
+    """Generates OTP codes, caching key material per secret and codes per (secret, time step).
+
+    Secrets are stored values (see parse_value): parameters missing from a value fall
+    back to the engine defaults. For counter based (HOTP) values the counter takes
+    the place of the time step.
+    """
+
+    def __init__(self, period=DEFAULT_PERIOD, digits=DEFAULT_DIGITS, algorithm=DEFAULT_ALGORITHM,
+                 max_keys=MAX_KEYS, max_codes=MAX_CODES):
+        self.period = period
+        self.digits = digits
+        self.algorithm = algorithm
+        self.max_keys = max_keys
+        self.max_codes = max_codes
+        self._keys = OrderedDict()   # secret -> (parameters, keyed HMAC object copied for every code)
+        self._codes = OrderedDict()  # (secret, step) -> code
+
+    # Function to get the parameters of a stored value, with the engine defaults filled in
+    def params(self, secret):
+        entry = self._keys.get(secret)
+        if entry is not None:
+            return entry[0]
+        params = parse_value(secret)
+        return params._replace(period=params.period or self.period, digits=params.digits or self.digits,
+                               algorithm=params.algorithm or self.algorithm)
+
+    # Function to build a keyed HMAC for a secret (not cached)
+    def keyed_hmac(self, secret):
+        params = self.params(secret)
+        return hmac.new(decode_secret(params.secret), digestmod=ALGORITHMS[params.algorithm])
+
+    # Function to get the parameters and keyed HMAC for a secret, decoding the value only once
+    def _entry(self, secret):
+        entry = self._keys.get(secret)
+        if entry is None:
+            entry = (self.params(secret), self.keyed_hmac(secret))
+            self._keys[secret] = entry
+            if len(self._keys) > self.max_keys:
+                self._keys.popitem(last=False)
+        else:
+            self._keys.move_to_end(secret)
+        return entry
+
+    # Function to check whether a secret is counter based (HOTP)
+    def is_counter_based(self, secret):
+        return self._entry(secret)[0].counter is not None
+
+    # Function to get the time step for a timestamp (defaults to now), in the secret's period if given
+    def step_at(self, for_time=None, secret=None):
+        if for_time is None:
+            for_time = time.time()
+        period = self._entry(secret)[0].period if secret is not None else self.period
+        return int(for_time // period)
+
+    # Function to get the number of seconds left in the current window of a secret (or the default period)
+    def seconds_remaining(self, for_time=None, secret=None):
+        if for_time is None:
+            for_time = time.time()
+        period = self._entry(secret)[0].period if secret is not None else self.period
+        return period - (for_time % period)
+
+    # Function to get the code of a secret for a given time step (or counter)
+    def code_at(self, secret, step):
+        cache_key = (secret, step)
+        code = self._codes.get(cache_key)
+        if code is not None:
+            return code
+        code = self._compute(secret, step)
+        self._codes[cache_key] = code
+        if len(self._codes) > self.max_codes:
+            self._codes.popitem(last=False)
+        return code
+
+    # Function to compute a code with one HMAC (cache miss)
+    @traced("code.hmac", "code")
+    def _compute(self, secret, step):
+        params, mac = self._entry(secret)
+        mac = mac.copy()
+        mac.update(struct.pack(">Q", step))
+        return truncate(mac.digest(), params.digits)
+
+    # Function to get the current step of a secret: its counter, or the time step in its period
+    def current_step(self, secret, for_time=None):
+        params = self._entry(secret)[0]
+        if params.counter is not None:
+            return params.counter
+        return self.step_at(for_time, secret)
+
+    # Function to get the current code, computing the next one ahead of time
+    def now(self, secret, for_time=None):
+        step = self.current_step(secret, for_time)
+        code = self.code_at(secret, step)
+        self.code_at(secret, step + 1)  # Lookahead so the rollover is a cache hit
+        return code
+
+    # Function to get the code of the next window (or the next counter value)
+    def upcoming(self, secret, for_time=None):
+        return self.code_at(secret, self.current_step(secret, for_time) + 1)
+
+    # Function to drop cached key material and codes (e.g. after a secret was edited or deleted)
+    def forget(self, secret=None):
+        if secret is None:
+            self._keys.clear()
+            self._codes.clear()
+            return
+        self._keys.pop(secret, None)
+        for cache_key in [k for k in self._codes if k[0] == secret]:
+            del self._codes[cache_key]
+
+
+class CodeBoard:
+    """Live codes for many secrets at once, each recomputed only when its own window rolls over.
+
+    A min-heap holds the time at which each entry's code expires, so a refresh pops
+    just the entries that are due (60 s codes once a minute, counter based codes
+    never) and computes them in batches per (time step, digits).
+    """
+
+    def __init__(self, entries, code_engine=None):
+        self.engine = code_engine or engine
+        self.names = [name for name, _ in entries]
+        self.params = []
+        self._macs = []
+        for _, secret in entries:
+            try:
+                params, mac = self.engine.params(secret), self.engine.keyed_hmac(secret)
+            except (binascii.Error, ValueError):  # Undecodable secret, shown as dashes
+                params, mac = None, None
+            self.params.append(params)
+            self._macs.append(mac)
+        self.codes = ["-" * (params.digits if params else self.engine.digits) for params in self.params]
+        self.expires = [None] * len(self.names)  # Time the current code expires, None for counter based codes
+        self._due = [(0, i) for i, params in enumerate(self.params) if params is not None]  # Heap, all due now
+        self.computed = 0  # Codes computed so far
+
+    # Function to recompute the codes whose window rolled over, returns the indexes of the rows that changed
+    # With report_all=True every entry that rolled over is returned, also if its new code is the same
+    @traced("code.board_refresh", "code")
+    def refresh(self, for_time=None, report_all=False):
+        if for_time is None:
+            for_time = time.time()
+        batches = {}  # (step, digits) -> indexes of the due entries
+        while self._due and self._due[0][0] <= for_time:
+            _, i = heapq.heappop(self._due)
+            params = self.params[i]
+            if params.counter is not None:
+                step = params.counter  # Counter based, stays valid until the counter moves
+            else:
+                step = int(for_time // params.period)
+                self.expires[i] = (step + 1) * params.period
+                heapq.heappush(self._due, (self.expires[i], i))
+            batches.setdefault((step, params.digits), []).append(i)
+        changed = []
+        for (step, digits), indexes in batches.items():
+            for i, code in zip(indexes, batch_codes([self._macs[i] for i in indexes], step, digits)):
+                if code != self.codes[i] or report_all:
+                    self.codes[i] = code
+                    changed.append(i)
+            self.computed += len(indexes)
+        return sorted(changed)
+
+    # Function to get the time at which the next code expires, None if no code ever does
+    def next_expiry(self):
+        return self._due[0][0] if self._due else None
+
+    # Function to get (name, code) rows, optionally only a slice of them
+    def rows(self, start=0, stop=None):
+        return list(zip(self.names[start:stop], self.codes[start:stop]))
+
+
+# Shared engine used by the app
+engine = CodeEngine()
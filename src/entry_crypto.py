@@ -0,0 +1,136 @@
+"""Per-entry encryption of secret values, using only the standard library.
+
+Each value is encrypted on its own as "enc2:" + base64(nonce | ciphertext | tag):
+the keystream is HMAC-SHA256(enc_key, nonce | block counter) and the tag is
+HMAC-SHA256(mac_key, len(name) | name | nonce | ciphertext) truncated to 16 bytes
+(encrypt-then-MAC). The tag binds a value to the name of its entry, so values cannot
+be swapped or copied between entries. Both keys are derived from the vault's random
+data key, which is stored wrapped under the password in the vault header (see kdf.py).
+
+"enc1:" values, from before names were bound, have the tag HMAC-SHA256(mac_key,
+nonce | ciphertext). They are only read while the vault itself is in the old format
+(EntryCipher(legacy=True)) and are encrypted again when authterm upgrades it.
+"""
+import base64
+import hmac
+import os
+from collections import OrderedDict
+
+PREFIX = "enc2:"
+LEGACY_PREFIX = "enc1:"  # Values whose tag does not cover the name
+NONCE_BYTES = 16
+TAG_BYTES = 16
+KEY_BYTES = 32
+MAX_CACHED = 256  # Decrypted values kept in memory (LRU)
+
+
+class DecryptionError(Exception):
+    pass
+
+
+# Function to derive a purpose-specific key from a master key
+def subkey(master_key, purpose):
+    return hmac.digest(master_key, purpose, 'sha256')
+
+
+# Function to check whether a stored value is encrypted
+def is_encrypted(value):
+    return value.startswith((PREFIX, LEGACY_PREFIX))
+
+
+# Function to check whether a stored value is in the format from before names were bound
+def is_legacy(value):
+    return value.startswith(LEGACY_PREFIX)
+
+
+# Function to XOR data with the HMAC-SHA256 counter keystream
+def _keystream_xor(enc_key, nonce, data):
+    keystream = b"".join(hmac.digest(enc_key, nonce + counter.to_bytes(4, "big"), 'sha256')
+                         for counter in range((len(data) + 31) // 32))[:len(data)]
+    # XOR as two big integers, much faster than byte by byte
+    return (int.from_bytes(data, "big") ^ int.from_bytes(keystream, "big")).to_bytes(len(data), "big")
+
+
+# Function to encrypt raw bytes into a token string, bound to `associated` (bytes the tag covers)
+def seal(key, plaintext, associated=b""):
+    return _seal(subkey(key, b"enc"), subkey(key, b"mac"), plaintext, associated)
+
+
+# Function to decrypt a token string back into raw bytes, raises DecryptionError if it was tampered with
+# or sealed with other associated bytes; "enc1:" tokens are only opened with legacy=True
+def open_sealed(key, token, associated=b"", legacy=False):
+    return _open(subkey(key, b"enc"), subkey(key, b"mac"), token, associated, legacy)
+
+
+# Function to get the bytes the tag covers besides the nonce and ciphertext (length first, so they cannot run
+# into the nonce)
+def _bound(associated):
+    return len(associated).to_bytes(4, "big") + associated
+
+
+def _seal(enc_key, mac_key, plaintext, associated):
+    nonce = os.urandom(NONCE_BYTES)
+    ciphertext = _keystream_xor(enc_key, nonce, plaintext)
+    tag = hmac.digest(mac_key, _bound(associated) + nonce + ciphertext, 'sha256')[:TAG_BYTES]
+    return PREFIX + base64.urlsafe_b64encode(nonce + ciphertext + tag).decode('ascii')
+
+
+def _open(enc_key, mac_key, token, associated, legacy):
+    if is_legacy(token):
+        if not legacy:
+            raise DecryptionError("Value is in the old format, which an upgraded vault no longer accepts")
+        covered = b""
+    elif token.startswith(PREFIX):
+        covered = _bound(associated)
+    else:
+        raise DecryptionError("Value is not encrypted")
+    try:
+        blob = base64.urlsafe_b64decode(token[len(PREFIX):])
+    except ValueError:
+        raise DecryptionError("Malformed encrypted value")
+    if len(blob) < NONCE_BYTES + TAG_BYTES:
+        raise DecryptionError("Malformed encrypted value")
+    nonce, ciphertext, tag = blob[:NONCE_BYTES], blob[NONCE_BYTES:-TAG_BYTES], blob[-TAG_BYTES:]
+    expected = hmac.digest(mac_key, covered + nonce + ciphertext, 'sha256')[:TAG_BYTES]
+    if not hmac.compare_digest(tag, expected):
+        raise DecryptionError("Encrypted value failed authentication")
+    return _keystream_xor(enc_key, nonce, ciphertext)
+
+
+class EntryCipher:
+    """Encrypts secret values with the vault data key, keeping recently decrypted values in an LRU.
+
+    Values are bound to the name of their entry. legacy=True also reads "enc1:" values,
+    for vaults not upgraded yet (see kdf.names_bound).
+    """
+
+    def __init__(self, data_key, max_cached=MAX_CACHED, legacy=False):
+        self._enc_key = subkey(data_key, b"enc")  # Derived once, not for every value
+        self._mac_key = subkey(data_key, b"mac")
+        self.max_cached = max_cached
+        self.legacy = legacy
+        self._cache = OrderedDict()  # (name, token) -> plaintext value
+
+    # Function to encrypt the secret value of an entry for storage
+    def encrypt(self, name, value):
+        token = _seal(self._enc_key, self._mac_key, value.encode('utf-8'), name.encode('utf-8'))
+        self._remember((name, token), value)
+        return token
+
+    # Function to decrypt the stored value of an entry; plaintext values (not yet migrated) are returned as is
+    def decrypt(self, name, token):
+        if not is_encrypted(token):
+            return token
+        key = (name, token)  # A value is only cached for the name it was checked for
+        value = self._cache.get(key)
+        if value is None:
+            value = _open(self._enc_key, self._mac_key, token, name.encode('utf-8'), self.legacy).decode('utf-8')
+            self._remember(key, value)
+        else:
+            self._cache.move_to_end(key)
+        return value
+
+    def _remember(self, key, value):
+        self._cache[key] = value
+        if len(self._cache) > self.max_cached:
+            self._cache.popitem(last=False)
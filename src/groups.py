@@ -0,0 +1,206 @@
+"""Named groups of secrets, each kept in its own vault file (a shard).
+
+The default group is the main vault (vault.json), which also holds the password
+record. Every other group lives in its own file under groups/ next to it, listed in
+groups/manifest.json:
+
+    {"groups": {"work": "work-e274eeff.json", "infra": "infra-5e03a58d.json"}}
+
+Shards use the format of the main vault (JSON or binary) and their values are
+encrypted with the vault data key. A shard is only read (and its names indexed) when
+its group is first opened, and a change is written to the shard of its own group, so
+opening and saving cost as much as the group in use. Shards have their own journal
+and lock, see storage.VaultStore.
+"""
+import hashlib
+import json
+import os
+import re
+
+from storage import COMPACT_EVERY, VaultStore, atomic_write
+
+DEFAULT_GROUP = "default"
+MAX_NAME = 64  # Longest group name
+
+
+class GroupError(Exception):
+    pass
+
+
+# Function to turn a group name into a file name part (readable prefix plus a hash, so names cannot collide)
+def group_slug(group):
+    prefix = re.sub(r'[^A-Za-z0-9_-]+', '_', group)[:32].strip('_') or 'group'
+    return f"{prefix}-{hashlib.sha1(group.encode('utf-8')).hexdigest()[:8]}"
+
+
+class ShardStore(VaultStore):
+    """Store of a group other than the default: secrets only, the password record stays in the main vault.
+
+    The password_hash callers pass in is handed back unchanged and never written to the shard.
+    """
+
+    def load(self):
+        _, secrets = super().load()
+        return None, secrets
+
+    def refresh(self, password_hash, secrets):
+        _, secrets, changed = super().refresh(None, secrets)
+        return password_hash, secrets, changed
+
+    def commit(self, ops, password_hash, secrets):
+        if callable(ops):
+            build = ops
+
+            def ops(secrets):
+                return self._check(build(secrets))
+        else:
+            self._check(ops)
+        _, secrets, changed = super().commit(ops, None, secrets)
+        return password_hash, secrets, changed
+
+    def save(self, password_hash, secrets, ops=None):
+        _, secrets, changed = super().save(None, secrets, ops)
+        return password_hash, secrets, changed
+
+    @staticmethod
+    def _check(ops):
+        if any(op[0] == "password" for op in ops):
+            raise GroupError("the password is kept in the default group")
+        return ops
+
+
+class VaultGroups:
+    """The groups of a vault, with the shards opened so far."""
+
+    def __init__(self, main_store, compact_on_open=True):
+        self.main = main_store
+        self.compact_on_open = compact_on_open  # Off for one-shot commands, which would wait for the compaction
+        self.dir = os.path.join(os.path.dirname(os.path.abspath(main_store.path)), 'groups')
+        self.manifest_path = os.path.join(self.dir, 'manifest.json')
+        self.password_hash = None  # From the default group, once it is open
+        self._manifest = {}
+        self._manifest_signature = None
+        self._stores = {DEFAULT_GROUP: main_store}
+        self._secrets = {}  # group -> secrets, for the groups opened so far
+
+    # Function to get the manifest (group -> shard file), read again only when its file changed
+    def _read_manifest(self):
+        try:
+            stat = os.stat(self.manifest_path)
+            signature = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        except FileNotFoundError:
+            signature = None
+        if signature != self._manifest_signature:
+            if signature is None:
+                self._manifest = {}
+            else:
+                with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                    self._manifest = json.load(f)["groups"]
+            self._manifest_signature = signature
+        return self._manifest
+
+    def _write_manifest(self, manifest):
+        atomic_write(self.manifest_path, json.dumps({"groups": manifest}, indent=2).encode('utf-8'))
+
+    # Function to list the group names, the default group first
+    def names(self):
+        return [DEFAULT_GROUP] + sorted(self._read_manifest())
+
+    # Function to get the store of a group (the file is not read here)
+    def store(self, group):
+        store = self._stores.get(group)
+        if store is None:
+            file_name = self._read_manifest().get(group)
+            if file_name is None:
+                raise GroupError(f"no group named '{group}'")
+            store = ShardStore(os.path.join(self.dir, file_name), journal=self.main.journal)
+            self._stores[group] = store
+        return store
+
+    # Function to open a group, its shard is read the first time only; returns its secrets
+    def open(self, group):
+        secrets = self._secrets.get(group)
+        if secrets is None:
+            store = self.store(group)
+            password_hash, secrets = store.load()
+            if group == DEFAULT_GROUP:
+                self.password_hash = password_hash
+            self._secrets[group] = secrets
+            if self.compact_on_open and store.pending >= COMPACT_EVERY:
+                store.compact()  # Fold leftover journal records in the background
+        return secrets
+
+    def is_open(self, group):
+        return group in self._secrets
+
+    # Function to record a change in a group; a password change goes to the default group
+    # Returns the names of the group's secrets other processes changed (None if the group was reloaded)
+    # ops can also be a function of the group's merged secrets, run under its vault lock (see VaultStore.commit)
+    def commit(self, group, ops):
+        if callable(ops):
+            password_hash, self._secrets[group], changed = self.store(group).commit(
+                ops, self.password_hash, self.open(group))
+            if group == DEFAULT_GROUP:
+                self.password_hash = password_hash
+            return changed
+        changed = set()
+        password_ops = [op for op in ops if op[0] == "password"]
+        if password_ops:
+            secrets = self.open(DEFAULT_GROUP)
+            self.password_hash, self._secrets[DEFAULT_GROUP], changed = self.main.commit(
+                password_ops, self.password_hash, secrets)
+            if group != DEFAULT_GROUP:
+                changed = set()
+        ops = [op for op in ops if op[0] != "password"]
+        if ops:
+            secrets = self.open(group)
+            password_hash, self._secrets[group], group_changed = self.store(group).commit(
+                ops, self.password_hash, secrets)
+            if group == DEFAULT_GROUP:
+                self.password_hash = password_hash
+            changed = None if changed is None or group_changed is None else changed | group_changed
+        return changed
+
+    # Function to merge the changes other processes made to a group, returns the changed names like commit()
+    def refresh(self, group):
+        secrets = self.open(group)
+        password_hash, self._secrets[group], changed = self.store(group).refresh(self.password_hash, secrets)
+        if group == DEFAULT_GROUP:
+            self.password_hash = password_hash
+        return changed
+
+    # Function to create an empty group
+    def create(self, group):
+        group = group.strip()
+        if not group or not group.isprintable() or len(group) > MAX_NAME:
+            raise GroupError(f"a group name is 1 to {MAX_NAME} printable characters")
+        if group == DEFAULT_GROUP:
+            raise GroupError(f"'{DEFAULT_GROUP}' is the main vault")
+        os.makedirs(self.dir, exist_ok=True)
+        with self.main.locked(exclusive=True):  # The main vault lock also guards the manifest
+            manifest = dict(self._read_manifest())
+            if group in manifest:
+                raise GroupError(f"group '{group}' already exists")
+            manifest[group] = group_slug(group) + os.path.splitext(self.main.path)[1]  # Same format as the main vault
+            ShardStore(os.path.join(self.dir, manifest[group]), journal=self.main.journal).save(None, {})
+            self._write_manifest(manifest)
+        return group
+
+    # Function to delete an empty group and its shard files
+    def delete(self, group):
+        if group == DEFAULT_GROUP:
+            raise GroupError("the default group cannot be deleted")
+        store = self.store(group)
+        store.wait()  # A compaction of ours would write the shard again
+        # Same lock order as create(): main vault, then the shard
+        with self.main.locked(exclusive=True), store.locked(exclusive=True):
+            if len(store._read_state()[1]):
+                raise GroupError(f"group '{group}' is not empty")
+            manifest = dict(self._read_manifest())
+            manifest.pop(group, None)
+            self._write_manifest(manifest)
+            for path in (store.path, store.journal_path, store.rotated_path):
+                store._remove(path)
+        store._remove(store.lock_path)
+        self._stores.pop(group, None)
+        self._secrets.pop(group, None)
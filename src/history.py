@@ -0,0 +1,244 @@
+"""Versions of a vault file: every change is kept and can be listed, compared and restored.
+
+The history of vault.json is kept in vault.json.history/, in three append-only files:
+
+    log     one JSON line per version: {"version": 7, "time": ..., "kind": "delta",
+            "entries": 120, "set": 1, "deleted": 0, "offset": ..., "length": ..., ...}
+    data    one zlib compressed JSON record per version, at log offset/length
+    chunks  index of the stored values: 16 byte SHA-256 prefix and 4 byte version each
+
+Values (the encrypted tokens) are content addressed chunks: a value is stored once,
+in the record of the first version that has it, and referred to by its hash from then
+on. A "delta" version holds the names it set or deleted; a "full" version holds the
+hash of every entry and is written for the first version, for full rewrites of the
+vault, and once the names changed since the last full version reach the size of the
+vault. A version so costs as much as its change, full versions included (they are
+paid for by the deltas before them), and reading any version replays at most about
+one vault worth of deltas on top of a full version.
+
+Records are written under the vault lock, the log line last: a crash leaves at most a
+torn tail, which readers ignore and the next version cuts off. The password record is
+not kept, restoring a version does not bring back an old password.
+"""
+import hashlib
+import json
+import os
+import struct
+import time
+import zlib
+
+CHUNK = struct.Struct('>16sI')  # Value hash prefix, version whose record holds the value
+MIN_FULL = 64  # Changed names before a full version is written, for small vaults
+
+
+class HistoryError(Exception):
+    pass
+
+
+# Function to write data at an offset, cutting off whatever follows (a torn tail left by a crash)
+def _write_at(path, offset, data):
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        os.ftruncate(fd, offset)
+        os.pwrite(fd, data, offset)
+    finally:
+        os.close(fd)
+
+
+class History:
+    """History of one vault file; records are added by VaultStore, with the vault lock held."""
+
+    def __init__(self, vault_path):
+        self.dir = vault_path + '.history'
+        self.log_path = os.path.join(self.dir, 'log')
+        self.data_path = os.path.join(self.dir, 'data')
+        self.chunks_path = os.path.join(self.dir, 'chunks')
+        self._log = []  # Versions read so far
+        self._log_end = 0  # Bytes of the log read so far
+        self._chunks = {}  # Value hash -> version whose record holds the value
+        self._chunks_end = 0
+        self._newest = (0, None)  # (version, its entries) once known, kept up to date by our own versions
+
+    # Function to read the versions other processes added since the last call
+    def _catch_up(self):
+        try:
+            with open(self.log_path, 'rb') as f:
+                f.seek(self._log_end)
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break  # Torn line, the version was never completed
+                    self._log.append(json.loads(line))
+                    self._log_end += len(line)
+        except FileNotFoundError:
+            pass
+
+    # Function to read the chunk index entries of the versions read so far; only needed to store or read values
+    def _catch_up_chunks(self):
+        end = self._log[-1]["chunks_end"] if self._log else 0
+        if end > self._chunks_end:
+            with open(self.chunks_path, 'rb') as f:
+                f.seek(self._chunks_end)
+                data = f.read(end - self._chunks_end)
+            self._chunks.update(CHUNK.iter_unpack(data))  # (digest, version) pairs
+            self._chunks_end = end
+
+    # Function to list the versions, oldest first
+    def versions(self):
+        self._catch_up()
+        return list(self._log)
+
+    # Function to get the newest version number, 0 if there is none
+    def latest(self):
+        self._catch_up()
+        return self._log[-1]["version"] if self._log else 0
+
+    # Function to record the ops of a commit; `secrets` is the vault state they lead to
+    def record(self, ops, secrets):
+        ops = [op for op in ops if op[0] in ("set", "del")]  # The password record is not kept
+        if not ops:
+            return
+        self._catch_up()
+        names = {op[1] for op in ops}
+        if not self._log or self._log[-1]["since_full"] + len(names) >= max(len(secrets), MIN_FULL):
+            self.record_full(secrets)
+            return
+        changes, deleted = {}, []
+        for op in ops:
+            if op[0] == "set":
+                changes[op[1]] = op[2]
+            else:
+                changes.pop(op[1], None)
+                deleted.append(op[1])
+        record = {"set": {}, "del": [name for name in deleted if name not in changes]}
+        chunks = self._add_chunks(record["set"], changes.items())
+        newest_version, newest = self._newest
+        self._append(record, chunks, {"kind": "delta", "entries": len(secrets), "set": len(record["set"]),
+                                      "deleted": len(record["del"]),
+                                      "since_full": self._log[-1]["since_full"] + len(names)})
+        if newest is not None and newest_version == self._log[-2]["version"]:
+            newest.update(record["set"])
+            for name in record["del"]:
+                newest.pop(name, None)
+            self._newest = (self._log[-1]["version"], newest)
+
+    # Function to record the whole vault state as a full version (values already stored are not stored again)
+    # Nothing is recorded if the state is the same as the newest version
+    def record_full(self, secrets):
+        self._catch_up()
+        record = {"entries": {}}
+        chunks = self._add_chunks(record["entries"], secrets.items())
+        previous = self.entries(self._log[-1]["version"]) if self._log else {}
+        set_count = sum(1 for name, ref in record["entries"].items() if previous.get(name) != ref)
+        deleted = sum(1 for name in previous if name not in record["entries"])
+        if self._log and not set_count and not deleted:
+            self._newest = (self._log[-1]["version"], record["entries"])
+            return
+        self._append(record, chunks, {"kind": "full", "entries": len(record["entries"]), "set": set_count,
+                                      "deleted": deleted, "since_full": 0})
+        self._newest = (self._log[-1]["version"], record["entries"])
+
+    # Function to fill name -> hash into `refs` and return the values not stored yet, as hash -> value
+    def _add_chunks(self, refs, items):
+        self._catch_up_chunks()
+        chunks = {}
+        known = self._chunks
+        sha256 = hashlib.sha256  # Local names: full versions run this for every secret
+        for name, value in items:
+            digest = sha256(value.encode('utf-8')).digest()[:16]  # Content address of the value
+            refs[name] = digest.hex()
+            if digest not in known:
+                chunks[digest] = value
+        return chunks
+
+    # Function to write a version (the history read up to its end): record, chunk index, then the log line
+    def _append(self, record, chunks, entry):
+        os.makedirs(self.dir, exist_ok=True)
+        last = self._log[-1] if self._log else {"version": 0, "offset": 0, "length": 0, "chunks_end": 0}
+        version = last["version"] + 1
+        record["chunks"] = {digest.hex(): value for digest, value in chunks.items()}
+        data = zlib.compress(json.dumps(record).encode('utf-8'))
+        offset = last["offset"] + last["length"]
+        index = b''.join(CHUNK.pack(digest, version) for digest in chunks)
+        entry.update(version=version, time=time.time(), offset=offset, length=len(data),
+                     chunks_end=last["chunks_end"] + len(index))
+        line = (json.dumps(entry) + '\n').encode('utf-8')
+        _write_at(self.data_path, offset, data)
+        if index:  # Readers stop at chunks_end, bytes after it are cut off by the next write
+            _write_at(self.chunks_path, last["chunks_end"], index)
+        _write_at(self.log_path, self._log_end, line)  # Last: this makes the version visible
+        self._log.append(entry)
+        self._log_end += len(line)
+        for digest in chunks:
+            self._chunks[digest] = version
+        self._chunks_end = entry["chunks_end"]
+
+    def _read_record(self, entry):
+        with open(self.data_path, 'rb') as f:
+            return json.loads(zlib.decompress(os.pread(f.fileno(), entry["length"], entry["offset"])))
+
+    # Function to get the entries of a version as name -> value hash (hex)
+    def entries(self, version):
+        log = self.versions()
+        if not 1 <= version <= len(log):
+            raise HistoryError(f"no version {version}, the history has {len(log)}")
+        if version == self._newest[0]:
+            return dict(self._newest[1])
+        start = version - 1
+        while log[start]["kind"] != "full":
+            start -= 1
+        entries = {}
+        for entry in log[start:version]:
+            record = self._read_record(entry)
+            if entry["kind"] == "full":
+                entries = record["entries"]
+            else:
+                entries.update(record["set"])
+                for name in record["del"]:
+                    entries.pop(name, None)
+        return entries
+
+    # Function to get the secrets of a version (name -> stored value), as they were saved
+    def secrets(self, version):
+        entries = self.entries(version)
+        self._catch_up_chunks()
+        records = {}  # Version -> record, each read once
+        secrets = {}
+        for name, ref in entries.items():
+            holder = self._chunks[bytes.fromhex(ref)]
+            if holder not in records:
+                records[holder] = self._read_record(self._log[holder - 1])
+            secrets[name] = records[holder]["chunks"][ref]
+        return secrets
+
+    # Function to get the names set or deleted by the versions after `since`, as name -> time of the newest change
+    # Deltas name their changes; a full version is compared with the state before it
+    def changed_since(self, since):
+        log = self.versions()
+        changed = {}
+        entries = None  # State of the version read last, only kept once a full version is met
+        for entry in log[since:]:
+            record = self._read_record(entry)
+            if entry["kind"] == "full":
+                if entries is None:
+                    entries = self.entries(entry["version"] - 1) if entry["version"] > 1 else {}
+                names = [name for name, ref in record["entries"].items() if entries.get(name) != ref]
+                names += [name for name in entries if name not in record["entries"]]
+                entries = record["entries"]
+            else:
+                names = list(record["set"]) + record["del"]
+                if entries is not None:
+                    entries.update(record["set"])
+                    for name in record["del"]:
+                        entries.pop(name, None)
+            for name in names:
+                changed[name] = entry["time"]
+        return changed
+
+    # Function to compare two versions, returns (added, deleted, changed) name lists
+    def diff(self, old, new):
+        old_entries, new_entries = self.entries(old), self.entries(new)
+        added = sorted(name for name in new_entries if name not in old_entries)
+        deleted = sorted(name for name in old_entries if name not in new_entries)
+        changed = sorted(name for name in new_entries
+                         if name in old_entries and new_entries[name] != old_entries[name])
+        return added, deleted, changed
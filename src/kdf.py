@@ -0,0 +1,121 @@
+import hashlib
+import hmac
+import os
+import time
+
+from entry_crypto import KEY_BYTES, PREFIX, DecryptionError, open_sealed, seal, subkey
+from tracing import traced
+
+# KDF used for new passwords ("pbkdf2_sha256" or "scrypt") and the unlock time it is calibrated for
+DEFAULT_KDF = os.environ.get("AUTHTERM_KDF", "pbkdf2_sha256")
+UNLOCK_TIME = float(os.environ.get("AUTHTERM_UNLOCK_TIME", "0.5"))  # Seconds
+
+SALT_BYTES = 16
+MIN_PBKDF2_ITERATIONS = 100000
+MIN_SCRYPT_N = 2 ** 14
+MAX_SCRYPT_N = 2 ** 17
+SCRYPT_R = 8
+SCRYPT_P = 1
+
+
+# Function to run the KDF of a password record, returns the derived key as hex
+def derive(password, record):
+    password = password.encode('utf-8')
+    salt = bytes.fromhex(record["salt"])
+    if record["kdf"] == "pbkdf2_sha256":
+        key = hashlib.pbkdf2_hmac('sha256', password, salt, record["iterations"])
+    elif record["kdf"] == "scrypt":
+        n, r, p = record["n"], record["r"], record["p"]
+        key = hashlib.scrypt(password, salt=salt, n=n, r=r, p=p, maxmem=256 * n * r, dklen=32)
+    else:
+        raise ValueError(f"Unknown KDF: {record['kdf']}")
+    return key.hex()
+
+
+# Function to time one run of a KDF with the given cost
+def _time_kdf(kdf_name, cost):
+    record = {"kdf": kdf_name, "salt": "00" * SALT_BYTES}
+    if kdf_name == "scrypt":
+        record.update(n=cost, r=SCRYPT_R, p=SCRYPT_P)
+    else:
+        record["iterations"] = cost
+    start = time.perf_counter()
+    derive("calibration", record)
+    return time.perf_counter() - start
+
+
+# Function to pick KDF cost parameters that take about target_seconds on this machine
+def calibrate(kdf_name=DEFAULT_KDF, target_seconds=UNLOCK_TIME):
+    if kdf_name == "scrypt":
+        probe = 2 ** 12
+        elapsed = _time_kdf(kdf_name, probe)
+        n = MIN_SCRYPT_N
+        # Cost must stay a power of two, memory use is 128 * r * n bytes
+        while elapsed * n * 2 / probe <= target_seconds and n < MAX_SCRYPT_N:
+            n *= 2
+        return {"kdf": kdf_name, "n": n, "r": SCRYPT_R, "p": SCRYPT_P, "seconds": round(elapsed * n / probe, 3)}
+    if kdf_name != "pbkdf2_sha256":
+        raise ValueError(f"Unknown KDF: {kdf_name}")
+    probe = 20000
+    elapsed = max(_time_kdf(kdf_name, probe), 1e-6)
+    iterations = max(int(probe * target_seconds / elapsed), MIN_PBKDF2_ITERATIONS)
+    return {"kdf": kdf_name, "iterations": iterations, "seconds": round(elapsed * iterations / probe, 3)}
+
+
+# Function to create a random vault data key (encrypts the secret values)
+def new_data_key():
+    return os.urandom(KEY_BYTES)
+
+
+# Function to hash a password into a record with a fresh salt (stored in the vault header)
+# The record holds a verifier and the vault data key wrapped with a key derived from the password; a key wrapped
+# in the current format also marks the vault as upgraded to values bound to their names (see names_bound)
+@traced("kdf.hash_password", "vault")
+def hash_password(password, data_key, params=None):
+    record = dict(params or calibrate())
+    record["salt"] = os.urandom(SALT_BYTES).hex()
+    master = bytes.fromhex(derive(password, record))
+    record["verifier"] = subkey(master, b"verify").hex()
+    record["wrapped_key"] = seal(subkey(master, b"wrap"), data_key)
+    return record
+
+
+# Function to check a password and unwrap the data key, returns (ok, data_key)
+# data_key is None for records made before entries were encrypted (unsalted SHA-256 or plain KDF hash)
+@traced("kdf.unlock", "vault")
+def unlock(password, record):
+    if isinstance(record, str):
+        return hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), record), None
+    master_hex = derive(password, record)
+    if "verifier" not in record:
+        return hmac.compare_digest(master_hex, record["hash"]), None
+    master = bytes.fromhex(master_hex)
+    if not hmac.compare_digest(subkey(master, b"verify").hex(), record["verifier"]):
+        return False, None
+    try:
+        return True, open_sealed(subkey(master, b"wrap"), record["wrapped_key"], legacy=True)
+    except DecryptionError:
+        return False, None
+
+
+# Function to check a password against a record
+def verify(password, record):
+    return unlock(password, record)[0]
+
+
+# Function to check whether a record should be re-hashed with the current KDF and a data key
+def needs_upgrade(record):
+    return not isinstance(record, dict) or "wrapped_key" not in record
+
+
+# Function to check whether the values of a vault are all bound to their names, i.e. "enc1:" values must be refused
+# Only a key wrapped in the current format says so: it cannot be made without the password
+def names_bound(record):
+    return isinstance(record, dict) and record.get("wrapped_key", "").startswith(PREFIX)
+
+
+# Function to get how long verifying a record is expected to take, for progress display
+def expected_seconds(record):
+    if isinstance(record, dict):
+        return record.get("seconds") or UNLOCK_TIME
+    return 0.0
@@ -0,0 +1,92 @@
+import curses
+import functools
+import os
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SPLASH_PATH = os.path.join(BASE_DIR, 'assets', 'splash.txt')
+
+
+# Function to load splash art from a text file, read from disk only once
+@functools.lru_cache(maxsize=1)
+def splash_art():
+    if os.path.exists(SPLASH_PATH):
+        with open(SPLASH_PATH, 'r', encoding='utf-8') as f:
+            art_lines = f.read().strip().splitlines()
+            return tuple(art_lines) if art_lines else ("(Splash art is empty)",)
+    return ("(Splash art not found)",)
+
+
+class Layout:
+    """Positions of the text of one screen for one terminal size, clipped to fit the window.
+
+    Static lines are drawn once; rows are the selectable lines (menu entries), which
+    can be redrawn one by one when the selection moves.
+    """
+
+    def __init__(self, h, w):
+        self.h = h
+        self.w = w
+        self.lines = []  # (y, x, text) drawn once
+        self.rows = []   # (y, x, text) of the selectable rows, text is "" when off screen
+
+    # Function to clip a line to the window; the last column is left free, curses cannot write the bottom-right cell
+    def _clip(self, y, x, text):
+        x = max(x, 0)
+        if not 0 <= y < self.h or x >= self.w - 1:
+            return y, x, ""
+        return y, x, text[:self.w - 1 - x]
+
+    # Function to add a line centered on the row, x is computed from `width` (defaults to the text length)
+    def center(self, y, text, width=None):
+        self.lines.append(self._clip(y, (self.w - (len(text) if width is None else width)) // 2, text))
+
+    def center_row(self, y, text):
+        self.rows.append(self._clip(y, (self.w - len(text)) // 2, text))
+
+    # Function to draw the whole screen, with one row selected
+    def draw(self, window, selected=None):
+        window.clear()
+        for y, x, text in self.lines:
+            if text:
+                window.addstr(y, x, text)
+        for index in range(len(self.rows)):
+            self.draw_row(window, index, index == selected)
+
+    def draw_row(self, window, index, selected):
+        y, x, text = self.rows[index]
+        if text:
+            window.addstr(y, x, text, curses.A_REVERSE if selected else curses.A_NORMAL)
+
+    # Function to move the selection, redrawing only the two rows that change
+    def select(self, window, old, new):
+        self.draw_row(window, old, False)
+        self.draw_row(window, new, True)
+
+
+# Function to place the splash art, 4 rows above the middle, and return the row below it
+def _place_art(layout, art):
+    art_start_y = max((layout.h - len(art)) // 2 - 4, 0)
+    for i, line in enumerate(art):
+        layout.center(art_start_y + i, line.strip(), width=len(line))  # Centered as in the file
+    return art_start_y + len(art)
+
+
+# Function to get the splash screen layout for a terminal size (cached per size)
+@functools.lru_cache(maxsize=8)
+def splash_layout(h, w, footer):
+    layout = Layout(h, w)
+    y = _place_art(layout, splash_art())
+    for i, text in enumerate(footer):
+        layout.center(y + 2 + 2 * i, text)
+    return layout
+
+
+# Function to get the main menu layout for a terminal size (cached per size)
+@functools.lru_cache(maxsize=8)
+def menu_layout(h, w, title, items):
+    layout = Layout(h, w)
+    y = _place_art(layout, splash_art())
+    layout.center(y + 2, title)
+    for i, item in enumerate(items):
+        layout.center_row(y + 4 + i, item)
+    return layout
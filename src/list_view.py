@@ -0,0 +1,133 @@
+import curses
+
+
+class ListView:
+    """Scrolling list that only draws the visible slice of its items.
+
+    Moving the cursor inside the visible page redraws two rows, scrolling redraws one
+    page, so the cost of a keypress does not depend on the number of items.
+    """
+
+    def __init__(self, window, items, top, left, height, width, format_item=None):
+        self.window = window
+        self.items = items
+        self.top = top
+        self.left = left
+        self.height = max(height, 1)
+        self.width = max(width, 1)
+        self.format_item = format_item or (lambda index, item: str(item))
+        self.selected = 0
+        self.offset = 0  # Index of the first visible item
+        self._drawn_offset = None
+        self._drawn_selected = None
+
+    # Function to get the selected item, None for an empty list
+    def current(self):
+        return self.items[self.selected] if self.items else None
+
+    # Function to replace the items (after a delete or a search), keeping the cursor in range
+    def set_items(self, items):
+        self.items = items
+        self.move_to(min(self.selected, len(items) - 1))
+        self.invalidate()
+
+    # Function to force a full redraw of the visible page on the next draw()
+    def invalidate(self):
+        self._drawn_offset = None
+
+    # Function to move the cursor to an index, scrolling only when it leaves the page
+    def move_to(self, index):
+        self.selected = max(min(index, len(self.items) - 1), 0)
+        if self.selected < self.offset:
+            self.offset = self.selected
+        elif self.selected >= self.offset + self.height:
+            self.offset = self.selected - self.height + 1
+
+    # Function to handle navigation keys, returns False for keys the screen should handle itself
+    def handle_key(self, key):
+        if key == curses.KEY_UP:
+            self.move_to(self.selected - 1)
+        elif key == curses.KEY_DOWN:
+            self.move_to(self.selected + 1)
+        elif key == curses.KEY_PPAGE:
+            self.move_to(self.selected - self.height)
+        elif key == curses.KEY_NPAGE:
+            self.move_to(self.selected + self.height)
+        elif key == curses.KEY_HOME:
+            self.move_to(0)
+        elif key == curses.KEY_END:
+            self.move_to(len(self.items) - 1)
+        else:
+            return False
+        return True
+
+    def _draw_row(self, index):
+        row = self.top + index - self.offset
+        text = ""
+        if index < len(self.items):
+            text = self.format_item(index, self.items[index])[:self.width]
+        attr = curses.A_REVERSE if index == self.selected and self.items else curses.A_NORMAL
+        self.window.addstr(row, self.left, text.ljust(self.width), attr)
+
+    # Function to draw the list, only the rows that changed since the last call
+    def draw(self):
+        if self._drawn_offset != self.offset:
+            for index in range(self.offset, self.offset + self.height):
+                self._draw_row(index)
+        elif self._drawn_selected != self.selected:
+            if self.offset <= self._drawn_selected < self.offset + self.height:
+                self._draw_row(self._drawn_selected)
+            self._draw_row(self.selected)
+        self._drawn_offset = self.offset
+        self._drawn_selected = self.selected
+
+    # Function to get the row just below the list, for prompts and messages
+    def bottom(self):
+        return self.top + self.height
+
+
+class SearchBox:
+    """Type-to-filter box for a ListView: '/' starts a search, Enter keeps the filter, ESC clears it."""
+
+    def __init__(self, view, index, row, all_items):
+        self.view = view
+        self.index = index
+        self.row = row
+        self.all_items = all_items  # Shown when the query is empty
+        self.query = ""
+        self.active = False
+
+    # Function to handle a key, returns False for keys the screen should handle itself
+    def handle_key(self, key):
+        if not self.active:
+            if key == ord('/'):
+                self.active = True
+                self.draw()
+                return True
+            return False
+        if key == 27:  # ESC clears the filter
+            self.active = False
+            self._set_query("")
+        elif key in (curses.KEY_ENTER, 10, 13):
+            self.active = False
+            self.draw()
+        elif key in (curses.KEY_BACKSPACE, 127, 8):
+            self._set_query(self.query[:-1])
+        elif 32 <= key < 127:
+            self._set_query(self.query + chr(key))
+        else:
+            self.view.handle_key(key)  # Arrows still move in the results while typing
+        return True
+
+    def _set_query(self, query):
+        self.query = query
+        self.view.set_items(self.index.search(query) if query else self.all_items)
+        self.draw()
+
+    # Function to draw the search row
+    def draw(self):
+        if self.active or self.query:
+            text = f"Search: {self.query}" + ("_" if self.active else f"  ({len(self.view.items)} found)")
+        else:
+            text = "[/] Search"
+        self.view.window.addstr(self.row, self.view.left, text[:self.view.width].ljust(self.view.width))
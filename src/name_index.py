@@ -0,0 +1,145 @@
+import bisect
+import heapq
+import re
+from collections import defaultdict
+
+GRAM = 3  # Names are indexed by all their 3 character substrings (trigrams)
+FUZZY_SHARE = 0.5  # Share of the query trigrams a name must contain to match despite typos
+WORD_START = re.compile(r'(?<=[^0-9a-z])[0-9a-z]')  # Start of a word inside a (lowercase) name
+
+
+# Function to get the n-grams of a (lowercase) string
+def ngrams(text, n=GRAM):
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+class NameIndex:
+    """Index over secret names for incremental type-to-filter search.
+
+    Results come in rank order: names starting with the query, names with a word
+    starting with it, names containing it, or if none do, fuzzy matches sharing most
+    of its trigrams. The first two are ranges of sorted lists found by bisection, so a
+    keystroke costs about the same whatever the size of the vault.
+    """
+
+    def __init__(self, names=()):
+        self._lower = {}                # name -> lowercase name
+        self._sorted = []               # (lowercase name, name), for prefix matches
+        self._words = []                # (lowercase name from a word start, name), for word matches
+        self._grams = defaultdict(set)  # trigram -> names containing it
+        self._last = ("", None)         # Previous (query, substring matches), narrowed on the next keystroke
+        # Bulk build: fill everything, then sort once instead of inserting in order
+        for name in names:
+            if name in self._lower:
+                continue
+            lower = name.lower()
+            self._lower[name] = lower
+            self._sorted.append((lower, name))
+            self._words.extend(self._word_keys(name, lower))
+            for gram in ngrams(lower):
+                self._grams[gram].add(name)
+        self._sorted.sort()
+        self._words.sort()
+
+    def __len__(self):
+        return len(self._lower)
+
+    def _word_keys(self, name, lower):
+        return [(lower[m.start():], name) for m in WORD_START.finditer(lower)]
+
+    # Function to add a name to the index
+    def add(self, name):
+        if name in self._lower:
+            return
+        lower = name.lower()
+        self._lower[name] = lower
+        bisect.insort(self._sorted, (lower, name))
+        for key in self._word_keys(name, lower):
+            bisect.insort(self._words, key)
+        for gram in ngrams(lower):
+            self._grams[gram].add(name)
+        self._last = ("", None)
+
+    # Function to remove a name from the index
+    def remove(self, name):
+        lower = self._lower.pop(name, None)
+        if lower is None:
+            return
+        for keys, entry in [(self._sorted, (lower, name))] + [(self._words, k) for k in self._word_keys(name, lower)]:
+            i = bisect.bisect_left(keys, entry)
+            if i < len(keys) and keys[i] == entry:
+                del keys[i]
+        for gram in ngrams(lower):
+            names = self._grams[gram]
+            names.discard(name)
+            if not names:
+                del self._grams[gram]
+        self._last = ("", None)
+
+    # Function to rename an entry
+    def rename(self, old_name, new_name):
+        self.remove(old_name)
+        self.add(new_name)
+
+    # Function to walk the entries of a sorted key list that start with the query
+    @staticmethod
+    def _prefix_range(keys, query):
+        i = bisect.bisect_left(keys, (query,))
+        while i < len(keys) and keys[i][0].startswith(query):
+            yield keys[i][1]
+            i += 1
+
+    # Function to get the names containing a query, using the trigram sets
+    def _substring_matches(self, query, limit):
+        if len(query) < GRAM:
+            # Too short for trigrams, but matches are so common that a scan fills the limit quickly
+            matches = set()
+            for name, lower in self._lower.items():
+                if query in lower:
+                    matches.add(name)
+                    if len(matches) >= limit:
+                        break
+            return matches
+        last_query, last_matches = self._last
+        if last_matches is not None and len(last_query) > GRAM and query.startswith(last_query):
+            candidates = last_matches  # One more character typed can only narrow the previous result
+        else:
+            sets = sorted((self._grams.get(gram, set()) for gram in ngrams(query)), key=len)
+            candidates = sets[0].intersection(*sets[1:])
+        matches = {name for name in candidates if query in self._lower[name]}
+        self._last = (query, matches)
+        return matches
+
+    # Function to get names sharing most trigrams with the query (typos, swapped letters)
+    def _fuzzy_matches(self, query):
+        grams = ngrams(query)
+        needed = max(int(len(grams) * FUZZY_SHARE), 1)
+        # A name with `needed` of the trigrams contains at least one of the len - needed + 1 rarest ones
+        rarest = sorted(grams, key=lambda gram: len(self._grams.get(gram, ())))[:len(grams) - needed + 1]
+        candidates = set().union(*(self._grams.get(gram, ()) for gram in rarest))
+        counts = {name: sum(gram in self._lower[name] for gram in grams) for name in candidates}
+        ranked = sorted(counts.items(), key=lambda item: (-item[1], self._lower[item[0]]))
+        return [name for name, count in ranked if count >= needed]
+
+    # Function to search names, returns up to limit names, best matches first (all names for no query)
+    def search(self, query, limit=200):
+        query = query.lower()
+        if not query:
+            return list(self._lower)
+        results = {}  # Ordered set of the names found so far
+        for found in (self._prefix_range(self._sorted, query), self._prefix_range(self._words, query)):
+            for name in found:
+                results[name] = True
+                if len(results) >= limit:
+                    return list(results)
+        rest = self._substring_matches(query, limit * 2)
+        remaining = [name for name in rest if name not in results]
+        for name in heapq.nsmallest(limit - len(results), remaining, key=self._lower.__getitem__):
+            results[name] = True
+        if not results and len(query) > GRAM:  # Nothing contains the query, probably a typo
+            for name in self._fuzzy_matches(query):
+                if name not in results:
+                    results[name] = True
+                    if len(results) >= limit:
+                        break
+        return list(results)
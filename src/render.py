@@ -0,0 +1,32 @@
+class DiffWriter:
+    """Writes text to a curses window, sending only the cells that changed since the last frame."""
+
+    def __init__(self, window, diff=True):
+        self.window = window
+        self.diff = diff
+        self._rows = {}  # (y, x) -> (text, attr) last written there
+        self.cells_written = 0
+        self.bytes_written = 0
+
+    # Function to write text at a position, skipping the cells that already show it
+    def put(self, y, x, text, attr=0):
+        old_text, old_attr = self._rows.get((y, x), (None, attr))
+        self._rows[(y, x)] = (text, attr)
+        if old_text is not None and len(text) < len(old_text):
+            text = text.ljust(len(old_text))  # Blank out what is left of the longer old text
+        start, end = 0, len(text)
+        if self.diff and old_text is not None and old_attr == attr:
+            old_text = old_text.ljust(len(text))
+            while start < end and text[start] == old_text[start]:
+                start += 1
+            while end > start and text[end - 1] == old_text[end - 1]:
+                end -= 1
+            if start == end:
+                return
+        self.window.addstr(y, x + start, text[start:end], attr)
+        self.cells_written += end - start
+        self.bytes_written += len(text[start:end].encode('utf-8'))
+
+    # Function to forget what is on screen (after a clear or a resize), the next frame is drawn in full
+    def invalidate(self):
+        self._rows.clear()
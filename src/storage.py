@@ -0,0 +1,334 @@
+import fcntl
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+import vault_binary
+from history import History
+from tracing import traced
+
+# Journal records are compacted into the snapshot once this many have been appended
+COMPACT_EVERY = 256
+
+# Every change is also kept in the vault history (see history.py); AUTHTERM_HISTORY=0 turns it off
+HISTORY_ENABLED = os.environ.get("AUTHTERM_HISTORY", "1") != "0"
+
+
+# Function to pick the vault file: $AUTHTERM_VAULT if set, else vault.bin if present, else vault.json
+def vault_path(base_dir):
+    if os.environ.get("AUTHTERM_VAULT"):
+        return os.environ["AUTHTERM_VAULT"]
+    bin_path = os.path.join(base_dir, 'vault.bin')
+    return bin_path if os.path.exists(bin_path) else os.path.join(base_dir, 'vault.json')
+
+
+# Function to write a file atomically (temp file in the same directory + rename)
+def atomic_write(path, data):
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+# Function to check whether a vault path uses the binary format (vault.bin)
+def is_binary(path):
+    return path.endswith('.bin')
+
+
+# Function to read the vault snapshot, returns the parsed JSON or None if missing
+# Binary vaults are mmapped and their secrets are decoded lazily
+def read_snapshot(path):
+    if not os.path.exists(path):
+        return None
+    if is_binary(path):
+        return vault_binary.read_vault(path)
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+# Function to write the vault snapshot atomically
+def write_snapshot(path, password_hash, secrets, generation=0):
+    if is_binary(path):
+        meta = {"password_hash": password_hash, "generation": generation}
+        atomic_write(path, vault_binary.encode_vault(meta, secrets))
+        return
+    data = json.dumps({"generation": generation, "password_hash": password_hash, "secrets": dict(secrets)})
+    atomic_write(path, data.encode('utf-8'))
+
+
+# Function to read journal records after a byte offset, a torn last line (crash during append) is ignored
+# Returns (generation, records, offset after the last complete record); generation is None if there is no
+# journal and 0 for journals written before generations
+def read_journal(path, offset=0):
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return None, [], 0
+    records = []
+    with f:
+        header = f.readline()
+        if header.startswith(b'{') and header.endswith(b'\n'):
+            generation, start = json.loads(header)["generation"], len(header)
+        else:
+            generation, start = 0, 0
+        valid_size = max(offset, start)
+        f.seek(valid_size)
+        for line in f:
+            if not line.endswith(b'\n'):
+                break  # Incomplete append, everything before it is valid
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                break
+            valid_size += len(line)
+    return generation, records, valid_size
+
+
+# Function to apply journal records to the vault state
+# Every op overwrites one key, so replaying records already in the snapshot is harmless
+def replay(records, password_hash, secrets):
+    for ops in records:
+        for op in ops:
+            if op[0] == "set":
+                secrets[op[1]] = op[2]
+            elif op[0] == "del":
+                secrets.pop(op[1], None)
+            elif op[0] == "password":
+                password_hash = op[1]
+    return password_hash, secrets
+
+
+# Function to get the names of the secrets touched by journal records
+def touched_names(records):
+    return {op[1] for ops in records for op in ops if op[0] in ("set", "del")}
+
+
+class VaultStore:
+    """vault.json (or vault.bin) snapshot plus an append-only journal of changes (vault.json.journal).
+
+    Several processes can share a vault: writes hold an exclusive flock on vault.json.lock
+    and reads a shared one. Every snapshot has a generation number and the journal starts
+    with the generation it applies to. Compaction writes generation G+1 and keeps the
+    generation G journal as vault.json.journal.old, so a process that fell behind reads
+    only the journal bytes it has not seen yet instead of the whole snapshot. Each change
+    is also kept as a version in the vault history, see history.History.
+    """
+
+    def __init__(self, path, journal=True, history=HISTORY_ENABLED):
+        self.path = path
+        self.journal = journal
+        self.history = History(path) if history else None
+        self.journal_path = path + '.journal'
+        self.rotated_path = path + '.journal.old'  # Journal of the previous generation
+        self.lock_path = path + '.lock'
+        self.pending = 0  # Records appended since the last compaction
+        self.generation = 0  # Snapshot generation the state in memory is based on
+        self._offset = 0  # Bytes of that generation's journal already in the state in memory
+        self._signature = None  # stat() of the vault files when they were last read
+        self._lock = threading.Lock()
+        self._compactor = None
+
+    # Function to hold the vault lock (shared for reads, exclusive for writes), other processes included
+    @contextmanager
+    def locked(self, exclusive=False):
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            yield
+        finally:
+            os.close(fd)  # Releases the lock
+
+    # Function to get (inode, size, mtime) of the snapshot and the journal
+    def _stat(self):
+        signature = []
+        for path in (self.path, self.journal_path):
+            try:
+                stat = os.stat(path)
+                signature.append((stat.st_ino, stat.st_size, stat.st_mtime_ns))
+            except FileNotFoundError:
+                signature.append(None)
+        return tuple(signature)
+
+    # Function to check cheaply (two stat calls) whether another process changed the vault
+    def changed(self):
+        return self._stat() != self._signature
+
+    # Function to read the whole vault from disk, returns (password_hash, secrets, generation, journal offset)
+    def _read_state(self):
+        data = read_snapshot(self.path) or {}
+        generation = data.get("generation", 0)
+        password_hash = data.get("password_hash")
+        secrets = data.get("secrets", {})
+        records = []
+        rotated_generation, rotated, _ = read_journal(self.rotated_path)
+        if rotated_generation == generation:
+            records += rotated  # Left by a compaction from before generations that did not finish
+        journal_generation, journal, offset = read_journal(self.journal_path)
+        if journal_generation == generation:
+            records += journal
+        else:
+            offset = 0  # Missing, or already folded into the snapshot by an interrupted compaction
+        self.pending = len(records)
+        password_hash, secrets = replay(records, password_hash, secrets)
+        return password_hash, secrets, generation, offset
+
+    # Function to load the vault: snapshot, then the journal replayed on top of it
+    @traced("vault.load", "vault")
+    def load(self):
+        with self._lock, self.locked():
+            password_hash, secrets, self.generation, self._offset = self._read_state()
+            self._signature = self._stat()
+        return password_hash, secrets
+
+    # Function to merge the changes other processes made since our last read (vault lock held)
+    # Returns (password_hash, secrets, names of the secrets that changed or None if all were reloaded)
+    def _catch_up(self, password_hash, secrets):
+        signature = self._stat()
+        if signature == self._signature:
+            return password_hash, secrets, set()
+        snapshot_changed = self._signature is None or signature[0] != self._signature[0]
+        journal_generation = read_journal(self.journal_path)[0] if signature[1] is not None else None
+        records = None
+        if not snapshot_changed and journal_generation in (self.generation, None):
+            # Same snapshot, only new journal records
+            _, records, self._offset = read_journal(self.journal_path, self._offset)
+            self.pending += len(records)  # Records of all processes count towards the next compaction
+        elif snapshot_changed and journal_generation in (self.generation + 1, None):
+            rotated_generation, rotated, _ = read_journal(self.rotated_path, self._offset)
+            if rotated_generation == self.generation:
+                # One compaction happened: the rest of our generation's journal, then the new journal
+                _, records, self._offset = read_journal(self.journal_path, 0)
+                self.pending = len(records)
+                records = rotated + records
+                self.generation += 1
+        if records is None:
+            # The vault was rewritten (or we missed several compactions), read it again
+            password_hash, secrets, self.generation, self._offset = self._read_state()
+            changed = None
+        else:
+            password_hash, secrets = replay(records, password_hash, secrets)
+            changed = touched_names(records)
+        self._signature = self._stat()
+        return password_hash, secrets, changed
+
+    # Function to merge the changes of other processes, if any, into the state
+    # Returns (password_hash, secrets, changed names or None if everything was reloaded)
+    @traced("vault.refresh", "vault")
+    def refresh(self, password_hash, secrets):
+        if not self.changed():
+            return password_hash, secrets, set()
+        with self._lock, self.locked():
+            return self._catch_up(password_hash, secrets)
+
+    # Function to record a change; ops are ("set", name, value), ("del", name) or ("password", hash)
+    # Changes of other processes are merged first, returns (password_hash, secrets, names they changed)
+    # ops can also be a function that gets the merged secrets and returns the ops (none: nothing is written); it
+    # runs with the vault lock held, so a read-modify-write such as using up a counter based code is atomic
+    @traced("vault.commit", "vault")
+    def commit(self, ops, password_hash, secrets):
+        with self._lock, self.locked(exclusive=True):
+            password_hash, secrets, changed = self._catch_up(password_hash, secrets)
+            if callable(ops):
+                ops = ops(secrets)
+                if not ops:
+                    return password_hash, secrets, changed
+            password_hash, secrets = replay([ops], password_hash, secrets)  # Ours are the newest changes
+            if self.journal:
+                self._append(ops)
+            else:
+                self._write(password_hash, secrets, self.generation + 1)
+            if self.history is not None:
+                self.history.record(ops, secrets)
+        if self.pending >= COMPACT_EVERY:
+            self.compact()
+        return password_hash, secrets, changed
+
+    def _append(self, ops):
+        line = json.dumps([list(op) for op in ops]) + '\n'  # One line, so the ops apply together
+        mode = 'r+b'
+        if self._offset == 0:
+            # First record of this generation, the journal starts with a header
+            if read_journal(self.journal_path)[0] not in (None, self.generation):
+                os.replace(self.journal_path, self.rotated_path)  # Already folded in by an interrupted compaction
+            line = json.dumps({"generation": self.generation}) + '\n' + line
+            mode = 'wb'
+        with open(self.journal_path, mode) as f:
+            f.seek(self._offset)
+            f.truncate()  # Drops a torn record left by a crash, everything before the offset was read
+            f.write(line.encode('utf-8'))
+            f.flush()
+            os.fsync(f.fileno())
+            self._offset = f.tell()
+        self._signature = self._stat()
+        self.pending += 1
+
+    # Function to write a new snapshot of the given state (vault lock held) and drop the journals
+    def _write(self, password_hash, secrets, generation):
+        write_snapshot(self.path, password_hash, secrets, generation)
+        self._remove(self.rotated_path)
+        self._remove(self.journal_path)
+        self.generation = generation
+        self._offset = 0
+        self._signature = self._stat()
+        self.pending = 0
+
+    # Function to rewrite the whole vault right away (first setup, bulk import)
+    # Without ops the vault becomes exactly this state; with ops, changes of other processes are merged
+    # first and the ops applied on top, like commit(). Returns (password_hash, secrets, changed names)
+    @traced("vault.save", "vault")
+    def save(self, password_hash, secrets, ops=None):
+        self.wait()
+        changed = set()
+        with self._lock, self.locked(exclusive=True):
+            if ops is not None:
+                password_hash, secrets, changed = self._catch_up(password_hash, secrets)
+                password_hash, secrets = replay([ops], password_hash, secrets)
+            # Newer than any generation another process can hold, so none mistakes it for a compaction
+            on_disk = (read_snapshot(self.path) or {}).get("generation", 0)
+            self._write(password_hash, secrets, max(on_disk, self.generation) + 1)
+            if self.history is not None:
+                if ops is None:
+                    self.history.record_full(secrets)
+                else:
+                    self.history.record(ops, secrets)
+        return password_hash, secrets, changed
+
+    # Function to fold the journal into a new snapshot, in a background thread by default
+    # The files are read again under the lock, so records of other processes are kept
+    def compact(self, background=True):
+        with self._lock:
+            if self._compactor is not None and self._compactor.is_alive():
+                return  # A compaction is already running, the next commit will retry
+            self.pending = 0
+            self._compactor = threading.Thread(target=self._compact_files, args=(self._stat()[0],))
+        if background:
+            self._compactor.start()
+        else:
+            self._compactor.run()
+
+    # Function to wait for a running background compaction
+    def wait(self):
+        compactor = self._compactor
+        if compactor is not None and compactor.is_alive():
+            compactor.join()
+
+    @traced("vault.compact", "vault")
+    def _compact_files(self, snapshot):
+        with self.locked(exclusive=True):
+            if not os.path.exists(self.journal_path) or self._stat()[0] != snapshot:
+                return  # Nothing to fold, or another process rewrote the snapshot meanwhile
+            pending = self.pending
+            password_hash, secrets, generation, _ = self._read_state()
+            self.pending = pending  # _read_state counts the records being folded in
+            write_snapshot(self.path, password_hash, secrets, generation + 1)
+            os.replace(self.journal_path, self.rotated_path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,382 @@
+"""Two-way sync of copies of a vault kept on several machines.
+
+    authterm sync OTHER         OTHER: another vault file, or a mirror directory
+
+Every entry (secret, deleted secret or password record) carries a version stamp:
+the time of its newest change and the id of the copy it was made on. Sync compares
+the entries of the two copies and keeps, for each name, the one with the newer stamp,
+on both sides. Deletes win over older edits, as deleted secrets leave a tombstone.
+
+The stamps of a vault are kept next to it, in vault.json.sync/, sorted into 4096
+leaves by the hash of the name and stored in 256 bucket files (16 leaves each):
+
+    tree.json        {"replica": ..., "history": 42, "live": 120, "leaves": [4096 sums]}
+    buckets/a7.json  {"github": ["<value hash>", 1700000000.5, "<replica>"], ...}
+
+A leaf is the sum of the hashes of its entries, updated as entries change, and the
+leaves are the bottom of a hash tree (fan-out 16). Copies in sync have the same root;
+otherwise the tree is walked down to the leaves that differ and only their entries
+are compared. The changes made to a vault since its last sync are found in the vault
+history (see history.py), so a sync reads the bucket files of the changed names and
+of the leaves that differ, not the whole state, and a change is stamped with the time
+it was made. Without history the vault is compared entry by entry and a change is
+stamped with the time of the sync that finds it.
+
+A mirror directory has the same layout with the (encrypted) values in its bucket
+files. It can be copied between machines (rsync, a USB stick, a shared folder): a
+sync rewrites only the bucket files that changed. Values are synced as stored, so
+the copies have to share their vault key, that is be copies of one vault.
+"""
+import fcntl
+import hashlib
+import json
+import os
+import time
+from contextlib import contextmanager
+
+from storage import atomic_write
+
+LEAVES = 4096  # Leaves of the hash tree (names are spread over them by hash)
+FANOUT = 16  # Children per node of the tree
+LEAVES_PER_FILE = 16  # Leaves per bucket file, 256 files
+PASSWORD_ENTRY = "\x00password"  # Entry of the password record, in the default group only
+UNKNOWN = (0, "")  # Stamp of entries that were there before their copy was first synced
+
+
+class SyncError(Exception):
+    pass
+
+
+# Function to hash a stored value (an encrypted token, or the password record as JSON)
+def value_hash(value):
+    return hashlib.sha256(value.encode('utf-8')).hexdigest()[:32]
+
+
+# Function to get the leaf of a name
+def leaf_of(name):
+    return int.from_bytes(hashlib.sha256(name.encode('utf-8')).digest()[:2], 'big') >> 4
+
+
+# Function to hash an entry (name, value hash, stamp) into a number that is added to its leaf
+def entry_digest(name, entry):
+    data = f"{name}\x00{entry[0] or ''}\x00{entry[1]!r}\x00{entry[2]}".encode('utf-8')
+    return int.from_bytes(hashlib.sha256(data).digest()[:16], 'big')
+
+
+# Function to compare stamps: is entry `a` newer than entry `b`
+def newer(a, b):
+    return (a[1], a[2]) > (b[1], b[2])
+
+
+# Function to build the hash tree over the leaves, returns its levels from the leaves up to the root
+def tree_levels(leaves):
+    level = [leaf.to_bytes(16, 'big') for leaf in leaves]
+    levels = [level]
+    while len(level) > 1:
+        level = [hashlib.sha256(b''.join(level[i:i + FANOUT])).digest()[:16] for i in range(0, len(level), FANOUT)]
+        levels.append(level)
+    return levels
+
+
+# Function to find the leaves that differ between two trees, walking down only the nodes that differ
+def diff_leaves(a_leaves, b_leaves):
+    a_levels, b_levels = tree_levels(a_leaves), tree_levels(b_leaves)
+    nodes = [0]  # Differing nodes of the level being walked, starting at the root
+    for depth in range(len(a_levels) - 1, -1, -1):
+        nodes = [node for node in nodes if a_levels[depth][node] != b_levels[depth][node]]
+        if depth:
+            nodes = [node * FANOUT + child for node in nodes for child in range(FANOUT)]
+    return nodes
+
+
+class TreeDir:
+    """Entries with their stamps in bucket files under a directory, and the leaf sums of the hash tree.
+
+    Bucket files are read when first needed. save() writes the changed ones, then tree.json.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.tree_path = os.path.join(path, 'tree.json')
+        try:
+            with open(self.tree_path, 'r', encoding='utf-8') as f:
+                self.meta = json.load(f)
+            self.exists = True
+        except FileNotFoundError:
+            self.meta = {"replica": os.urandom(8).hex(), "history": None, "live": 0, "leaves": None}
+            self.exists = False
+        self.leaves = [int(leaf, 16) for leaf in self.meta.pop("leaves") or ["0"] * LEAVES]
+        self._meta_read = dict(self.meta)
+        self._files = {}  # File number -> {name: entry}, the files read so far
+        self._split = {}  # File number -> {leaf: {name: entry}}, made when leaves of the file are compared
+        self._dirty = set()
+
+    @property
+    def replica(self):
+        return self.meta["replica"]
+
+    # Function to hold the lock of the directory, so two syncs of one copy do not mix their writes
+    # Without create, a missing directory is left missing (nothing is written to it then)
+    @contextmanager
+    def locked(self, create=True):
+        if not create and not os.path.isdir(self.path):
+            yield
+            return
+        os.makedirs(self.path, exist_ok=True)
+        fd = os.open(os.path.join(self.path, 'lock'), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    def _file_path(self, number):
+        return os.path.join(self.path, 'buckets', f"{number:02x}.json")
+
+    # Function to get the entries of a bucket file, read the first time
+    def _file(self, number):
+        if number not in self._files:
+            try:
+                with open(self._file_path(number), 'r', encoding='utf-8') as f:
+                    self._files[number] = json.load(f)
+            except FileNotFoundError:
+                self._files[number] = {}
+        return self._files[number]
+
+    # Function to get the entry of a name: [value hash or None if deleted, time, replica(, value)], None if unknown
+    def get(self, name):
+        return self._file(leaf_of(name) // LEAVES_PER_FILE).get(name)
+
+    # Function to set the entry of a name, updating the sum of its leaf
+    def put(self, name, entry):
+        leaf = leaf_of(name)
+        number = leaf // LEAVES_PER_FILE
+        entries = self._file(number)
+        old = entries.get(name)
+        total = self.leaves[leaf]
+        if old is not None:
+            total -= entry_digest(name, old)
+            self.meta["live"] -= old[0] is not None
+        self.leaves[leaf] = (total + entry_digest(name, entry)) % (1 << 128)
+        self.meta["live"] += entry[0] is not None
+        entries[name] = entry
+        if number in self._split:
+            self._split[number].setdefault(leaf, {})[name] = entry
+        self._dirty.add(number)
+
+    # Function to get the entries of one leaf
+    def leaf_entries(self, leaf):
+        number = leaf // LEAVES_PER_FILE
+        if number not in self._split:
+            split = self._split[number] = {}
+            for name, entry in self._file(number).items():
+                split.setdefault(leaf_of(name), {})[name] = entry
+        return dict(self._split[number].get(leaf, {}))
+
+    # Function to get every entry (reads all bucket files)
+    def all_entries(self):
+        entries = {}
+        for number in range(LEAVES // LEAVES_PER_FILE):
+            entries.update(self._file(number))
+        return entries
+
+    # Function to write the changed bucket files, then the tree
+    def save(self):
+        if not self._dirty and self.exists and self.meta == self._meta_read:
+            return
+        os.makedirs(os.path.join(self.path, 'buckets'), exist_ok=True)
+        for number in sorted(self._dirty):
+            atomic_write(self._file_path(number), json.dumps(self._files[number], sort_keys=True).encode('utf-8'))
+        meta = dict(self.meta, leaves=[f"{leaf:032x}" for leaf in self.leaves])
+        atomic_write(self.tree_path, json.dumps(meta).encode('utf-8'))
+        self._dirty = set()
+        self._meta_read = dict(self.meta)
+        self.exists = True
+
+
+class VaultReplica:
+    """A vault file (one group of it) with the stamps of its entries in <vault>.sync/."""
+
+    def __init__(self, store, password_hash, secrets, with_password=True):
+        self.store = store
+        self.password_hash = password_hash
+        self.secrets = secrets
+        self.with_password = with_password  # Only the main vault holds the password record
+        self.tree = TreeDir(store.path + '.sync')
+
+    # Function to get the stored value of an entry, None if there is none
+    def value(self, name):
+        if name == PASSWORD_ENTRY:
+            return None if self.password_hash is None else json.dumps(self.password_hash, sort_keys=True)
+        return self.secrets.get(name)
+
+    # Function to get one encrypted value of the copy as (name, value), None if it has none
+    def sample(self):
+        from entry_crypto import is_encrypted
+        return next(((name, value) for name, value in self.secrets.items() if is_encrypted(value)), None)
+
+    # Function to give a new stamp to the entries that changed since the last scan
+    # The vault is read again first, with the newest history version it contains; nothing is read if the
+    # vault files are the same as after the last sync
+    def scan(self):
+        history = self.store.history
+        with self.store.locked():
+            self.password_hash, self.secrets, _ = self.store.refresh(self.password_hash, self.secrets)
+            latest = history.latest() if history is not None else None
+            signature = json.loads(json.dumps(self.store._stat()))  # As stored in tree.json
+        if signature == self.tree.meta.get("vault"):
+            return
+        since = self.tree.meta["history"]
+        names = None
+        if latest is not None and since is not None and since <= latest:
+            names = history.changed_since(since)  # name -> time of the change
+        self._stamp(names)
+        live = len(self.secrets) + (self.with_password and self.password_hash is not None)
+        if names is not None and self.tree.meta["live"] != live:
+            self._stamp(None)  # Changes were made without history meanwhile, compare everything
+        self.tree.meta["history"] = latest
+        self.tree.meta["vault"] = signature
+
+    # Function to stamp the names whose value differs from their entry (all names if `names` is None)
+    def _stamp(self, names):
+        now = time.time()
+        first = False
+        get = self.tree.get
+        if names is None:
+            first = not self.tree.exists  # Entries already there when the vault is first synced
+            known = self.tree.all_entries()
+            get = known.get
+            names = dict.fromkeys(set(self.secrets) | set(known), UNKNOWN[0] if first else now)
+        names.setdefault(PASSWORD_ENTRY, now)  # The password is not in the history, it is always compared
+        for name, changed in names.items():
+            if name == PASSWORD_ENTRY and not self.with_password:
+                continue
+            value = self.value(name)
+            digest = None if value is None else value_hash(value)
+            entry = get(name)
+            if entry is None and digest is None:
+                continue
+            if entry is None or entry[0] != digest:
+                self.tree.put(name, [digest, changed, UNKNOWN[1] if first else self.tree.replica])
+
+    # Function to take entries of the other copy: one commit for all of them, then their stamps
+    def apply(self, incoming):
+        ops = []
+        for name, entry in incoming.items():
+            current = self.value(name)
+            if entry[0] == (None if current is None else value_hash(current)):
+                continue  # Same value, only the stamp is newer
+            if name == PASSWORD_ENTRY:
+                if entry[0] is not None:
+                    ops.append(("password", json.loads(entry[3])))
+            elif entry[0] is None:
+                ops.append(("del", name))
+            else:
+                ops.append(("set", name, entry[3]))
+        if ops:
+            self.password_hash, self.secrets, changed = self.store.commit(ops, self.password_hash, self.secrets)
+            # The vault as written by us is in sync; changes other processes made meanwhile are not stamped yet
+            self.tree.meta["vault"] = json.loads(json.dumps(self.store._stat())) if changed == set() else None
+        for name, entry in incoming.items():
+            self.tree.put(name, entry[:3])
+
+
+class MirrorReplica:
+    """A mirror directory: the entries with their stamps and values, nothing else."""
+
+    def __init__(self, path):
+        self.tree = TreeDir(path)
+
+    def value(self, name):
+        entry = self.tree.get(name)
+        return None if entry is None or entry[0] is None else entry[3]
+
+    def sample(self):
+        for number in range(LEAVES // LEAVES_PER_FILE):
+            for name, entry in self.tree._file(number).items():
+                if entry[0] is not None and name != PASSWORD_ENTRY:
+                    return name, entry[3]
+        return None
+
+    def scan(self):
+        pass  # Only sync writes to a mirror, its entries are always up to date
+
+    def apply(self, incoming):
+        for name, entry in incoming.items():
+            self.tree.put(name, entry if entry[0] is not None else entry[:3])
+
+
+# Function to make sure two copies hold values encrypted with one vault key, so values can be copied as stored
+# Equal password records wrap the same key. Otherwise each record is opened with the password (ask_password(prompt),
+# asked once more if the copies have different passwords) and the keys they wrap have to be the same; a copy
+# without a record (a mirror of a group) has to hold values that decrypt with the key of the other
+def check_same_key(local, other, ask_password):
+    from entry_crypto import EntryCipher, DecryptionError
+    records = [record for record in (local.value(PASSWORD_ENTRY), other.value(PASSWORD_ENTRY)) if record is not None]
+    if len(records) == 2 and records[0] == records[1]:
+        return
+    samples = [sample for sample in (local.sample(), other.sample()) if sample is not None]
+    if not records:
+        if samples:
+            raise SyncError("neither copy has a password record to check their vault keys with")
+        return
+    passwords = []
+    keys = {_data_key(json.loads(record), passwords, ask_password) for record in records}
+    if len(keys) > 1:
+        raise SyncError("the copies are not of the same vault, their values are encrypted with different keys")
+    cipher = EntryCipher(keys.pop(), legacy=True)  # Only the key is checked here
+    for name, sample in samples:
+        try:
+            cipher.decrypt(name, sample)
+        except DecryptionError:
+            raise SyncError("the copies are not of the same vault, their values are encrypted with different keys")
+
+
+# Function to open a password record with one of the passwords given so far, or one more asked for
+def _data_key(record, passwords, ask_password):
+    import kdf
+    for attempt in range(2):
+        if attempt == len(passwords):
+            passwords.append(ask_password("Vault password: " if not passwords else
+                                          "The copies have different passwords, password of the other copy: "))
+        for password in passwords:
+            verified, data_key = kdf.unlock(password, record)
+            if verified:
+                if data_key is None:
+                    raise SyncError("a copy needs an upgrade, open it once with authterm")
+                return data_key
+    raise SyncError("invalid password")
+
+
+# Function to compare two copies and give each the entries of the other that are newer
+# Returns (names whose value was taken from other, names whose value was given to it); with dry_run nothing is written
+def sync(local, other, dry_run=False):
+    with local.tree.locked(not dry_run), other.tree.locked(not dry_run):
+        local.scan()
+        other.scan()
+        to_local, to_other = {}, {}
+        same = set()
+        for leaf in diff_leaves(local.tree.leaves, other.tree.leaves):
+            ours, theirs = local.tree.leaf_entries(leaf), other.tree.leaf_entries(leaf)
+            for name in ours.keys() | theirs.keys():
+                mine, their = ours.get(name), theirs.get(name)
+                if their is None or (mine is not None and mine[:3] != their[:3] and not newer(their, mine)):
+                    to_other[name] = mine[:3]  # Newer here (an equal stamp can only be UNKNOWN: ours is kept)
+                elif mine is None or (mine[:3] != their[:3] and newer(their, mine)):
+                    to_local[name] = their[:3]
+                else:
+                    continue
+                if mine is not None and their is not None and mine[0] == their[0]:
+                    same.add(name)  # Only the stamp is taken, the value is the same on both sides
+        for incoming, source in ((to_local, other), (to_other, local)):
+            for name, entry in incoming.items():
+                if entry[0] is not None:
+                    value = source.value(name)
+                    entry[0] = value_hash(value)  # Of the value sent, also if it changed since the scan
+                    entry.append(value)
+        if not dry_run:  # A dry run leaves the stamps of its scan to the next sync
+            local.apply(to_local)
+            other.apply(to_other)
+            local.tree.save()  # Also the stamps of the scan
+            other.tree.save()
+    return sorted(to_local.keys() - same), sorted(to_other.keys() - same)
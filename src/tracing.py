@@ -0,0 +1,153 @@
+"""Opt-in instrumentation of vault I/O, code generation and screen redraws.
+
+Set AUTHTERM_TRACE to a file name (or run `authterm --trace FILE ...`) to record a
+timed event for every traced call. A name ending in .ndjson or .jsonl gets one JSON
+event per line; any other name gets the Chrome trace format, which chrome://tracing
+and https://ui.perfetto.dev open directly. "{pid}" in the name is replaced by the
+process id, so the app, the CLI and the agent can trace into separate files.
+
+    AUTHTERM_TRACE=authterm.trace.json python3 src/cli.py
+    python3 src/cli.py --trace codes-{pid}.ndjson code github
+
+Categories: "vault" (load, commit, save, refresh, compaction, unlock), "code" (HMAC
+computations, dashboard refreshes) and "screen" (one event per frame, from the first
+write after a refresh to the end of the next refresh, with the cells and bytes sent).
+
+When tracing is off, traced() returns the function unchanged and window() the window
+itself, so the instrumented code runs exactly as without it.
+"""
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+
+TRACE_PATH = os.environ.get("AUTHTERM_TRACE") or None
+FLUSH_EVERY = 1000  # Events buffered before they are written out
+
+enabled = TRACE_PATH is not None
+
+
+class Tracer:
+    """Buffers trace events and appends them to the trace file."""
+
+    def __init__(self, path):
+        self.path = path.replace("{pid}", str(os.getpid()))
+        self.ndjson = self.path.endswith((".ndjson", ".jsonl"))
+        self.pid = os.getpid()
+        self._events = []
+        self._threads = set()  # Threads that got their name recorded
+        self._lock = threading.Lock()
+        self._started = False
+        self._origin = time.perf_counter()  # Timestamps are microseconds since the tracer started
+
+    # Function to get the current trace timestamp in microseconds
+    def now(self):
+        return (time.perf_counter() - self._origin) * 1e6
+
+    # Function to record one complete event (a call that started at `start` and ended now)
+    def complete(self, name, category, start, args=None):
+        event = {"name": name, "cat": category, "ph": "X", "ts": round(start, 1),
+                 "dur": round(self.now() - start, 1), "pid": self.pid, "tid": threading.get_ident()}
+        if args:
+            event["args"] = args
+        self.add(event)
+
+    # Function to buffer an event, written out every FLUSH_EVERY events and at exit
+    def add(self, event):
+        tid = threading.get_ident()
+        if tid not in self._threads:
+            self._threads.add(tid)  # Name the thread once, so the viewer shows "MainThread" etc.
+            self._events.append({"name": "thread_name", "ph": "M", "pid": self.pid, "tid": tid,
+                                 "args": {"name": threading.current_thread().name}})
+        self._events.append(event)
+        if len(self._events) >= FLUSH_EVERY:
+            self.flush()
+
+    # Function to append the buffered events to the trace file
+    # The Chrome format is a JSON array; the viewers accept it without the closing bracket, so it
+    # can be appended to while the app runs and is still readable after a crash
+    def flush(self, closing=False):
+        with self._lock:
+            events, self._events = self._events, []
+            if not events and not closing:
+                return
+            if self.ndjson:
+                data = "".join(json.dumps(event) + "\n" for event in events)
+            else:
+                data = ",\n".join(json.dumps(event) for event in events)
+                if self._started and data:
+                    data = ",\n" + data
+                elif not self._started:
+                    data = "[\n" + data
+                if closing:
+                    data += "\n]\n"
+            self._started = True
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(data)
+
+
+tracer = Tracer(TRACE_PATH) if enabled else None
+if enabled:
+    atexit.register(tracer.flush, True)
+
+
+# Decorator to record every call of a function as an event; without tracing the function is returned as is
+def traced(name, category):
+    def decorate(func):
+        if not enabled:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = tracer.now()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                tracer.complete(name, category, start)
+        return wrapper
+    return decorate
+
+
+class TracedWindow:
+    """curses window wrapper that records one "screen" event per frame, with the cells and bytes written."""
+
+    def __init__(self, window):
+        self._window = window
+        self._frame_start = None
+        self._cells = 0
+        self._bytes = 0
+
+    def addstr(self, *args):
+        text = args[2] if len(args) > 2 and isinstance(args[0], int) else args[0]
+        self._count(text)
+        return self._window.addstr(*args)
+
+    def addnstr(self, *args):
+        text, n = (args[2], args[3]) if isinstance(args[0], int) else (args[0], args[1])
+        self._count(text[:n])
+        return self._window.addnstr(*args)
+
+    def _count(self, text):
+        if self._frame_start is None:
+            self._frame_start = tracer.now()
+        self._cells += len(text)
+        self._bytes += len(text.encode('utf-8'))
+
+    def refresh(self, *args):
+        start = tracer.now() if self._frame_start is None else self._frame_start
+        try:
+            return self._window.refresh(*args)
+        finally:
+            tracer.complete("frame", "screen", start, {"cells": self._cells, "bytes": self._bytes})
+            self._frame_start, self._cells, self._bytes = None, 0, 0
+
+    # Everything else (getch, clear, getmaxyx ...) goes to the real window
+    def __getattr__(self, name):
+        return getattr(self._window, name)
+
+
+# Function to wrap the main curses window when tracing, returns the window itself otherwise
+def window(stdscr):
+    return TracedWindow(stdscr) if enabled else stdscr
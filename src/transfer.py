@@ -0,0 +1,176 @@
+"""Bulk import and export of secrets as otpauth:// URIs, CSV or JSON lines.
+
+Files are streamed through generators: parse_* yield (line number, name, value or
+None, error or None) tuples and validate() normalizes the values, so an import
+never holds more than the parsed entries in memory. Bad lines are reported with
+their line number and skipped; the good ones are written with one atomic commit.
+
+    otpauth   otpauth://totp/GitHub:alice?secret=JBSWY3DPEHPK3PXP&issuer=GitHub&period=60
+    csv       name,secret[,period,digits,algorithm,counter] (the header row is optional)
+    ndjson    {"name": "GitHub:alice", "secret": "JBSWY3DPEHPK3PXP", "digits": 8}
+
+period, digits, algorithm and counter are optional everywhere; a counter makes the
+entry counter based (HOTP, otpauth://hotp/...).
+"""
+import csv
+import json
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+from code_engine import make_value, parse_value
+from storage import COMPACT_EVERY
+from tracing import traced
+
+FORMATS = ("otpauth", "csv", "ndjson")
+PARAMS = ("period", "digits", "algorithm", "counter")
+EXTENSIONS = {".txt": "otpauth", ".uri": "otpauth", ".csv": "csv", ".json": "ndjson", ".jsonl": "ndjson",
+              ".ndjson": "ndjson"}
+
+
+class TransferError(Exception):
+    pass
+
+
+# Function to guess the format from a file name, otpauth URIs by default
+def guess_format(path):
+    for extension, file_format in EXTENSIONS.items():
+        if path.lower().endswith(extension):
+            return file_format
+    return "otpauth"
+
+
+# Parsers yield (line number, name, (secret, parameters) or None, error or None)
+# Function to parse otpauth:// URIs, one per line (blank lines and # comments are skipped)
+def parse_otpauth(lines):
+    for line_no, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        uri = urlsplit(line)
+        if uri.scheme != "otpauth":
+            yield line_no, None, None, "not an otpauth:// URI"
+            continue
+        if uri.netloc not in ("totp", "hotp"):
+            yield line_no, None, None, f"unknown OTP type '{uri.netloc}'"
+            continue
+        query = {key: values[0] for key, values in parse_qs(uri.query).items()}
+        params = {key: query.get(key) for key in PARAMS}
+        if uri.netloc == "hotp" and params["counter"] is None:
+            params["counter"] = "0"
+        elif uri.netloc == "totp":
+            params["counter"] = None
+        secret = query.get("secret")
+        yield line_no, unquote(uri.path.lstrip("/")), None if secret is None else (secret, params), None
+
+
+# Function to parse name,secret CSV rows
+def parse_csv(lines):
+    reader = csv.reader(lines)
+    for row in reader:
+        line_no = reader.line_num
+        if not row or (len(row) == 1 and not row[0].strip()):
+            continue
+        if line_no == 1 and [cell.strip().lower() for cell in row[:2]] == ["name", "secret"]:
+            continue  # Header row
+        if not 2 <= len(row) <= 2 + len(PARAMS):
+            yield line_no, None, None, f"expected 2 to {2 + len(PARAMS)} columns (name,secret,{','.join(PARAMS)})"
+            continue
+        params = {key: cell.strip() or None for key, cell in zip(PARAMS, row[2:])}
+        yield line_no, row[0].strip(), (row[1], params), None
+
+
+# Function to parse {"name": ..., "secret": ...} objects, one per line
+def parse_ndjson(lines):
+    for line_no, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            yield line_no, None, None, "not valid JSON"
+            continue
+        if not isinstance(entry, dict) or not all(isinstance(entry.get(key), str) for key in ("name", "secret")):
+            yield line_no, None, None, "expected an object with string 'name' and 'secret'"
+            continue
+        params = {key: entry.get(key) for key in PARAMS}
+        yield line_no, entry["name"], (entry["secret"], params), None
+
+
+PARSERS = {"otpauth": parse_otpauth, "csv": parse_csv, "ndjson": parse_ndjson}
+
+
+# Function to check names and turn secrets and parameters into stored values, bad entries become errors
+def validate(entries):
+    for line_no, name, entry, error in entries:
+        value = None
+        if error is None:
+            if not name:
+                error = "missing name"
+            elif not name.isprintable():
+                error = "name contains control characters"
+            elif entry is None:
+                error = "missing secret"
+            else:
+                secret, params = entry
+                try:
+                    value = make_value(secret, **{key: params.get(key) for key in PARAMS})
+                except (TypeError, ValueError) as e:
+                    error = str(e)
+        yield line_no, name, value, error
+
+
+# Function to import entries into the vault state with one commit, returns (added, errors)
+# errors is a list of (line number, message); existing names are kept unless replace is True
+@traced("vault.import", "vault")
+def import_entries(lines, file_format, store, password_hash, secrets, cipher, replace=False):
+    if file_format not in PARSERS:
+        raise TransferError(f"unknown format '{file_format}', expected one of {', '.join(FORMATS)}")
+    ops, errors = [], []
+    for line_no, name, value, error in validate(PARSERS[file_format](lines)):
+        if error is None and name in secrets and not replace:
+            error = f"'{name}' already exists"
+        if error is not None:
+            errors.append((line_no, error))
+            continue
+        secrets[name] = cipher.encrypt(name, value)
+        ops.append(("set", name, secrets[name]))
+    if len(ops) >= COMPACT_EVERY:
+        store.save(password_hash, secrets, ops)  # Large batches go straight into a new snapshot
+    elif ops:
+        store.commit(ops, password_hash, secrets)  # One journal line, applied as a whole
+    return len(ops), errors
+
+
+# Function to get the parameters a stored value sets, without the defaults
+def stored_params(value):
+    params = parse_value(value)
+    return params.secret, {key: getattr(params, key) for key in PARAMS if getattr(params, key) is not None}
+
+
+# Function to format one entry for export
+def format_entry(file_format, name, value):
+    secret, params = stored_params(value)
+    if file_format == "otpauth":
+        kind = "hotp" if "counter" in params else "totp"
+        query = "".join(f"&{key}={params[key]}" for key in PARAMS if key in params)
+        return f"otpauth://{kind}/{quote(name, safe=':@')}?secret={secret}{query}\n"
+    if file_format == "ndjson":
+        return json.dumps(dict({"name": name, "secret": secret}, **params)) + "\n"
+    raise TransferError(f"unknown format '{file_format}', expected one of {', '.join(FORMATS)}")
+
+
+# Function to export all secrets (decrypted) to an open text file, returns the number written
+@traced("vault.export", "vault")
+def export_entries(out, file_format, secrets, cipher):
+    count = 0
+    if file_format == "csv":
+        writer = csv.writer(out, lineterminator="\n")
+        writer.writerow(["name", "secret"] + list(PARAMS))
+        for name, token in secrets.items():
+            secret, params = stored_params(cipher.decrypt(name, token))
+            writer.writerow([name, secret] + [params.get(key, "") for key in PARAMS])
+            count += 1
+        return count
+    for name, token in secrets.items():
+        out.write(format_entry(file_format, name, cipher.decrypt(name, token)))
+        count += 1
+    return count
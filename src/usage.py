@@ -0,0 +1,161 @@
+"""How often and how recently each secret is used, to list the most used secrets first.
+
+Usage is kept apart from the vault, in vault.json.usage, so counting a use never
+rewrites the vault. The file is append only, one JSON line per batch of uses of one
+secret:
+
+    ["github", 3, 1700000000.5, 2812.4]     (name, uses, time of the last one, score)
+
+Uses are counted in memory and written by flush(), at most every FLUSH_INTERVAL
+seconds: a secret used twenty times in between costs one line, and nothing is written
+while nobody uses a secret. Lines of several processes add up. Once the file holds
+COMPACT_FACTOR times more lines than secrets it is rewritten with one line per secret.
+
+The rank of a secret is its use count with each use decayed by half every HALF_LIFE
+seconds. As all scores decay at the same rate, a score is kept as
+log2(decayed count) + time / HALF_LIFE: the order of the secrets never changes as time
+passes, and only the score of the secret being used is updated.
+"""
+import fcntl
+import json
+import math
+import os
+import time
+
+HALF_LIFE = 7 * 24 * 3600.0  # Seconds until a use counts half
+FLUSH_INTERVAL = 30.0  # Seconds between writes of the counted uses
+COMPACT_FACTOR = 4  # Lines per secret in the file before it is rewritten
+FORGET_BELOW = 2 ** -10  # Decayed count under which a secret is dropped when the file is rewritten
+
+
+# Function to add two counts given as log2 values, without overflowing
+def _log2_add(a, b):
+    if a < b:
+        a, b = b, a
+    return a + math.log2(1 + 2 ** (b - a))
+
+
+class UsageStats:
+    """Use counts, last use times and decayed scores of the secrets of one vault file."""
+
+    def __init__(self, vault_path, flush_interval=FLUSH_INTERVAL):
+        self.path = vault_path + '.usage'
+        self.flush_interval = flush_interval
+        self.stats = {}  # name -> [uses, time of the last use, score]
+        self._pending = {}  # name -> [uses, time of the last use, score] not written yet
+        self._lines = 0  # Lines in the file, counted to know when to rewrite it
+        self._offset = 0  # Bytes of the file read so far
+        self._inode = None
+        self._last_flush = time.time()
+        self.load()
+
+    # Function to hold an exclusive lock on the file; a rewrite by another process replaces the file,
+    # so the lock is taken again until it is on the current one
+    def _open_locked(self):
+        while True:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o600)
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                if os.fstat(fd).st_ino == os.stat(self.path).st_ino:
+                    return fd
+            except FileNotFoundError:
+                pass
+            os.close(fd)
+
+    # Function to add `uses` uses of a secret to `stats`, the last at time `last`
+    @staticmethod
+    def _add(stats, name, uses, last, score):
+        entry = stats.get(name)
+        if entry is None:
+            stats[name] = [uses, last, score]
+        else:
+            entry[0] += uses
+            entry[1] = max(entry[1], last)
+            entry[2] = _log2_add(entry[2], score)
+
+    # Function to read the lines other processes wrote since the last read (the whole file if it was rewritten)
+    def _catch_up(self, fd):
+        stat = os.fstat(fd)
+        if stat.st_ino != self._inode or stat.st_size < self._offset:
+            self.stats, self._lines, self._offset, self._inode = {}, 0, 0, stat.st_ino
+            for name, entry in self._pending.items():
+                self._add(self.stats, name, *entry)
+        data = os.pread(fd, stat.st_size - self._offset, self._offset)
+        end = data.rfind(b'\n') + 1  # A torn last line (crash during a write) is cut off by the next flush
+        for line in data[:end].splitlines():
+            try:
+                self._add(self.stats, *json.loads(line))
+            except (ValueError, TypeError):
+                continue
+            self._lines += 1
+        self._offset += end
+
+    # Function to read the usage file
+    def load(self):
+        try:
+            fd = os.open(self.path, os.O_RDONLY)
+        except FileNotFoundError:
+            return
+        try:
+            fcntl.flock(fd, fcntl.LOCK_SH)
+            self._catch_up(fd)
+        finally:
+            os.close(fd)
+
+    # Function to count a use of a secret; written by the next flush, which runs once FLUSH_INTERVAL has passed
+    def record(self, name, now=None):
+        now = time.time() if now is None else now
+        score = now / HALF_LIFE  # log2(1) + now / HALF_LIFE
+        self._add(self.stats, name, 1, now, score)
+        self._add(self._pending, name, 1, now, score)
+        if now - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    # Function to write the counted uses (one line per secret), rewriting the file when it has grown too long
+    def flush(self):
+        self._last_flush = time.time()
+        if not self._pending:
+            return
+        fd = self._open_locked()
+        try:
+            self._catch_up(fd)  # Our pending uses are already in the stats, the lines of others are added
+            pending, self._pending = self._pending, {}
+            if self._lines + len(pending) > COMPACT_FACTOR * max(len(self.stats), 16):
+                self._rewrite()
+                return
+            data = b''.join(json.dumps([name] + entry).encode('utf-8') + b'\n' for name, entry in pending.items())
+            os.ftruncate(fd, self._offset)
+            os.write(fd, data)
+            self._offset += len(data)
+            self._lines += len(pending)
+        finally:
+            os.close(fd)  # Releases the lock
+
+    # Function to write the file again with one line per secret (lock held); secrets unused for long are dropped
+    def _rewrite(self):
+        now_score = math.log2(FORGET_BELOW) + time.time() / HALF_LIFE
+        self.stats = {name: entry for name, entry in self.stats.items() if entry[2] >= now_score}
+        lines = [json.dumps([name] + entry).encode('utf-8') + b'\n' for name, entry in self.stats.items()]
+        data = b''.join(lines)
+        tmp_path = f"{self.path}.tmp.{os.getpid()}"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self._inode = os.stat(self.path).st_ino
+        self._offset = len(data)
+        self._lines = len(lines)
+
+    # Function to get the decayed use count of a secret at a time (now by default)
+    def frequency(self, name, now=None):
+        entry = self.stats.get(name)
+        if entry is None:
+            return 0.0
+        now = time.time() if now is None else now
+        return 2 ** (entry[2] - now / HALF_LIFE)
+
+    # Function to order names by decayed use count, most used first; unused names keep their order at the end
+    def ranked(self, names):
+        stats = self.stats
+        return sorted(names, key=lambda name: -stats[name][2] if name in stats else math.inf)
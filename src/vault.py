@@ -0,0 +1,275 @@
+"""Vault and code generation without curses, for use from other programs and threads.
+
+    from vault import Vault
+    vault = Vault("/path/to/vault.json")     # Vault() opens the default vault
+    vault.unlock("password")
+    snapshot = vault.snapshot()              # Immutable, reading it never takes a lock
+    snapshot.names(), snapshot.code("github"), snapshot.value("github")
+    vault.set("github", "JBSWY3DPEHPK3PXP", digits=8)
+    vault.delete("github")
+
+Readers work on snapshots: a snapshot is one published version of the vault and never
+changes. Writers (set, delete, set_password, refresh) are serialized by a lock, build
+the next version copy-on-write (only the changed names are copied, see Overlay), write
+it through VaultStore and then publish it by replacing one reference. A reader holding
+a snapshot is therefore never blocked by a save and never sees half of a change.
+Each thread gets its own cipher and code engine, whose caches are not shared.
+"""
+import os
+import threading
+from collections.abc import MutableMapping
+from types import MappingProxyType
+
+import kdf
+from code_engine import CodeEngine, advance_counter, make_value
+from entry_crypto import EntryCipher
+from storage import VaultStore, vault_path
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FOLD_AT = 4096  # Changes kept on top of the base mapping before they are folded into a new one
+DELETED = object()  # Marks a name deleted in an Overlay
+
+
+class VaultError(Exception):
+    pass
+
+
+class Overlay(MutableMapping):
+    """Secrets as a base mapping plus the changes made on top of it; the base is never written.
+
+    copy() copies only the changes, so a new version costs as much as the names it
+    changes. Once there are FOLD_AT changes the copy folds them into a new base.
+    """
+
+    def __init__(self, base, changes=None):
+        self._base = base
+        self._changes = dict(changes or {})  # name -> value, or DELETED
+
+    def __getitem__(self, name):
+        if name not in self._changes:
+            return self._base[name]
+        value = self._changes[name]
+        if value is DELETED:
+            raise KeyError(name)
+        return value
+
+    def __setitem__(self, name, value):
+        self._changes[name] = value
+
+    def __delitem__(self, name):
+        if name not in self:
+            raise KeyError(name)
+        self._changes[name] = DELETED
+
+    def __contains__(self, name):
+        if name not in self._changes:
+            return name in self._base
+        return self._changes[name] is not DELETED
+
+    def __iter__(self):
+        changes = self._changes
+        for name in self._base:
+            if name not in changes:
+                yield name
+        for name, value in list(changes.items()):
+            if value is not DELETED:
+                yield name
+
+    def __len__(self):
+        length = len(self._base)
+        for name, value in self._changes.items():
+            length += (value is not DELETED) - (name in self._base)
+        return length
+
+    # Function to copy the mapping for the next version (the changes only, or all of it every FOLD_AT changes)
+    def copy(self):
+        if len(self._changes) >= FOLD_AT:
+            return Overlay(dict(self.items()))
+        return Overlay(self._base, self._changes)
+
+
+class Snapshot:
+    """One published version of the vault. It never changes, so it can be read from any thread."""
+
+    __slots__ = ("version", "password_hash", "secrets", "_vault")
+
+    def __init__(self, version, password_hash, secrets, vault):
+        self.version = version
+        self.password_hash = password_hash
+        self.secrets = MappingProxyType(secrets)  # name -> encrypted value
+        self._vault = vault
+
+    def __len__(self):
+        return len(self.secrets)
+
+    def __contains__(self, name):
+        return name in self.secrets
+
+    def names(self):
+        return list(self.secrets)
+
+    # Function to get the decrypted value of a secret (Base32 secret plus its parameters)
+    def value(self, name):
+        if name not in self.secrets:
+            raise VaultError(f"no secret named '{name}'")
+        return self._vault.cipher().decrypt(name, self.secrets[name])
+
+    # Function to get the OTP parameters of a secret, see code_engine.OtpParams
+    def params(self, name):
+        return self._vault.engine().params(self.value(name))
+
+    # Function to get the current (or next) code of a secret; counter based codes are not used up here
+    def code(self, name, upcoming=False, for_time=None):
+        engine = self._vault.engine()
+        value = self.value(name)
+        try:
+            return engine.upcoming(value, for_time) if upcoming else engine.now(value, for_time)
+        except ValueError:  # Also binascii.Error
+            raise VaultError(f"secret '{name}' is not a valid OTP secret")
+
+
+class Vault:
+    """Thread-safe vault: lock-free snapshots for readers, serialized copy-on-write updates for writers."""
+
+    def __init__(self, path=None, journal=True):
+        self.store = VaultStore(path or vault_path(BASE_DIR), journal=journal)
+        self._data_key = None
+        self._legacy = False  # Vault not upgraded yet, its values may not be bound to their names
+        self._local = threading.local()  # Per-thread cipher and code engine
+        self._write_lock = threading.Lock()
+        password_hash, secrets = self.store.load()
+        self._snapshot = Snapshot(0, password_hash, Overlay(secrets), self)
+
+    # Function to get the current snapshot; with refresh=True changes of other processes are merged first
+    def snapshot(self, refresh=False):
+        if refresh and self.store.changed():
+            self.refresh()
+        return self._snapshot
+
+    @property
+    def locked(self):
+        return self._data_key is None
+
+    # Function to unlock the vault with its password, raises VaultError if it is wrong
+    def unlock(self, password):
+        password_hash = self._snapshot.password_hash
+        if password_hash is None:
+            raise VaultError("the vault has no password yet, see setup()")
+        ok, data_key = kdf.unlock(password, password_hash)
+        if not ok:
+            raise VaultError("wrong password")
+        if data_key is None:
+            raise VaultError("vault from before encryption, open it once in authterm to upgrade it")
+        self._legacy = not kdf.names_bound(password_hash)
+        self._data_key = data_key
+
+    # Function to give a new vault its password (and data key)
+    def setup(self, password):
+        with self._write_lock:
+            if self._snapshot.password_hash is not None:
+                raise VaultError("the vault already has a password")
+            data_key = kdf.new_data_key()
+            password_hash = kdf.hash_password(password, data_key)
+            self.store.save(password_hash, {})
+            self._data_key = data_key
+            self._publish(password_hash, Overlay({}))
+
+    # Function to get this thread's cipher (each thread has its own cache of decrypted values)
+    def cipher(self):
+        if self._data_key is None:
+            raise VaultError("the vault is locked")
+        cipher = getattr(self._local, "cipher", None)
+        if cipher is None:
+            cipher = self._local.cipher = EntryCipher(self._data_key, max_cached=max(len(self._snapshot), 256),
+                                                      legacy=self._legacy)
+        return cipher
+
+    # Function to get this thread's code engine
+    def engine(self):
+        engine = getattr(self._local, "engine", None)
+        if engine is None:
+            engine = self._local.engine = CodeEngine()
+        return engine
+
+    def _publish(self, password_hash, secrets):
+        self._snapshot = Snapshot(self._snapshot.version + 1, password_hash, secrets, self)  # One reference swap
+
+    # Function to write ops through the store and publish the result as the next version
+    # `build` gets a private copy of the secrets, with the changes of other processes merged in, and returns the
+    # ops to record; it runs with the vault lock held, so what it reads cannot change before the ops are written
+    def _update(self, build):
+        with self._write_lock:
+            current = self._snapshot
+            secrets = current.secrets.copy()  # The Overlay behind the proxy, copied
+            written = []
+
+            def ops_for(merged):
+                written.extend(build(merged))
+                return written
+            password_hash, merged, changed = self.store.commit(ops_for, current.password_hash, secrets)
+            if written or changed != set():  # Merged changes are published even if nothing was written
+                self._publish(password_hash, merged if isinstance(merged, Overlay) else Overlay(merged))
+
+    # Function to add or replace a secret (Base32 value, with optional period, digits, algorithm, counter)
+    def set(self, name, secret, **params):
+        try:
+            value = make_value(secret, **params)
+        except ValueError as e:
+            raise VaultError(f"invalid secret: {e}")
+        token = self.cipher().encrypt(name, value)
+
+        def build(secrets):
+            secrets[name] = token
+            return [("set", name, token)]
+        self._update(build)
+
+    # Function to delete a secret
+    def delete(self, name):
+        def build(secrets):
+            if name not in secrets:
+                raise VaultError(f"no secret named '{name}'")
+            del secrets[name]
+            return [("del", name)]
+        self._update(build)
+
+    # Function to change the vault password (the data key, and so the stored values, stay the same)
+    def set_password(self, password):
+        if self._data_key is None:
+            raise VaultError("the vault is locked")
+        if self._legacy:  # A new record would mark the old values as upgraded
+            raise VaultError("vault in the old format, open it once in authterm to upgrade it")
+        password_hash = kdf.hash_password(password, self._data_key)
+        self._update(lambda secrets: [("password", password_hash)])
+
+    # Function to get the code of a secret to use it; a counter based secret moves on to its next code
+    def code(self, name):
+        codes = []
+
+        def build(secrets):
+            if name not in secrets:
+                raise VaultError(f"no secret named '{name}'")
+            value = self.cipher().decrypt(name, secrets[name])
+            codes.append(self.engine().now(value))
+            if not self.engine().is_counter_based(value):
+                return []
+            secrets[name] = self.cipher().encrypt(name, advance_counter(value))
+            return [("set", name, secrets[name])]
+
+        value = self._snapshot.value(name)
+        if not self.engine().is_counter_based(value):
+            return self._snapshot.code(name)  # Time based: nothing to write, no lock
+        self._update(build)
+        return codes[0]
+
+    # Function to merge the changes other processes made to the vault file
+    def refresh(self):
+        with self._write_lock:
+            current = self._snapshot
+            secrets = current.secrets.copy()
+            password_hash, merged, changed = self.store.refresh(current.password_hash, secrets)
+            if changed != set():
+                self._publish(password_hash, merged if isinstance(merged, Overlay) else Overlay(merged))
+
+    # Function to wait for a background compaction, before the program exits
+    def close(self):
+        self.store.wait()
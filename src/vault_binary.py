@@ -0,0 +1,232 @@
+"""Indexed binary vault format (vault.bin), opened through mmap.
+
+Layout (little endian):
+
+    header   magic "ATVB", version u16, reserved u16, count u32, meta_len u32, data_len u32
+    meta     JSON object with the vault header fields (password_hash, ...)
+    slots    count x (name_off u32, value_off u32, value_len u32, name_len u16, pad u16), vault order
+    order    count x u32 slot numbers, sorted by name, used for binary search
+    data     UTF-8 names and values
+
+Opening a vault only reads the header and meta. Names are looked up by binary search
+over the sorted order table and values are decoded on first access.
+
+Convert from and to vault.json with:
+
+    python3 src/vault_binary.py to-binary [vault.json] [vault.bin]
+    python3 src/vault_binary.py to-json [vault.bin] [vault.json]
+
+vault.bin is used whenever it exists, so a conversion of the default vault moves the
+source aside (vault.json.old or vault.bin.old, with its journal) once it is converted.
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+from collections.abc import MutableMapping
+
+MAGIC = b"ATVB"
+VERSION = 1
+HEADER = struct.Struct("<4sHHIII")
+SLOT = struct.Struct("<IIIH2x")
+ORDER = struct.Struct("<I")
+
+
+class VaultFormatError(Exception):
+    pass
+
+
+class LazySecrets(MutableMapping):
+    """Secrets mapping backed by an mmapped vault.bin, changes are kept in memory on top of it."""
+
+    def __init__(self, mm, count, slots_start, order_start, data_start):
+        self._mm = mm
+        self._count = count
+        self._slots_start = slots_start
+        self._order_start = order_start
+        self._data_start = data_start
+        self._values = {}     # Decoded or changed values, only for touched entries
+        self._added = {}      # Names that are not in the file, in insertion order
+        self._deleted = set()
+
+    def _slot(self, i):
+        return SLOT.unpack_from(self._mm, self._slots_start + i * SLOT.size)
+
+    def _name(self, i):
+        name_off, _, _, name_len = self._slot(i)
+        start = self._data_start + name_off
+        return self._mm[start:start + name_len]
+
+    # Function to find the slot of a name by binary search, returns -1 if missing
+    def _find(self, name):
+        key = name.encode('utf-8')
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            i = ORDER.unpack_from(self._mm, self._order_start + mid * ORDER.size)[0]
+            probe = self._name(i)
+            if probe < key:
+                lo = mid + 1
+            elif probe > key:
+                hi = mid
+            else:
+                return i
+        return -1
+
+    def __getitem__(self, name):
+        if name in self._values:
+            return self._values[name]
+        if name in self._deleted:
+            raise KeyError(name)
+        i = self._find(name)
+        if i < 0:
+            raise KeyError(name)
+        _, value_off, value_len, _ = self._slot(i)
+        start = self._data_start + value_off
+        value = self._mm[start:start + value_len].decode('utf-8')
+        self._values[name] = value
+        return value
+
+    def __setitem__(self, name, value):
+        if name in self._deleted:
+            self._deleted.discard(name)  # Entry of the file brought back
+        elif name not in self._values and self._find(name) < 0:
+            self._added[name] = True
+        self._values[name] = value
+
+    def __delitem__(self, name):
+        if name not in self:
+            raise KeyError(name)
+        self._values.pop(name, None)
+        if self._added.pop(name, None) is None:
+            self._deleted.add(name)
+
+    def __contains__(self, name):
+        if name in self._values:
+            return True
+        return name not in self._deleted and self._find(name) >= 0
+
+    def __iter__(self):
+        for i in range(self._count):
+            name = self._name(i).decode('utf-8')
+            if name not in self._deleted:
+                yield name
+        yield from list(self._added)
+
+    def __len__(self):
+        return self._count - len(self._deleted) + len(self._added)
+
+    # Function to copy the mapping without decoding anything, the mmap is shared
+    def copy(self):
+        clone = LazySecrets(self._mm, self._count, self._slots_start, self._order_start, self._data_start)
+        clone._values = dict(self._values)
+        clone._added = dict(self._added)
+        clone._deleted = set(self._deleted)
+        return clone
+
+    def __repr__(self):
+        return f"<LazySecrets {len(self)} entries, {len(self._values)} loaded>"
+
+
+# Function to open a vault.bin, returns the meta dict with the lazy "secrets" mapping added
+def read_vault(path):
+    with open(path, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if len(mm) < HEADER.size:
+        raise VaultFormatError(f"{path}: file too short")
+    magic, version, _, count, meta_len, data_len = HEADER.unpack_from(mm, 0)
+    if magic != MAGIC or version != VERSION:
+        raise VaultFormatError(f"{path}: not a version {VERSION} binary vault")
+    meta_start = HEADER.size
+    slots_start = meta_start + meta_len
+    order_start = slots_start + count * SLOT.size
+    data_start = order_start + count * ORDER.size
+    if data_start + data_len != len(mm):
+        raise VaultFormatError(f"{path}: truncated vault")
+    data = json.loads(mm[meta_start:slots_start])
+    data["secrets"] = LazySecrets(mm, count, slots_start, order_start, data_start)
+    return data
+
+
+# Function to serialize a vault into the binary format
+def encode_vault(meta, secrets):
+    meta_blob = json.dumps(meta).encode('utf-8')
+    names = []
+    slots = []
+    data = bytearray()
+    for name, value in secrets.items():
+        name_bytes = name.encode('utf-8')
+        value_bytes = value.encode('utf-8')
+        name_off = len(data)
+        data += name_bytes
+        value_off = len(data)
+        data += value_bytes
+        names.append(name_bytes)
+        slots.append(SLOT.pack(name_off, value_off, len(value_bytes), len(name_bytes)))
+    order = sorted(range(len(names)), key=names.__getitem__)
+    return b"".join([
+        HEADER.pack(MAGIC, VERSION, 0, len(names), len(meta_blob), len(data)),
+        meta_blob,
+        b"".join(slots),
+        b"".join(ORDER.pack(i) for i in order),
+        bytes(data),
+    ])
+
+
+# Function to convert vault.json (with its journal) to vault.bin or back
+# With retire_source=True the source is then moved aside, see retire()
+def convert(source, target, retire_source=False):
+    from storage import VaultStore
+    store = VaultStore(source)
+    password_hash, secrets = store.load()
+    VaultStore(target).save(password_hash, dict(secrets))
+    if retire_source:
+        retire(store)
+    return len(secrets)
+
+
+# Function to move a converted vault (snapshot, then its journals) to <path>.old, where it can still be opened
+# Refused if another process changed it since it was read: its changes would be missing from the copy
+def retire(store):
+    from storage import VaultStore
+    old = VaultStore(store.path + '.old')
+    with store.locked(exclusive=True):
+        if store.changed():
+            raise VaultFormatError(f"{store.path} changed during the conversion, convert it again")
+        for path, old_path in ((store.path, old.path), (store.journal_path, old.journal_path),
+                               (store.rotated_path, old.rotated_path)):
+            if os.path.exists(path):
+                os.replace(path, old_path)
+    return old.path
+
+
+def main(argv):
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    json_path = os.path.join(base_dir, 'vault.json')
+    bin_path = os.path.join(base_dir, 'vault.bin')
+    if len(argv) not in (1, 3) or argv[0] not in ("to-binary", "to-json"):
+        print("Usage: vault_binary.py to-binary|to-json [SOURCE TARGET]")
+        return 2
+    if len(argv) == 3:
+        source, target = argv[1], argv[2]
+    elif argv[0] == "to-binary":
+        source, target = json_path, bin_path
+    else:
+        source, target = bin_path, json_path
+    default = len(argv) == 1  # Only the default vault is moved aside, vault.bin would win over vault.json
+    try:
+        count = convert(source, target, retire_source=default)
+    except VaultFormatError as e:
+        print(f"Error: {e}")
+        return 1
+    print(f"Converted {count} secrets: {source} -> {target}")
+    if default:
+        print(f"Moved {source} to {source}.old")
+    elif os.path.abspath(target) == json_path and os.path.exists(bin_path):
+        print(f"Note: {bin_path} still exists and is used instead of {target}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
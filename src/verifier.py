@@ -0,0 +1,129 @@
+import binascii
+import heapq
+import hmac
+import threading
+import time
+
+from code_engine import CodeEngine
+from entry_crypto import DecryptionError
+
+DEFAULT_WINDOW = 1  # Time steps accepted before and after the current one (clock drift)
+MAX_WINDOW = 10     # Largest window a caller may ask for
+MAX_USED = 100000   # Names remembered by the replay cache
+
+
+class ReplayCache:
+    """Last accepted step per name, so a code (or an older one) is only accepted once.
+
+    Each entry carries the time after which its step can no longer match (its
+    window has passed) and is dropped then, in order of that time. An entry is never
+    dropped before: when the cache is full of entries still in their window, codes of
+    other names are refused until some expire.
+    """
+
+    def __init__(self, max_entries=MAX_USED):
+        self.max_entries = max_entries
+        self._used = {}  # name -> (last accepted step, expiry time)
+        self._expiry = []  # Heap of (expiry time, name, step); entries replaced since are skipped
+
+    def __len__(self):
+        return len(self._used)
+
+    # Function to drop the entries that expired before a time
+    def expire(self, for_time):
+        expiry = self._expiry
+        while expiry and expiry[0][0] <= for_time:
+            expires, name, step = heapq.heappop(expiry)
+            if self._used.get(name) == (step, expires):
+                del self._used[name]
+
+    # Function to accept a step for a name, returns False if it (or a later step) was already used
+    # or if the cache is full
+    def use(self, name, step, expires):
+        last = self._used.get(name)
+        if last is not None and step <= last[0]:
+            return False
+        if last is None and len(self._used) >= self.max_entries:
+            return False  # Dropping an entry still in its window would let its code be replayed
+        self._used[name] = (step, expires)
+        heapq.heappush(self._expiry, (expires, name, step))
+        if len(self._expiry) > 2 * len(self._used) + 64:
+            # Mostly replaced entries: rebuild from the live ones
+            self._expiry = [(entry[1], used_name, entry[0]) for used_name, entry in self._used.items()]
+            heapq.heapify(self._expiry)
+        return True
+
+
+class Verifier:
+    """Checks submitted codes against the vault, with a drift window and replay protection.
+
+    Codes are looked up per (secret, step) in the engine's cache, so under load a
+    secret costs one HMAC per time step instead of one per verification. For the same
+    reason the cipher should cache as many decrypted values as there are secrets.
+    For counter based secrets the step is the counter; the verifier remembers the last
+    accepted counter but does not write it back to the vault.
+    """
+
+    def __init__(self, secrets, cipher, window=DEFAULT_WINDOW, code_engine=None, max_used=MAX_USED):
+        self.secrets = secrets
+        self.cipher = cipher
+        self.window = window
+        # Own engine by default, sized for a whole window of codes per secret
+        self.engine = code_engine or CodeEngine(max_keys=max(len(secrets), 1024),
+                                                max_codes=max(len(secrets) * (2 * window + 2), 4096))
+        self.replay = ReplayCache(max_used)
+        self.counters = {}  # name -> last accepted counter of counter based secrets
+        self._lock = threading.Lock()  # The caches are shared by all threads
+
+    # Function to find the step a code belongs to, closest to now first, None if it matches none
+    # Counter based secrets only look ahead: codes before the stored counter were already used
+    def _matching_step(self, secret, code, window, step, counter_based):
+        for distance in range(window + 1):
+            if distance == 0:
+                candidates = (step,)
+            else:
+                candidates = (step + distance,) if counter_based else (step - distance, step + distance)
+            for candidate in candidates:
+                if hmac.compare_digest(self.engine.code_at(secret, candidate), code):
+                    return candidate
+        return None
+
+    # Function to verify one code, returns True only the first time a valid code is submitted
+    def verify(self, name, code, window=None, for_time=None):
+        window = self.window if window is None else window
+        for_time = time.time() if for_time is None else for_time
+        if not isinstance(code, str) or not code.isdigit():
+            return False
+        token = self.secrets.get(name)
+        if token is None:
+            return False
+        with self._lock:
+            try:
+                secret = self.cipher.decrypt(name, token)
+                params = self.engine.params(secret)
+                if len(code) != params.digits:
+                    return False
+                counter_based = params.counter is not None
+                if counter_based:  # Continue after the last counter accepted here
+                    step = max(params.counter, self.counters.get(name, -1) + 1)
+                else:
+                    step = self.engine.step_at(for_time, secret)
+                matched = self._matching_step(secret, code, window, step, counter_based)
+            except (binascii.Error, ValueError, DecryptionError):  # Not valid Base32, bad parameters or tampered with
+                return False
+            if matched is None:
+                return False
+            if counter_based:
+                if matched <= self.counters.get(name, -1):
+                    return False
+                self.counters[name] = matched
+                return True
+            self.replay.expire(for_time)
+            # Kept until no allowed window can match the step any more, whatever window later calls ask for
+            widest = max(window, self.window, MAX_WINDOW)
+            return self.replay.use(name, matched, (matched + widest + 1) * params.period)
+
+    # Function to verify many (name, code) pairs in one call, returns a list of booleans
+    def verify_many(self, pairs, window=None, for_time=None):
+        for_time = time.time() if for_time is None else for_time  # One clock reading for the batch
+        return [self.verify(name, code, window, for_time) for name, code in pairs]
@@ -0,0 +1,105 @@
+"""Live codes without curses: one JSON line per secret each time its code rolls over.
+
+    authterm watch [NAME|PATTERN...]
+
+    {"name": "github", "code": "123456", "expires": 1700000040, "period": 30}
+    {"name": "hotp", "code": "654321", "expires": null, "counter": 5}
+
+The current code of every selected secret is written at the start, then a line only
+when a code rolls over (expires is the Unix time it stops being valid). A counter
+based code is written again when its counter moves, secrets added to the vault are
+picked up. Names can be shell style patterns ("aws-*").
+
+The work is a pipeline of generators, each pulling from the next: ticks() sleeps
+until the next code expires, batches() turns each tick into the events of the codes
+that rolled over, ndjson() formats them and write() writes one batch per tick. As the
+pipeline only runs when the reader takes the output, a slow reader blocks it instead
+of growing a buffer, and after a stall the codes of the current window are written,
+never the ones that expired meanwhile.
+"""
+import fnmatch
+import json
+import time
+
+from code_engine import CodeBoard
+
+POLL_INTERVAL = 1.0  # Seconds between checks for vault changes when no code is due sooner
+
+
+# Function to pick the names matching any of the patterns (all names without patterns)
+def select(names, patterns):
+    if not patterns:
+        return list(names)
+    return [name for name in names if any(fnmatch.fnmatchcase(name, pattern) for pattern in patterns)]
+
+
+class VaultSource:
+    """Secrets to watch from an unlocked vault, merging the changes other processes make to it."""
+
+    def __init__(self, store, password_hash, secrets, cipher, patterns=()):
+        self.store = store
+        self.password_hash = password_hash
+        self.secrets = secrets
+        self.cipher = cipher
+        self.patterns = list(patterns)
+
+    # Function to get the selected secrets as (name, decrypted value) pairs
+    def entries(self):
+        return [(name, self.cipher.decrypt(name, self.secrets[name])) for name in select(self.secrets, self.patterns)]
+
+    # Function to merge the vault changes of other processes, returns True if there were any (two stat() calls if not)
+    def changed(self):
+        if not self.store.changed():
+            return False
+        self.password_hash, self.secrets, changed = self.store.refresh(self.password_hash, self.secrets)
+        return changed != set()
+
+
+# Function to yield the time whenever a code may have expired, or every `poll` seconds at the latest
+def ticks(board, clock=time.time, sleep=time.sleep, poll=POLL_INTERVAL):
+    while True:
+        yield clock()
+        due = board.next_expiry()
+        sleep(poll if due is None else min(max(due - clock(), 0), poll))
+
+
+# Function to yield, per tick, the list of events of the codes that rolled over (or changed with the vault)
+def batches(source, clock=time.time, sleep=time.sleep, poll=POLL_INTERVAL):
+    sent = {}  # name -> (code, expires) last written, so nothing is written twice
+    while True:
+        board = CodeBoard(source.entries())
+        for now in ticks(board, clock, sleep, poll):
+            events = []
+            for i in board.refresh(now, report_all=True):
+                params = board.params[i]
+                key = (board.codes[i], board.expires[i])
+                if sent.get(board.names[i]) == key:
+                    continue
+                sent[board.names[i]] = key
+                event = {"name": board.names[i], "code": board.codes[i], "expires": board.expires[i]}
+                if params.counter is None:
+                    event["period"] = params.period
+                else:
+                    event["counter"] = params.counter
+                events.append(event)
+            if events:
+                yield events
+            if source.changed():
+                break  # Build the board again from the new secrets
+
+
+# Function to format each batch of events as JSON lines, one string per batch
+def ndjson(batches):
+    for events in batches:
+        yield "".join(json.dumps(event) + "\n" for event in events)
+
+
+# Function to write each chunk and flush it, so a reader gets every batch as soon as it is made
+# Returns when the reader goes away (broken pipe)
+def write(chunks, out):
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+            out.flush()
+    except BrokenPipeError:
+        pass